@@ -0,0 +1,21 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import Token
+
+from .revocation import is_token_revoked
+
+__all__ = (
+    "RevocationAwareJWTAuthentication",
+)
+
+
+class RevocationAwareJWTAuthentication(JWTAuthentication):
+    """
+    `JWTAuthentication` that also rejects revoked tokens (see `authentication.revocation`).
+    """
+    def get_validated_token(self, raw_token: bytes) -> Token:
+        validated_token = super().get_validated_token(raw_token)
+        if is_token_revoked(validated_token):
+            raise InvalidToken(_("Token is revoked"))
+        return validated_token
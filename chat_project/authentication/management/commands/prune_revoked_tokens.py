@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from authentication.revocation import prune_expired
+
+
+class Command(BaseCommand):
+    """
+    Delete revoked-token rows whose token has expired, in chunks. Workers already do this in the
+    background on every scheduled filter rebuild (`TOKEN_REVOCATION['REBUILD_SECONDS']`); this is
+    for pruning by hand, e.g. after a mass revocation.
+
+    python manage.py prune_revoked_tokens
+    python manage.py prune_revoked_tokens --chunk-size 5000
+    """
+    help = "Delete revoked tokens that have expired."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows deleted per query.")
+
+    def handle(self, *args, **options):
+        return f"Deleted {prune_expired(options['chunk_size'])} expired revoked token(s)"
@@ -0,0 +1,18 @@
+from django.db import models
+
+__all__ = (
+    "RevokedToken",
+)
+
+
+class RevokedToken(models.Model):
+    """
+    A revoked JWT, by its `jti` claim. Rows are only needed until the token would have expired anyway;
+    workers prune them after that (see `authentication.revocation`).
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"Revoked token {self.jti}"
@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from .models import RevokedToken
+
+__all__ = (
+    "BloomFilter",
+    "revocation_list",
+    "revoke_token",
+    "is_token_revoked",
+    "prune_expired",
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _config() -> dict:
+    return getattr(settings, 'TOKEN_REVOCATION', {})
+
+
+class BloomFilter:
+    """
+    Fixed-size bloom filter over strings: no false negatives, about `error_rate` false positives
+    while it holds at most `capacity` items.
+    """
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> list[int]:
+        # double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str) -> bool:
+        """
+        Add `item`; returns False, without counting it, when all its bits were already set.
+        """
+        positions = self._positions(item)
+        if all(self._bits[position >> 3] & (1 << (position & 7)) for position in positions):
+            return False
+        for position in positions:
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+        return True
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """
+    Per-worker view of `RevokedToken` for answering "is this jti revoked?".
+
+    A bloom filter over the revoked jtis answers the common case (not revoked) from memory. It is
+    refreshed incrementally every `REFRESH_SECONDS` (only rows revoked since the last refresh are read)
+    and rebuilt from scratch every `REBUILD_SECONDS`, or when it outgrows `CAPACITY`, from the rows whose
+    token hasn't expired. A filter hit is confirmed with one indexed lookup. Each of these rebuilds also
+    deletes the expired rows, in chunks, on a background thread rather than in the request that
+    triggered it (`python manage.py prune_revoked_tokens` does the same on demand).
+    """
+    # rows committed late (long transactions, clock skew between workers) are still picked up
+    overlap = timedelta(seconds=60)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._filter: Optional[BloomFilter] = None
+        self._refreshed_at = 0.0
+        self._built_at = 0.0
+        self._watermark: Optional[datetime] = None
+        self._pruner: Optional[threading.Thread] = None
+
+    def _new_filter(self, count: int) -> BloomFilter:
+        capacity = max(_config().get('CAPACITY', 100_000), count * 2)
+        return BloomFilter(capacity, _config().get('ERROR_RATE', 0.001))
+
+    def rebuild(self, prune: bool = False) -> None:
+        started = timezone.now()
+        jtis = list(RevokedToken.objects.filter(expires_at__gt=started).values_list('jti', flat=True))
+        bloom = self._new_filter(len(jtis))
+        for jti in jtis:
+            bloom.add(jti)
+        self._filter, self._watermark = bloom, started
+        self._built_at = self._refreshed_at = time.monotonic()
+        if prune:
+            self._prune_in_background()
+
+    def _prune_in_background(self) -> None:
+        if self._pruner is not None and self._pruner.is_alive():
+            return
+
+        def prune() -> None:
+            try:
+                prune_expired(_config().get('PRUNE_CHUNK_SIZE', 1000))
+            except Exception:
+                logger.exception("Pruning expired revoked tokens failed")
+            finally:
+                connections.close_all()  # the pruning thread's own connections
+
+        self._pruner = threading.Thread(target=prune, name='token-revocation-prune', daemon=True)
+        self._pruner.start()
+
+    def refresh(self) -> None:
+        started = timezone.now()
+        jtis = RevokedToken.objects.filter(revoked_at__gte=self._watermark - self.overlap).values_list('jti', flat=True)
+        for jti in jtis:
+            self._filter.add(jti)
+        self._watermark = started
+        self._refreshed_at = time.monotonic()
+
+    def ensure_current(self) -> None:
+        now = time.monotonic()
+        if self._filter is not None and now - self._refreshed_at < _config().get('REFRESH_SECONDS', 5):
+            return
+        with self._lock:
+            if self._filter is None:
+                self.rebuild()
+            elif now - self._built_at >= _config().get('REBUILD_SECONDS', 3600):
+                self.rebuild(prune=True)
+            elif now - self._refreshed_at >= _config().get('REFRESH_SECONDS', 5):
+                self.refresh()
+                if self._filter.count > self._filter.capacity:
+                    self.rebuild(prune=True)
+
+    def add(self, jti: str) -> None:
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        self.ensure_current()
+        if jti not in self._filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._filter, self._watermark = None, None
+            self._refreshed_at = self._built_at = 0.0
+            pruner, self._pruner = self._pruner, None
+        if pruner is not None:
+            pruner.join()
+
+
+revocation_list = RevocationList()
+
+
+def prune_expired(chunk_size: int = 1000) -> int:
+    """
+    Delete the rows of tokens that have expired anyway (already ignored by `is_revoked`), in
+    index-ordered chunks; returns the number deleted.
+    """
+    deleted = 0
+    while True:
+        ids = list(
+            RevokedToken.objects.filter(expires_at__lte=timezone.now())
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return deleted
+        deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
+
+
+def revoke_token(token: Token) -> None:
+    """
+    Revoke a validated token until it expires. Other workers notice within `REFRESH_SECONDS`.
+    """
+    jti = token[api_settings.JTI_CLAIM]
+    expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+    RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+    revocation_list.add(jti)
+
+
+def is_token_revoked(token: Token) -> bool:
+    jti = token.get(api_settings.JTI_CLAIM)
+    return jti is not None and revocation_list.is_revoked(jti)
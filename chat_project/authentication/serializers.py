@@ -1,5 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer, TokenVerifySerializer
+from rest_framework_simplejwt.tokens import UntypedToken
+
+from .revocation import is_token_revoked, revoke_token
 
 User = get_user_model()
 
@@ -27,3 +32,29 @@ class RegisterSerializer(serializers.ModelSerializer):
             last_name=validated_data.get('last_name', '')
         )
         return user
+
+
+class RevocationAwareTokenVerifySerializer(TokenVerifySerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        if is_token_revoked(UntypedToken(attrs['token'])):
+            raise TokenError("Token is revoked")
+        return data
+
+
+class RevocationAwareTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        if is_token_revoked(self.token_class(attrs['refresh'])):
+            raise TokenError("Token is revoked")
+        return super().validate(attrs)
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    """
+    Revokes any token (access or refresh) the caller holds; holding it is the proof of ownership.
+    """
+    token = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        revoke_token(UntypedToken(attrs['token']))
+        return {}
@@ -1,9 +1,17 @@
 import os
+from datetime import timedelta
 
 import pytest
 from rest_framework.test import APIClient
 from django.core.management import call_command
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from authentication.models import RevokedToken
+from authentication.revocation import BloomFilter, revocation_list
 
 User = get_user_model()
 
@@ -81,3 +89,87 @@ def test_successful_login(load_test_data):
     assert response.status_code == 200
     assert 'access' in response.data
     assert 'refresh' in response.data
+
+
+@pytest.mark.django_db
+def test_revoked_tokens_are_rejected_by_verify_refresh_and_api_requests(load_test_data):
+    """
+    Revocation test #1: Revoked access and refresh tokens stop working everywhere,
+    while other tokens of the same user keep working.
+    """
+    client = APIClient()
+    credentials = {"email": "testlogin@example.com", "password": "password123"}
+    revoked = client.post("/api/auth/token/", credentials).data
+    kept = client.post("/api/auth/token/", credentials).data
+
+    assert client.post("/api/auth/token/revoke/", {"token": revoked['access']}).status_code == 200
+    assert client.post("/api/auth/token/revoke/", {"token": revoked['refresh']}).status_code == 200
+    assert RevokedToken.objects.count() == 2
+
+    assert client.post("/api/auth/token/verify/", {"token": revoked['access']}).status_code == 401
+    assert client.post("/api/auth/token/refresh/", {"refresh": revoked['refresh']}).status_code == 401
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {revoked['access']}")
+    assert client.get("/api/chat/threads/user_threads/").status_code == 401
+
+    client.credentials()
+    assert client.post("/api/auth/token/verify/", {"token": kept['access']}).status_code == 200
+    assert client.post("/api/auth/token/refresh/", {"refresh": kept['refresh']}).status_code == 200
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {kept['access']}")
+    assert client.get("/api/chat/threads/user_threads/").status_code == 200
+
+
+@pytest.mark.django_db
+def test_unrevoked_tokens_are_checked_without_database_queries_and_expired_entries_are_pruned(load_test_data):
+    """
+    Revocation test #2: Once the filter is loaded, an unrevoked token costs no revocation query,
+    revocations from other workers are picked up on refresh without being counted twice, rebuilds leave
+    expired rows out, and the management command prunes them.
+    """
+    client = APIClient()
+    tokens = client.post("/api/auth/token/", {"email": "testlogin@example.com", "password": "password123"}).data
+    revocation_list.ensure_current()
+
+    with CaptureQueriesContext(connection) as queries:
+        assert client.post("/api/auth/token/verify/", {"token": tokens['access']}).status_code == 200
+    assert not [query for query in queries.captured_queries if RevokedToken._meta.db_table in query['sql']]
+
+    # revoked by another worker: a plain row, not in this worker's filter until the next refresh
+    expired = RevokedToken.objects.create(jti="expired", expires_at=timezone.now() - timedelta(minutes=1))
+    RevokedToken.objects.create(jti="elsewhere", expires_at=timezone.now() + timedelta(hours=1))
+    revocation_list.refresh()
+    assert revocation_list.is_revoked("elsewhere")
+    assert not revocation_list.is_revoked("expired")
+    count = revocation_list._filter.count
+    revocation_list.refresh()  # the overlap window reads both rows again
+    assert revocation_list._filter.count == count
+
+    revocation_list.rebuild()
+    assert "expired" not in revocation_list._filter
+    assert "Deleted 1 expired" in call_command('prune_revoked_tokens')
+    assert not RevokedToken.objects.filter(pk=expired.pk).exists()
+    assert revocation_list.is_revoked("elsewhere")
+
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+    assert all(f"jti-{i}" in bloom for i in range(1000))
+    assert sum(f"other-{i}" in bloom for i in range(10000)) < 300
+
+
+@pytest.mark.django_db(transaction=True)
+@override_settings(TOKEN_REVOCATION={'REFRESH_SECONDS': 0, 'REBUILD_SECONDS': 0, 'PRUNE_CHUNK_SIZE': 2})
+def test_scheduled_rebuilds_prune_expired_entries_in_the_background():
+    """
+    Revocation test #3: the first build only loads the filter; scheduled rebuilds also delete the rows
+    of expired tokens, in chunks, on a background thread.
+    """
+    for i in range(5):
+        RevokedToken.objects.create(jti=f"expired-{i}", expires_at=timezone.now() - timedelta(minutes=1))
+    RevokedToken.objects.create(jti="current", expires_at=timezone.now() + timedelta(hours=1))
+
+    revocation_list.ensure_current()
+    assert RevokedToken.objects.count() == 6
+
+    revocation_list.ensure_current()
+    revocation_list.clear()  # waits for the pruning thread
+    assert list(RevokedToken.objects.values_list('jti', flat=True)) == ["current"]
@@ -2,8 +2,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from .serializers import RegisterSerializer
+from .serializers import RegisterSerializer, TokenRevokeSerializer
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenViewBase
 from django.http import HttpResponse
 
 
@@ -21,3 +22,9 @@ class RegisterView(APIView):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+
+class TokenRevokeView(TokenViewBase):
+    """
+    Revoke an access or refresh token before it expires (`authentication.revocation`).
+    """
+    serializer_class = TokenRevokeSerializer
@@ -1,18 +1,185 @@
+from typing import Iterator
+
 from django.contrib import admin
-from .models import Thread, Message
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.text import capfirst
+
+from . import cache, contacts
+from .models import Thread, Message, Broadcast
+from .purge import delete_messages
+from .recent import recent_messages
+from .sharding import message_shards
+from .signals import messages_purged
+
+ADMIN_CHUNK_SIZE = 1000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses the planner's row estimate for unfiltered changelists of large tables
+    instead of `COUNT(*)`. Filtered or searched querysets and small tables still get an exact count.
+
+    "Unfiltered" means no condition beyond the default manager's own (such as hiding soft-deleted
+    threads); the estimate covers the whole table, so it may include the rows that condition hides.
+    """
+    exact_count_threshold = 100_000
+
+    @cached_property
+    def count(self) -> int:
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and self.is_unfiltered(queryset):
+            estimate = self.estimate(queryset)
+            if estimate is not None and estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
+
+    @staticmethod
+    def is_unfiltered(queryset: QuerySet) -> bool:
+        return queryset.query.where == queryset.model._default_manager.all().query.where
+
+    @staticmethod
+    def estimate(queryset: QuerySet):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT table_rows FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = %s", [table]
+                )
+            else:
+                # SQLite keeps no row estimate; the highest id is a cheap upper bound
+                cursor.execute(f"SELECT MAX(id) FROM {connection.ops.quote_name(table)}")
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+def chunked_ids(queryset: QuerySet, chunk_size: int = ADMIN_CHUNK_SIZE) -> Iterator[list[int]]:
+    """
+    Yield the primary keys of `queryset` in index-ordered chunks (keyset pagination),
+    so actions on "all N selected" never load every row at once.
+    """
+    last_id = 0
+    while True:
+        ids = list(
+            queryset.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for tables with tens of millions of rows:
+    estimated page count, no full-result `COUNT(*)`, and no collector-based bulk delete.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
 
 
 @admin.register(Thread)
-class ThreadAdmin(admin.ModelAdmin):
-    list_display = ('id', 'created', 'updated')
-    filter_horizontal = ('participants',)
-    search_fields = ['participants__email']
+class ThreadAdmin(ScalableModelAdmin):
+    list_display = ('id', 'participant_emails', 'created', 'updated')
+    autocomplete_fields = ('participants',)
+    search_fields = ['=id', '=participants__email']
     list_filter = ['created', 'updated']
+    actions = ['soft_delete_threads']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('participants')
+
+    @admin.display(description='Participants')
+    def participant_emails(self, obj: Thread) -> str:
+        return ', '.join(user.email for user in obj.participants.all())
+
+    def get_deleted_objects(self, objs, request):
+        """
+        Deleting only hides the threads (their messages are purged in the background), so the
+        confirmation page lists the threads alone instead of collecting every message and outbox row.
+        """
+        objs = list(objs)
+        deleted = [f"{capfirst(Thread._meta.verbose_name)}: {obj}" for obj in objs]
+        return deleted, {Thread._meta.verbose_name_plural: len(objs)}, set(), []
+
+    def delete_model(self, request, obj: Thread) -> None:
+        obj.soft_delete()
+
+    def delete_queryset(self, request, queryset: QuerySet) -> None:
+        self.soft_delete(queryset)
+
+    def soft_delete(self, queryset: QuerySet) -> int:
+        deleted = 0
+        for ids in chunked_ids(queryset):
+            with transaction.atomic():
+                deleted += Thread.objects.filter(pk__in=ids).update(deleted_at=timezone.now())
+            cache.invalidate_threads(ids)
+            contacts.invalidate_threads(ids)
+            recent_messages.invalidate(ids)
+        return deleted
+
+    @admin.action(description='Delete selected threads (purged in the background)')
+    def soft_delete_threads(self, request, queryset: QuerySet) -> None:
+        self.message_user(request, f"{self.soft_delete(queryset)} thread(s) deleted.")
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
-    list_display = ('id', 'thread', 'sender', 'created', 'is_read')
-    search_fields = ['sender__email', 'thread__id']
+class MessageAdmin(ScalableModelAdmin):
+    list_display = ('id', 'thread_id', 'sender', 'text_preview', 'created', 'is_read')
+    list_select_related = ('sender',)
+    raw_id_fields = ('thread', 'sender')
+    search_fields = ['=sender__email', '=thread__id']
     list_filter = ['created', 'is_read']
+    actions = ['mark_as_read', 'delete_messages']
+
+    @admin.display(description='Text')
+    def text_preview(self, obj: Message) -> str:
+        # `text` is already decompressed by CompressedTextField
+        return obj.text if len(obj.text) <= 80 else f"{obj.text[:77]}..."
+
+    # Bulk actions apply the selection to every message shard, one chunk (and transaction) at a time.
+
+    @admin.action(description='Mark selected messages as read')
+    def mark_as_read(self, request, queryset: QuerySet) -> None:
+        updated = 0
+        for alias in message_shards():
+            messages = Message.objects.using(alias)
+            for ids in chunked_ids(queryset.using(alias)):
+                thread_ids = set(messages.filter(pk__in=ids).values_list('thread_id', flat=True))
+                with transaction.atomic(using=alias):
+                    updated += messages.filter(pk__in=ids, is_read=False).update(is_read=True)
+                recent_messages.invalidate(thread_ids)
+        self.message_user(request, f"{updated} message(s) marked as read.")
+
+    @admin.action(description='Delete selected messages')
+    def delete_messages(self, request, queryset: QuerySet) -> None:
+        deleted = 0
+        for alias in message_shards():
+            for ids in chunked_ids(queryset.using(alias)):
+                thread_ids = set(Message.objects.using(alias).filter(pk__in=ids).values_list('thread_id', flat=True))
+                with transaction.atomic(using=alias):
+                    deleted += delete_messages(ids, using=alias)
+                messages_purged.send(sender=Message, thread_ids=thread_ids, using=alias)
+        self.message_user(request, f"{deleted} message(s) deleted.")
+
 
+@admin.register(Broadcast)
+class BroadcastAdmin(admin.ModelAdmin):
+    list_display = ('id', 'sender', 'status', 'processed', 'sent', 'threads_created', 'created', 'finished_at')
+    list_select_related = ('sender',)
+    list_filter = ['status', 'created']
+    raw_id_fields = ('sender',)
+    readonly_fields = ('processed', 'sent', 'threads_created', 'locked_until', 'finished_at')
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .db import apply_sqlite_profile
+
+        connection_created.connect(apply_sqlite_profile, dispatch_uid='chat.apply_sqlite_profile')
+
+        from . import signals  # noqa: F401
@@ -0,0 +1,108 @@
+import io
+import json
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
+from django.urls import Resolver404, resolve
+from rest_framework.request import Request
+
+from . import cache, sharding
+from .recent import recent_messages
+from .writer import message_writer
+
+__all__ = (
+    "BATCH_PATH_PREFIX",
+    "run_batch",
+    "atomic_supported",
+)
+
+BATCH_PATH_PREFIX = '/api/chat/'
+
+# headers of the outer request that would be wrong for a sub-request: its body, and per-request
+# semantics (an idempotency key or precondition belongs to one request, not to every sub-request)
+_REQUEST_SPECIFIC_META = (
+    'CONTENT_TYPE', 'CONTENT_LENGTH', 'HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH', 'HTTP_CONTENT_MD5',
+    'HTTP_IDEMPOTENCY_KEY', 'HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE',
+    'HTTP_IF_UNMODIFIED_SINCE', 'HTTP_IF_RANGE', 'HTTP_RANGE',
+)
+
+
+def _build_request(
+    request: Request, method: str, path: str, body: Any, idempotency_key: Optional[str] = None
+) -> WSGIRequest:
+    """
+    A sub-request sharing the outer request's general headers and, without re-running authentication,
+    its user and token. Each sub-request can carry its own `Idempotency-Key`.
+    """
+    url = urlsplit(path)
+    payload = json.dumps(body).encode() if method not in ('GET', 'HEAD', 'DELETE') else b''
+    environ = {key: value for key, value in request.META.items() if key not in _REQUEST_SPECIFIC_META}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+    })
+    if idempotency_key:
+        environ['HTTP_IDEMPOTENCY_KEY'] = idempotency_key
+    sub_request = WSGIRequest(environ)
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def _run_one(request: Request, item: dict[str, Any]) -> dict[str, Any]:
+    path = urlsplit(item['path']).path
+    if not path.startswith(BATCH_PATH_PREFIX) or path.rstrip('/').endswith('/batch'):
+        return {'status': 400, 'body': {'error': f"Only {BATCH_PATH_PREFIX} routes can be batched."}}
+    try:
+        match = resolve(path)
+    except Resolver404:
+        return {'status': 404, 'body': {'detail': "Not found."}}
+
+    sub_request = _build_request(request, item['method'], item['path'], item['body'], item.get('idempotency_key'))
+    response = match.func(sub_request, *match.args, **match.kwargs)
+    result = {'status': response.status_code, 'body': getattr(response, 'data', None)}
+    if response.has_header('Retry-After'):
+        result['retry_after'] = response['Retry-After']
+    return result
+
+
+def atomic_supported() -> bool:
+    """
+    Atomic batches roll back one transaction on `default`: writes to other message shards, or made by the
+    group-commit writer thread (see `chat.writer`), would escape it.
+    """
+    return not sharding.is_sharded() and not message_writer.enabled
+
+
+def run_batch(request: Request, items: list[dict[str, Any]], atomic: bool = False) -> list[Optional[dict[str, Any]]]:
+    """
+    Run the sub-requests in order through the regular chat views (permissions, throttling and
+    validation apply to each one) and collect `{"status", "body"}` per sub-request.
+
+    With `atomic` (only where `atomic_supported()`), everything runs in one transaction on `default`;
+    the first failing sub-request rolls it back and the remaining ones are skipped (`null`).
+    Thread representations are shared between the sub-requests.
+    """
+    results: list[Optional[dict[str, Any]]] = [None] * len(items)
+    with cache.shared_between_requests() as seen_threads:
+        if not atomic:
+            for index, item in enumerate(items):
+                results[index] = _run_one(request, item)
+            return results
+
+        with transaction.atomic():
+            for index, item in enumerate(items):
+                results[index] = _run_one(request, item)
+                if results[index]['status'] >= 400:
+                    transaction.set_rollback(True)
+                    # representations cached by the rolled back sub-requests may describe rows that never existed
+                    cache.invalidate_threads(list(seen_threads))
+                    recent_messages.invalidate(seen_threads)
+                    break
+    return results
@@ -0,0 +1,140 @@
+from contextlib import ExitStack
+from datetime import timedelta
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from . import outbox
+from .models import Thread, Message, Broadcast
+from .recent import recent_messages
+from .sharding import message_shards
+
+__all__ = (
+    "resolve_threads",
+    "send_chunk",
+    "run_broadcast",
+    "claim_broadcast",
+)
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_BROADCAST', {})
+
+
+def resolve_threads(sender_id: int, recipient_ids: Iterable[int]) -> tuple[dict[int, int], int]:
+    """
+    Map every recipient to its two-participant thread with the sender (the oldest one, if there are
+    several), creating the missing threads. Returns `({recipient_id: thread_id}, threads created)`.
+
+    A fixed number of set-based queries, whatever the number of recipients: the sender's live threads
+    shared with a recipient, their participant counts, one bulk insert of the new threads and one of
+    their participant rows. Needs a backend that returns primary keys from bulk inserts.
+    """
+    through = Thread.participants.through
+    recipient_ids = set(recipient_ids) - {sender_id}
+    if not recipient_ids:
+        return {}, 0
+
+    sender_threads = through.objects.filter(user_id=sender_id, thread__deleted_at__isnull=True).values('thread_id')
+    candidates = list(
+        through.objects.filter(thread_id__in=sender_threads, user_id__in=recipient_ids)
+        .order_by('thread_id')
+        .values_list('thread_id', 'user_id')
+    )
+    sizes = dict(
+        through.objects.filter(thread_id__in={thread_id for thread_id, _ in candidates})
+        .values('thread_id')
+        .annotate(participant_count=Count('id'))
+        .values_list('thread_id', 'participant_count')
+    )
+    threads = {}
+    for thread_id, user_id in candidates:
+        if sizes[thread_id] == 2:
+            threads.setdefault(user_id, thread_id)
+
+    missing = sorted(recipient_ids - threads.keys())
+    if missing:
+        created = Thread.objects.bulk_create([Thread() for _ in missing])
+        through.objects.bulk_create([
+            through(thread_id=thread.pk, user_id=user_id)
+            for thread, recipient_id in zip(created, missing)
+            for user_id in (sender_id, recipient_id)
+        ])
+        threads.update((recipient_id, thread.pk) for thread, recipient_id in zip(created, missing))
+    return threads, len(missing)
+
+
+def send_chunk(broadcast: Broadcast, recipient_ids: list[int], lease: timedelta) -> None:
+    """
+    Send the broadcast to one chunk of recipients and record the progress: threads, messages
+    (`bulk_create`, per shard), outbox events and the `processed` counter are written together.
+
+    Without sharding that is one transaction, so a chunk is sent exactly once. With several message
+    shards the per-database transactions commit one after the other; a crash in between re-sends
+    the chunk to the recipients on the shards that had already committed.
+    """
+    User = get_user_model()
+    active = User.objects.filter(pk__in=recipient_ids, is_active=True).values_list('pk', flat=True)
+
+    with ExitStack() as stack:
+        for alias in message_shards():
+            stack.enter_context(transaction.atomic(using=alias))
+        if 'default' not in message_shards():
+            stack.enter_context(transaction.atomic(using='default'))
+
+        threads, threads_created = resolve_threads(broadcast.sender_id, active)
+        messages = Message.objects.bulk_create([
+            Message(thread_id=thread_id, sender_id=broadcast.sender_id, text=broadcast.text)
+            for _, thread_id in sorted(threads.items())
+        ])
+        outbox.enqueue(messages)
+        Broadcast.objects.filter(pk=broadcast.pk).update(
+            processed=F('processed') + len(recipient_ids),
+            sent=F('sent') + len(messages),
+            threads_created=F('threads_created') + threads_created,
+            locked_until=timezone.now() + lease,
+        )
+        # bulk inserts send no post_save: drop the affected recent-message buffers instead
+        transaction.on_commit(lambda: recent_messages.invalidate(threads.values()))
+
+
+def run_broadcast(
+    broadcast: Broadcast,
+    chunk_size: Optional[int] = None,
+    lease: timedelta = timedelta(minutes=5),
+) -> Iterator[Broadcast]:
+    """
+    Send the rest of the broadcast chunk by chunk, yielding it (refreshed) after every chunk.
+    """
+    chunk_size = chunk_size or _config().get('CHUNK_SIZE', 500)
+    while broadcast.processed < len(broadcast.recipient_ids):
+        chunk = broadcast.recipient_ids[broadcast.processed:broadcast.processed + chunk_size]
+        send_chunk(broadcast, chunk, lease)
+        broadcast.refresh_from_db(fields=['processed', 'sent', 'threads_created', 'locked_until'])
+        yield broadcast
+
+    broadcast.status, broadcast.finished_at, broadcast.locked_until = Broadcast.DONE, timezone.now(), None
+    broadcast.save(update_fields=['status', 'finished_at', 'locked_until'])
+
+
+def claim_broadcast(lease: timedelta = timedelta(minutes=5)) -> Optional[Broadcast]:
+    """
+    Claim the oldest unfinished broadcast that no worker holds (or whose worker's lease ran out).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = Broadcast.objects.filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lte=now),
+            status__in=[Broadcast.PENDING, Broadcast.RUNNING],
+        ).order_by('id')
+        if connections['default'].features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        broadcast = queryset.first()
+        if broadcast is not None:
+            broadcast.status, broadcast.locked_until = Broadcast.RUNNING, now + lease
+            broadcast.save(update_fields=['status', 'locked_until'])
+    return broadcast
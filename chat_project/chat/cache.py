@@ -0,0 +1,132 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+__all__ = (
+    "get_threads",
+    "set_threads",
+    "invalidate_threads",
+    "shared_between_requests",
+)
+
+# Bump whenever ThreadSerializer's output changes: entries written by older code are then ignored.
+THREAD_CACHE_VERSION = 1
+
+
+# representations already fetched in the current batch request (see `shared_between_requests`)
+_local: ContextVar[Optional[dict[int, dict[str, Any]]]] = ContextVar('chat_thread_cache_local', default=None)
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_THREAD_CACHE', {})
+
+
+def _cache():
+    return caches[_config().get('ALIAS', 'default')]
+
+
+def _version_key(thread_id: int) -> str:
+    return f'chat:thread:version:{thread_id}'
+
+
+def _key(thread_id: int, version: int) -> str:
+    return f'chat:thread:{thread_id}:{version}'
+
+
+def _versions(thread_ids: list[int]) -> dict[int, int]:
+    """
+    Current per-thread versions. Counters start at a random value, so a counter evicted from the
+    cache and created again never matches an entry written before the eviction.
+    """
+    keys = {_version_key(thread_id): thread_id for thread_id in thread_ids}
+    versions = {keys[key]: value for key, value in _cache().get_many(list(keys)).items()}
+    missing = [key for key, thread_id in keys.items() if thread_id not in versions]
+    for key in missing:
+        _cache().add(key, random.getrandbits(62), timeout=None)
+    if missing:
+        versions.update((keys[key], value) for key, value in _cache().get_many(missing).items())
+    return versions
+
+
+def get_threads(
+    thread_ids: Iterable[int], versions: Optional[dict[int, int]] = None
+) -> dict[int, dict[str, Any]]:
+    """
+    Fetch cached serialized threads in two round-trips (their versions, then the entries); missing
+    threads are absent from the result. Pass `versions` to get the version read for each thread,
+    for `set_threads` to store what is read from the database after this call.
+    """
+    local = _local.get()
+    thread_ids = set(thread_ids)
+    result = {thread_id: dict(local[thread_id]) for thread_id in thread_ids if thread_id in local} if local else {}
+    current = _versions([thread_id for thread_id in thread_ids if thread_id not in result])
+    if versions is not None:
+        versions.update(current)
+    keys = {_key(thread_id, version): thread_id for thread_id, version in current.items()}
+    if not keys:
+        return result
+    found = {keys[key]: value for key, value in _cache().get_many(list(keys), version=THREAD_CACHE_VERSION).items()}
+    if local is not None:
+        local.update((thread_id, dict(data)) for thread_id, data in found.items())
+    result.update(found)
+    return result
+
+
+def set_threads(representations: dict[int, dict[str, Any]], versions: dict[int, int]) -> None:
+    """
+    Store representations under the versions `get_threads` read before they were built: if the thread
+    changed in between, its version moved on and the entry is never read.
+    """
+    local = _local.get()
+    if local is not None:
+        local.update((thread_id, dict(data)) for thread_id, data in representations.items())
+    entries = {
+        _key(thread_id, versions[thread_id]): dict(data)
+        for thread_id, data in representations.items()
+        if thread_id in versions
+    }
+    if entries:
+        _cache().set_many(entries, timeout=_config().get('TIMEOUT', 3600), version=THREAD_CACHE_VERSION)
+
+
+def _bump(thread_ids: list[int]) -> None:
+    for thread_id in thread_ids:
+        try:
+            _cache().incr(_version_key(thread_id))
+        except ValueError:  # missing or evicted: the next reader starts a new counter
+            pass
+
+
+def invalidate_threads(thread_ids: Iterable[int], using: str = 'default') -> None:
+    """
+    Move the threads' versions on now and again once the transaction on `using` commits (right away
+    in autocommit): a reader that missed the cache before the commit may have cached the old state
+    under the version in between.
+    """
+    thread_ids = list(thread_ids)
+    local = _local.get()
+    if local is not None:
+        for thread_id in thread_ids:
+            local.pop(thread_id, None)
+    if thread_ids:
+        _bump(thread_ids)
+        transaction.on_commit(lambda: _bump(thread_ids), using=using)
+
+
+@contextmanager
+def shared_between_requests() -> Iterator[dict[int, dict[str, Any]]]:
+    """
+    Keep the thread representations read or written inside the block in memory as well, so requests
+    run one after another in the block (the sub-requests of a batch) fetch each thread only once.
+    """
+    local: dict[int, dict[str, Any]] = {}
+    token = _local.set(local)
+    try:
+        yield local
+    finally:
+        _local.reset(token)
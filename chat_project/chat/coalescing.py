@@ -0,0 +1,89 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, TypeVar
+
+from django.conf import settings
+
+__all__ = (
+    "SingleFlight",
+    "single_flight",
+)
+
+T = TypeVar('T')
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_COALESCING', {})
+
+
+@dataclass
+class FlightStats:
+    requests: int = 0
+    executions: int = 0
+
+    def as_dict(self) -> dict[str, Any]:
+        collapsed = self.requests - self.executions
+        return {
+            'requests': self.requests,
+            'executions': self.executions,
+            'collapsed': collapsed,
+            'collapse_ratio': round(collapsed / self.requests, 4) if self.requests else 0.0,
+        }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one: the first caller (the leader) runs the
+    function, callers arriving while it runs wait for its result (or its exception) instead of
+    running it again. Nothing is kept once the call finishes, so results are never stale.
+
+    Waiting is thread-based: it works for threaded WSGI workers and for ASGI, where Django runs every
+    request's sync view in its own thread. A waiter whose leader takes longer than `CHAT_COALESCING['TIMEOUT']`
+    seconds runs the function itself. Per-`group` counters feed the metrics endpoint.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+        self._stats: defaultdict[str, FlightStats] = defaultdict(FlightStats)
+
+    def do(self, group: str, key: Hashable, func: Callable[[], T]) -> T:
+        with self._lock:
+            self._stats[group].requests += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self._stats[group].executions += 1
+
+        if not leader:
+            try:
+                return future.result(timeout=_config().get('TIMEOUT', 10))
+            except FutureTimeoutError:
+                with self._lock:
+                    self._stats[group].executions += 1
+                return func()
+
+        try:
+            result = func()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            return {group: stats.as_dict() for group, stats in sorted(self._stats.items())}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+single_flight = SingleFlight()
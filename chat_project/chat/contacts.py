@@ -0,0 +1,133 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.db.models.functions import Coalesce
+
+from .models import Thread
+
+__all__ = (
+    "get_contacts",
+    "record_threads",
+    "record_messages",
+    "invalidate_threads",
+    "invalidate_users",
+)
+
+# Bump whenever the cached adjacency format changes.
+CONTACTS_CACHE_VERSION = 1
+
+# {counterpart user id: last interaction}, the newest message (or the creation) of any live shared thread
+Adjacency = dict[int, datetime]
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_CONTACTS', {})
+
+
+def _cache():
+    return caches[_config().get('CACHE', 'default')]
+
+
+def _key(user_id: int) -> str:
+    return f'chat:contacts:{user_id}'
+
+
+def _build(user_id: int) -> Adjacency:
+    """
+    One aggregate over the participant rows of the user's live threads.
+    """
+    through = Thread.participants.through
+    threads = through.objects.filter(user_id=user_id, thread__deleted_at__isnull=True).values('thread_id')
+    rows = (
+        through.objects.filter(thread_id__in=threads)
+        .exclude(user_id=user_id)
+        .values('user_id')
+        .annotate(last_interaction=Max(Coalesce('thread__last_message_at', 'thread__created')))
+        .values_list('user_id', 'last_interaction')
+    )
+    return dict(rows)
+
+
+def get_contacts(user_id: int) -> Adjacency:
+    """
+    The user's conversation partners, from the cache; built with one query on a miss.
+    """
+    adjacency = _cache().get(_key(user_id), version=CONTACTS_CACHE_VERSION)
+    if adjacency is None:
+        adjacency = _build(user_id)
+        _cache().set(_key(user_id), adjacency, timeout=_config().get('TIMEOUT', 3600), version=CONTACTS_CACHE_VERSION)
+    return adjacency
+
+
+def _touch(threads: dict[int, datetime]) -> None:
+    """
+    Move the last interaction of every participant pair of `threads` forward, in the adjacency lists
+    that are cached (the others are built fresh on their next read).
+
+    A plain read-modify-write: a concurrent update from another worker may be lost, which only makes
+    a last-interaction time lag until the entry expires (`CHAT_CONTACTS['TIMEOUT']`).
+    """
+    participants = defaultdict(list)
+    rows = Thread.participants.through.objects.filter(thread_id__in=threads).values_list('thread_id', 'user_id')
+    for thread_id, user_id in rows:
+        participants[thread_id].append(user_id)
+
+    keys = {_key(user_id): user_id for user_ids in participants.values() for user_id in user_ids}
+    cached = _cache().get_many(list(keys), version=CONTACTS_CACHE_VERSION)
+    if not cached:
+        return
+    adjacencies = {keys[key]: adjacency for key, adjacency in cached.items()}
+    for thread_id, user_ids in participants.items():
+        at = threads[thread_id]
+        for user_id in user_ids:
+            if user_id not in adjacencies:
+                continue
+            for other_id in user_ids:
+                if other_id != user_id and (other_id not in adjacencies[user_id] or adjacencies[user_id][other_id] < at):
+                    adjacencies[user_id][other_id] = at
+    _cache().set_many(
+        {_key(user_id): adjacency for user_id, adjacency in adjacencies.items()},
+        timeout=_config().get('TIMEOUT', 3600),
+        version=CONTACTS_CACHE_VERSION,
+    )
+
+
+def record_threads(thread_ids: Iterable[int]) -> None:
+    """
+    Participants were added to live threads: link them in the cached adjacency lists.
+    """
+    threads = dict(
+        Thread.objects.filter(pk__in=set(thread_ids))
+        .annotate(last_interaction=Coalesce('last_message_at', 'created'))
+        .values_list('id', 'last_interaction')
+    )
+    if threads:
+        _touch(threads)
+
+
+def record_messages(newest: dict[int, datetime]) -> None:
+    """
+    New messages (`{thread_id: created of the newest one}`): move the participants' last interaction forward.
+    """
+    if newest:
+        _touch(newest)
+
+
+def invalidate_users(user_ids: Iterable[int]) -> None:
+    keys = [_key(user_id) for user_id in set(user_ids)]
+    if keys:
+        _cache().delete_many(keys, version=CONTACTS_CACHE_VERSION)
+
+
+def invalidate_threads(thread_ids: Iterable[int]) -> None:
+    """
+    Threads were deleted or lost participants: a pair may still share another thread, so the
+    participants' adjacency lists are dropped and rebuilt on their next read.
+    """
+    invalidate_users(
+        Thread.participants.through.objects.filter(thread_id__in=set(thread_ids)).values_list('user_id', flat=True)
+    )
@@ -0,0 +1,24 @@
+from typing import Any
+
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+__all__ = (
+    "apply_sqlite_profile",
+)
+
+
+def apply_sqlite_profile(sender: Any = None, connection: BaseDatabaseWrapper = None, **kwargs: Any) -> None:
+    """
+    `connection_created` receiver that applies `SQLITE_PRAGMAS` to every new SQLite connection
+    when `SQLITE_PERFORMANCE_PROFILE` is enabled.
+
+    PRAGMAs such as `synchronous` cannot be changed inside a transaction, which is why they are
+    applied right after the connection is opened instead of per request.
+    """
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_PERFORMANCE_PROFILE', False):
+        return
+
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
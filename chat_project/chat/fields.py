@@ -0,0 +1,83 @@
+import base64
+import logging
+import zlib
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db import models
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+__all__ = (
+    "CompressedTextField",
+    "COMPRESSED_MARKER",
+    "compress_text",
+    "decompress_text",
+)
+
+logger = logging.getLogger(__name__)
+
+# Stored values start with the marker and the algorithm name, e.g. "\x1ezlib:<base85 payload>".
+# U+001E (record separator) doesn't occur in normal text and is valid in every backend's text type.
+COMPRESSED_MARKER = '\x1e'
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_MESSAGE_COMPRESSION', {})
+
+
+def compress_text(value: str) -> str:
+    """
+    Compress `value` if its UTF-8 size reaches `THRESHOLD` bytes and compression actually pays off.
+    """
+    threshold = _config().get('THRESHOLD')
+    raw = value.encode()
+    if threshold is None or len(raw) < threshold or value.startswith(COMPRESSED_MARKER):
+        return value
+
+    algorithm = _config().get('ALGORITHM', 'zlib')
+    if algorithm == 'zstd' and zstandard is None:
+        logger.warning("zstandard is not installed, falling back to zlib")
+        algorithm = 'zlib'
+
+    if algorithm == 'zstd':
+        payload = zstandard.ZstdCompressor(level=_config().get('LEVEL', 3)).compress(raw)
+    else:
+        payload = zlib.compress(raw, _config().get('LEVEL', 6))
+
+    compressed = f'{COMPRESSED_MARKER}{algorithm}:{base64.b85encode(payload).decode("ascii")}'
+    return compressed if len(compressed) < len(raw) else value
+
+
+def decompress_text(value: Optional[str]) -> Optional[str]:
+    if not value or not value.startswith(COMPRESSED_MARKER):
+        return value
+
+    algorithm, _, payload = value[1:].partition(':')
+    payload = base64.b85decode(payload)
+    if algorithm == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("A message is stored zstd-compressed but zstandard is not installed.")
+        return zstandard.ZstdDecompressor().decompress(payload).decode()
+    return zlib.decompress(payload).decode()
+
+
+class CompressedTextField(models.TextField):
+    """
+    `TextField` that stores large values compressed (see `CHAT_MESSAGE_COMPRESSION`)
+    and always hands back plain text, so serializers, admin and Python code never see the stored form.
+
+    Database-side text lookups (`icontains`, ...) only see the plain text of uncompressed rows.
+    """
+    def from_db_value(self, value: Any, expression, connection) -> Optional[str]:
+        return decompress_text(value)
+
+    def to_python(self, value: Any) -> Optional[str]:
+        return decompress_text(super().to_python(value))
+
+    def get_prep_value(self, value: Any) -> Optional[str]:
+        value = super().get_prep_value(value)
+        return value if value is None else compress_text(value)
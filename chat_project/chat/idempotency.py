@@ -0,0 +1,137 @@
+import hashlib
+import json
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Optional, Union
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+from .stores import get_store
+
+__all__ = (
+    "StoredResponse",
+    "IdempotencyKeyInUse",
+    "IdempotencyKeyReused",
+    "fingerprint",
+    "begin",
+    "complete",
+    "complete_later",
+    "prune_expired",
+)
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_IDEMPOTENCY', {})
+
+
+class IdempotencyKeyInUse(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being processed."
+    default_code = 'idempotency_key_in_use'
+
+
+class IdempotencyKeyReused(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = "This Idempotency-Key was already used for a different request."
+    default_code = 'idempotency_key_reused'
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: Optional[int]  # None while the first request is still running
+    data: Any
+
+    def replay(self) -> Response:
+        return Response(self.data, status=self.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def fingerprint(request: Request) -> str:
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+def _front_key(user_id: int, key: str) -> str:
+    return f'idempotency:{user_id}:{key}'
+
+
+def begin(user_id: int, key: str, request_fingerprint: str) -> Union[StoredResponse, IdempotencyKey]:
+    """
+    Look the key up, per-worker front cache first, then the key table. Returns the stored response
+    of an earlier request, or claims the key for this one and returns the new row.
+
+    Must run inside the request's transaction: the claim is only visible once the request commits,
+    and a concurrent request with the same key waits on the unique index until then.
+    """
+    front = get_store('idempotency')
+    cached = front.get(_front_key(user_id, key))
+    if cached is not None:
+        return cached
+
+    now = timezone.now()
+    record = IdempotencyKey.objects.filter(user_id=user_id, key=key).first()
+    if record is not None and record.expires_at > now:
+        return StoredResponse(record.fingerprint, record.status_code, record.response)
+    try:
+        with transaction.atomic():
+            if record is not None:
+                record.delete()
+            return IdempotencyKey.objects.create(
+                user_id=user_id,
+                key=key,
+                fingerprint=request_fingerprint,
+                expires_at=now + timedelta(seconds=_config().get('TTL', 24 * 3600)),
+            )
+    except IntegrityError:  # claimed (and committed) by a concurrent request meanwhile
+        record = IdempotencyKey.objects.get(user_id=user_id, key=key)
+        return StoredResponse(record.fingerprint, record.status_code, record.response)
+
+
+def complete(record: IdempotencyKey, response: Response) -> None:
+    """
+    Store the response for replay; it reaches the front cache only once the request has committed.
+    """
+    record.status_code, record.response = response.status_code, response.data
+    record.save(update_fields=['status_code', 'response'])
+
+    stored = StoredResponse(record.fingerprint, record.status_code, record.response)
+    ttl = min(_config().get('FRONT_CACHE_TTL', 600), (record.expires_at - timezone.now()).total_seconds())
+    transaction.on_commit(lambda: get_store('idempotency').set(_front_key(record.user_id, record.key), stored, ttl))
+
+
+def complete_later(record: IdempotencyKey, future: Future, to_response: Callable[[Any], Response]) -> None:
+    """
+    For an action whose write was still pending when the request ended (`future`): once it settles,
+    store its response (`to_response(result)`) for replay, or release the key if it failed.
+    """
+    def settle(future: Future) -> None:
+        if not future.cancelled() and future.exception() is None:
+            complete(record, to_response(future.result()))
+        else:
+            record.delete()
+
+    future.add_done_callback(settle)
+
+
+def prune_expired(chunk_size: int = 1000) -> int:
+    """
+    Delete expired keys in index-ordered chunks; returns the number deleted.
+    """
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .order_by('expires_at')
+            .values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.retention import get_rules, purge_expired
+from chat.sharding import message_shards
+
+
+class Command(BaseCommand):
+    """
+    Background worker that deletes messages expired by `CHAT_RETENTION_RULES`.
+
+    Every rule runs on every message shard in index-ordered batches (one short transaction each),
+    pausing `--sleep` seconds between batches. Progress is reported per batch: rows deleted so far
+    and the deletion rate.
+
+    python manage.py apply_retention --dry-run
+    python manage.py apply_retention --chunk-size 2000 --sleep 0.1 --loop
+    """
+    help = "Delete messages expired by the configured retention rules."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Messages deleted per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between batches.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be deleted.")
+        parser.add_argument('--loop', action='store_true', help="Keep applying the rules.")
+        parser.add_argument('--poll-interval', type=float, default=3600.0, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        rules = get_rules()
+        if not rules:
+            return "No retention rules configured (CHAT_RETENTION_RULES)"
+
+        if options['dry_run']:
+            total = 0
+            for rule in rules:
+                for alias in message_shards():
+                    count = rule.count(alias)
+                    total += count
+                    self.stdout.write(f"{rule} on {alias}: {count} message(s) would be deleted")
+            return f"Would delete {total} message(s)"
+
+        while True:
+            deleted = sum(
+                self.apply(rule, alias, options['chunk_size'], options['sleep'])
+                for rule in rules
+                for alias in message_shards()
+            )
+            if not options['loop']:
+                return f"Deleted {deleted} message(s)"
+            time.sleep(options['poll_interval'])
+
+    def apply(self, rule, alias: str, chunk_size: int, sleep: float) -> int:
+        deleted, batches, started = 0, 0, time.monotonic()
+        for batch_deleted in purge_expired(rule, alias, chunk_size=chunk_size):
+            deleted += batch_deleted
+            batches += 1
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{rule} on {alias}: batch {batches}, {deleted} message(s) deleted, "
+                f"{deleted / elapsed if elapsed else 0:.0f} rows/s"
+            )
+            if sleep:
+                time.sleep(sleep)
+        return deleted
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from chat.models import Thread, Message
+from chat.sharding import group_by_shard
+
+
+class Command(BaseCommand):
+    """
+    Set `Thread.last_message_at` from the newest message of each thread, reading every message shard.
+
+    Migration 0008 backfills only from the database it runs on; with sharded messages run this once
+    after migrating, since the message timeline skips threads without `last_message_at`. Threads are
+    walked in primary-key order in chunks; the guarded update only ever moves the value forward, so the
+    command is safe to run while messages are being sent, and to re-run.
+
+    python manage.py backfill_last_message_at
+    python manage.py backfill_last_message_at --all --chunk-size 500
+    """
+    help = "Backfill Thread.last_message_at from the messages on every shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Threads examined per chunk.")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between chunks.")
+        parser.add_argument('--all', action='store_true', help="Also check threads that already have a value.")
+
+    def handle(self, *args, **options):
+        threads = Thread.all_objects.all()
+        if not options['all']:
+            threads = threads.filter(last_message_at__isnull=True)
+
+        last_id, examined, updated = 0, 0, 0
+        while True:
+            ids = list(threads.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            for alias, thread_ids in group_by_shard(ids).items():
+                newest = (
+                    Message.objects.using(alias).filter(thread_id__in=thread_ids)
+                    .values('thread_id').annotate(newest=Max('created')).values_list('thread_id', 'newest')
+                )
+                for thread_id, created_at in newest:
+                    Thread.record_message(thread_id, created_at)
+                    updated += 1
+
+            last_id = ids[-1]
+            examined += len(ids)
+            self.stdout.write(f"examined {examined} thread(s), updated {updated} (last id {last_id})")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return f"Backfilled last_message_at of {updated} thread(s)"
@@ -0,0 +1,64 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models.functions import Length
+
+from chat.fields import COMPRESSED_MARKER
+from chat.models import Message
+from chat.sharding import message_shards
+
+
+class Command(BaseCommand):
+    """
+    Compress the bodies of existing messages that reach `CHAT_MESSAGE_COMPRESSION['THRESHOLD']`.
+
+    Rows of every message shard are walked in primary-key order in chunks (one short transaction each),
+    so the command can be stopped and re-run at any time; already compressed rows are skipped.
+
+    python manage.py compress_messages
+    python manage.py compress_messages --chunk-size 500 --sleep 0.1
+    """
+    help = "Compress large message bodies in place, in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows examined per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        threshold = getattr(settings, 'CHAT_MESSAGE_COMPRESSION', {}).get('THRESHOLD')
+        if threshold is None:
+            raise CommandError("Message compression is disabled (CHAT_MESSAGE_COMPRESSION['THRESHOLD'] is None).")
+
+        compressed = sum(
+            self.compress_shard(alias, threshold, options['chunk_size'], options['sleep'])
+            for alias in message_shards()
+        )
+        return f"Compressed {compressed} message(s)"
+
+    def compress_shard(self, alias: str, threshold: int, chunk_size: int, sleep: float) -> int:
+        # a UTF-8 character takes at most 4 bytes, so shorter rows can never reach the threshold
+        candidates = (
+            Message.objects.using(alias)
+            .annotate(text_length=Length('text'))
+            .filter(text_length__gte=threshold // 4)
+            .exclude(text__startswith=COMPRESSED_MARKER)
+        )
+
+        last_id, examined, compressed = 0, 0, 0
+        while True:
+            with transaction.atomic(using=alias):
+                messages = list(candidates.filter(pk__gt=last_id).order_by('pk').only('id', 'text')[:chunk_size])
+                if not messages:
+                    break
+                large = [message for message in messages if len(message.text.encode()) >= threshold]
+                Message.objects.using(alias).bulk_update(large, ['text'])
+
+            last_id = messages[-1].pk
+            examined += len(messages)
+            compressed += len(large)
+            self.stdout.write(f"{alias}: examined {examined}, compressed {compressed} (last id {last_id})")
+            if sleep:
+                time.sleep(sleep)
+        return compressed
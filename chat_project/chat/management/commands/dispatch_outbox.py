@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.outbox import dispatch_batch
+from chat.sharding import message_shards
+
+
+class Command(BaseCommand):
+    """
+    Background worker that drains the new-message outbox.
+
+    Events are claimed in batches from every message shard, coalesced per recipient and handed to
+    `CHAT_OUTBOX_HANDLERS`. Several dispatchers can run side by side.
+
+    python manage.py dispatch_outbox
+    python manage.py dispatch_outbox --batch-size 1000 --loop
+    """
+    help = "Deliver pending new-message outbox events."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Events claimed per batch.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new events.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to wait when idle with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            claimed = 0
+            for alias in message_shards():
+                result = dispatch_batch(batch_size=options['batch_size'], using=alias)
+                if result.claimed:
+                    claimed += result.claimed
+                    self.stdout.write(
+                        f"{alias}: claimed {result.claimed}, delivered {result.delivered}, "
+                        f"retried {result.retried}, dropped {result.dropped}"
+                    )
+            if claimed:
+                continue
+            if not options['loop']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.models import Thread
+from chat.purge import purge_thread_messages, purge_thread
+from chat.sharding import shard_for_thread
+
+
+class Command(BaseCommand):
+    """
+    Background worker that purges soft-deleted threads.
+
+    Messages are deleted in chunks (one short transaction per chunk), then the thread row itself.
+    A thread stays soft-deleted until it is fully purged, so an interrupted run resumes on the next one.
+
+    python manage.py purge_deleted_threads
+    python manage.py purge_deleted_threads --chunk-size 5000 --sleep 0.05 --loop
+    """
+    help = "Purge messages of soft-deleted threads in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Messages deleted per transaction.")
+        parser.add_argument('--sleep', type=float, default=0.0, help="Seconds to pause between chunks.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for newly deleted threads.")
+        parser.add_argument('--poll-interval', type=float, default=30.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            purged_threads = self.purge_all(options['chunk_size'], options['sleep'])
+            if not options['loop']:
+                return f"Purged {purged_threads} thread(s)"
+            time.sleep(options['poll_interval'])
+
+    def purge_all(self, chunk_size: int, sleep: float) -> int:
+        purged_threads = 0
+        for thread in list(Thread.all_objects.deleted().order_by('deleted_at', 'id')):
+            purged_messages = 0
+            for deleted in purge_thread_messages(thread.id, chunk_size=chunk_size, using=shard_for_thread(thread.id)):
+                purged_messages += deleted
+                self.stdout.write(f"thread {thread.id}: {purged_messages} message(s) purged")
+                if sleep:
+                    time.sleep(sleep)
+
+            purge_thread(thread)
+            purged_threads += 1
+            self.stdout.write(f"thread {thread.id}: done ({purged_messages} message(s))")
+        return purged_threads
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from chat.idempotency import prune_expired
+
+
+class Command(BaseCommand):
+    """
+    Delete idempotency keys older than `CHAT_IDEMPOTENCY['TTL']`, in chunks. Expired keys are already
+    ignored by the API; this only keeps the table small. Run it periodically (e.g. hourly from cron).
+
+    python manage.py purge_idempotency_keys
+    python manage.py purge_idempotency_keys --chunk-size 5000
+    """
+    help = "Delete expired idempotency keys."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Keys deleted per query.")
+
+    def handle(self, *args, **options):
+        return f"Deleted {prune_expired(options['chunk_size'])} expired idempotency key(s)"
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chat.models import Message, OutboxEvent
+from chat.purge import delete_messages
+from chat.sharding import message_shards, shard_for_thread
+from chat.signals import messages_purged
+
+
+class Command(BaseCommand):
+    """
+    Move messages (and their pending outbox events) to the shard their thread maps to.
+
+    Needed after `CHAT_MESSAGE_SHARDS` changes. Each chunk is copied with its ids and then deleted from
+    the source shard; copies ignore conflicts, so an interrupted run can simply be started again.
+    Readers may briefly miss a thread's messages while it is being moved.
+
+    python manage.py rebalance_message_shards --dry-run
+    python manage.py rebalance_message_shards --chunk-size 2000 --sleep 0.1
+    """
+    help = "Move messages to the shard their thread belongs to."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Messages moved per transaction.")
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between chunks.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be moved.")
+
+    def handle(self, *args, **options):
+        moved = 0
+        for source in message_shards():
+            thread_ids = Message.objects.using(source).order_by().values_list('thread_id', flat=True).distinct()
+            for thread_id in thread_ids:
+                target = shard_for_thread(thread_id)
+                if target == source:
+                    continue
+                if options['dry_run']:
+                    count = Message.objects.using(source).filter(thread_id=thread_id).count()
+                    self.stdout.write(f"thread {thread_id}: {count} message(s) {source} -> {target}")
+                    moved += count
+                    continue
+                moved += self.move_thread(thread_id, source, target, options['chunk_size'], options['sleep'])
+
+        if options['dry_run']:
+            return f"Would move {moved} message(s)"
+        return f"Moved {moved} message(s)"
+
+    def move_thread(self, thread_id: int, source: str, target: str, chunk_size: int, sleep: float) -> int:
+        moved = 0
+        while True:
+            messages = list(Message.objects.using(source).filter(thread_id=thread_id).order_by('pk')[:chunk_size])
+            if not messages:
+                break
+            ids = [message.pk for message in messages]
+            events = list(OutboxEvent.objects.using(source).filter(message_id__in=ids))
+
+            with transaction.atomic(using=target):
+                Message.objects.using(target).bulk_create(messages, ignore_conflicts=True)
+                OutboxEvent.objects.using(target).bulk_create(events, ignore_conflicts=True)
+            with transaction.atomic(using=source):
+                delete_messages(ids, using=source)
+            messages_purged.send(sender=Message, thread_ids={thread_id}, using=source)
+
+            moved += len(messages)
+            self.stdout.write(f"thread {thread_id}: moved {moved} message(s) {source} -> {target}")
+            if sleep:
+                time.sleep(sleep)
+        return moved
@@ -0,0 +1,48 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from chat.broadcast import claim_broadcast, run_broadcast
+
+
+class Command(BaseCommand):
+    """
+    Background worker that sends queued staff broadcasts.
+
+    Each broadcast is claimed with a lease (renewed after every chunk) and sent `--chunk-size` recipients
+    per transaction; progress is reported per chunk and stored, so a broadcast whose worker died is
+    resumed by the next one once the lease runs out. Several workers can run side by side.
+
+    python manage.py send_broadcasts
+    python manage.py send_broadcasts --chunk-size 1000 --loop
+    """
+    help = "Send queued broadcasts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=None, help="Recipients per transaction.")
+        parser.add_argument('--lease', type=float, default=300.0, help="Seconds a broadcast is held per chunk.")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new broadcasts.")
+        parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds to wait when idle with --loop.")
+
+    def handle(self, *args, **options):
+        lease = timedelta(seconds=options['lease'])
+        while True:
+            broadcast = claim_broadcast(lease)
+            if broadcast is not None:
+                self.send(broadcast, options['chunk_size'], lease)
+                continue
+            if not options['loop']:
+                return
+            time.sleep(options['poll_interval'])
+
+    def send(self, broadcast, chunk_size, lease: timedelta) -> None:
+        total, started, resumed_at = len(broadcast.recipient_ids), time.monotonic(), broadcast.processed
+        for progress in run_broadcast(broadcast, chunk_size=chunk_size, lease=lease):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"broadcast {progress.pk}: {progress.processed}/{total} recipients, {progress.sent} sent, "
+                f"{progress.threads_created} threads created, "
+                f"{(progress.processed - resumed_at) / elapsed if elapsed else 0:.0f} recipients/s"
+            )
+        self.stdout.write(f"broadcast {broadcast.pk}: done")
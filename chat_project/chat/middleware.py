@@ -0,0 +1,75 @@
+import threading
+import time
+from typing import Callable
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest, HttpResponse, JsonResponse
+
+__all__ = (
+    "LoadSheddingMiddleware",
+)
+
+
+class LoadSheddingMiddleware:
+    """
+    Reject API requests with `503 Service Unavailable` + `Retry-After` while the worker is overloaded.
+
+    Two signals are tracked per process, without any I/O:
+    - in-flight requests: only the requests this process is running concurrently. A sync worker runs one
+      at a time, so `MAX_IN_FLIGHT` only applies to threaded or async workers; requests waiting in the
+      server's listen backlog are never seen, and that queue has to be bounded by the server itself;
+    - an exponentially weighted average of DB query latency, which decays with `DB_LATENCY_HALF_LIFE`
+      while no queries run, so a shedding worker recovers on its own.
+
+    Limits come from `CHAT_LOAD_SHEDDING`; a limit of `None` disables that signal.
+    """
+    def __init__(self, get_response: Callable[[HttpRequest], HttpResponse]):
+        self.get_response = get_response
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.db_latency = 0.0  # seconds
+        self.db_latency_updated = time.monotonic()
+
+    @property
+    def config(self) -> dict:
+        return getattr(settings, 'CHAT_LOAD_SHEDDING', {})
+
+    def current_db_latency(self) -> float:
+        half_life = self.config.get('DB_LATENCY_HALF_LIFE', 5.0)
+        return self.db_latency * 0.5 ** ((time.monotonic() - self.db_latency_updated) / half_life)
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self.db_latency = 0.8 * self.current_db_latency() + 0.2 * (finished - started)
+                self.db_latency_updated = finished
+
+    def is_overloaded(self) -> bool:
+        max_in_flight = self.config.get('MAX_IN_FLIGHT')
+        max_db_latency_ms = self.config.get('MAX_DB_LATENCY_MS')
+        if max_in_flight is not None and self.in_flight > max_in_flight:
+            return True
+        return max_db_latency_ms is not None and self.current_db_latency() * 1000 > max_db_latency_ms
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        if not request.path.startswith(tuple(self.config.get('PATHS', ('/api/',)))):
+            return self.get_response(request)
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            if self.is_overloaded():
+                response = JsonResponse({"detail": "Server is overloaded, please retry later."}, status=503)
+                response['Retry-After'] = str(self.config.get('RETRY_AFTER', 1))
+                return response
+
+            with connection.execute_wrapper(self.record_query):
+                return self.get_response(request)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:39
+
+import chat.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_outboxevent'),
+    ]
+
+    operations = [
+        # the column stays `text`; state-only, so SQLite doesn't rebuild the whole messages table
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='message',
+                    name='text',
+                    field=chat.fields.CompressedTextField(),
+                ),
+            ],
+        ),
+    ]
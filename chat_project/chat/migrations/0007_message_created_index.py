@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_message_shards'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['created', 'id'], name='chat_message_created_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:58
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_last_message_at(apps, schema_editor):
+    """
+    Threads and messages share this database unless messages are sharded. Threads whose messages live
+    on other shards keep None (and stay out of the message timeline) until their next message:
+    with sharded messages, run `python manage.py backfill_last_message_at` after migrating.
+    """
+    Thread = apps.get_model('chat', 'Thread')
+    Message = apps.get_model('chat', 'Message')
+    using = schema_editor.connection.alias
+    tables = schema_editor.connection.introspection.table_names()
+    if Thread._meta.db_table not in tables or Message._meta.db_table not in tables:
+        return
+
+    newest = (
+        Message.objects.using(using).filter(thread=OuterRef('pk'))
+        .order_by().values('thread').annotate(newest=Max('created')).values('newest')
+    )
+    Thread.objects.using(using).update(last_message_at=Subquery(newest))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_created_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thread',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['thread', 'created', 'id'], name='chat_message_thread_time_idx'),
+        ),
+        migrations.RunPython(backfill_last_message_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-19 03:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='thread',
+            index=models.Index(fields=['last_message_at', 'id'], name='chat_thread_last_message_idx'),
+        ),
+    ]
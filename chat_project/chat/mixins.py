@@ -0,0 +1,153 @@
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpRequest
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import idempotency, presence
+from .coalescing import single_flight
+
+__all__ = (
+    "TransactionPolicyMixin",
+    "PresenceMixin",
+    "IdempotencyMixin",
+    "CoalescingMixin",
+)
+
+
+class TransactionPolicyMixin:
+    """
+    Per-action transaction policy for viewsets.
+
+    `ATOMIC_REQUESTS` is disabled project-wide, so by default:
+    - actions reached through a safe HTTP method (`GET`, `HEAD`, `OPTIONS`) run in autocommit;
+    - every other action runs inside `transaction.atomic()` and is rolled back when it ends
+      with an error response.
+
+    `atomic_actions` / `non_atomic_actions` override the HTTP-method default for named actions.
+    """
+    atomic_actions: frozenset[str] = frozenset()
+    non_atomic_actions: frozenset[str] = frozenset()
+    transaction_using: Optional[str] = None
+
+    def is_atomic_request(self, request: HttpRequest) -> bool:
+        action_map = getattr(self, 'action_map', None) or {}
+        action = action_map.get(request.method.lower())
+
+        if action in self.non_atomic_actions:
+            return False
+        if action in self.atomic_actions:
+            return True
+        return request.method not in ('GET', 'HEAD', 'OPTIONS')
+
+    def dispatch(self, request: HttpRequest, *args: Any, **kwargs: Any) -> Response:
+        if not self.is_atomic_request(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        with transaction.atomic(using=self.transaction_using):
+            response = super().dispatch(request, *args, **kwargs)
+            # DRF only rolls back on handled errors when ATOMIC_REQUESTS is on, so do it here
+            if response.status_code >= 400:
+                transaction.set_rollback(True, using=self.transaction_using)
+        return response
+
+
+class PresenceMixin:
+    """
+    Every authenticated request counts as a presence heartbeat (in the ephemeral store, never the DB).
+    """
+    def initial(self, request: HttpRequest, *args: Any, **kwargs: Any) -> None:
+        super().initial(request, *args, **kwargs)
+        if request.user and request.user.is_authenticated:
+            presence.touch(request.user.pk)
+
+
+class IdempotencyMixin:
+    """
+    `Idempotency-Key` header support for `idempotent_actions` (see `chat.idempotency`).
+
+    The first successful response for a key is stored, in the same transaction as the action's writes,
+    and replayed to retries with the same key without running validation or writes again. A key reused
+    for a different request is rejected (`422`), as is a retry while the first request still runs (`409`).
+    Failed responses are rolled back with the transaction (or the claim is released when the action
+    runs in autocommit), so a retry after an error runs normally. After an error whose write may still
+    commit (`outcome_unknown`) the key stays claimed (retries get `409`); the action settles it once the
+    outcome is known (see `idempotency.complete_later`).
+
+    Must come after `TransactionPolicyMixin` in the bases, so the key is claimed inside its transaction.
+    """
+    idempotent_actions: frozenset[str] = frozenset({'create'})
+
+    def initial(self, request: HttpRequest, *args: Any, **kwargs: Any) -> None:
+        super().initial(request, *args, **kwargs)
+        self._idempotency_claim = None
+        key = request.headers.get('Idempotency-Key')
+        if not key or self.action not in self.idempotent_actions:
+            return
+        if len(key) > 255:
+            raise ValidationError({'Idempotency-Key': "At most 255 characters."})
+
+        request_fingerprint = idempotency.fingerprint(request)
+        outcome = idempotency.begin(request.user.pk, key, request_fingerprint)
+        if isinstance(outcome, idempotency.StoredResponse):
+            if outcome.fingerprint != request_fingerprint:
+                raise idempotency.IdempotencyKeyReused()
+            if outcome.status_code is None:
+                raise idempotency.IdempotencyKeyInUse()
+            # the handler is looked up after `initial`: answer with the stored response instead
+            setattr(self, request.method.lower(), lambda *args, **kwargs: outcome.replay())
+        else:
+            self._idempotency_claim = outcome
+
+    def handle_exception(self, exc: Exception) -> Response:
+        if getattr(exc, 'outcome_unknown', False):
+            # the write may still commit: keep the key claimed, so retries get 409 instead of writing twice
+            self._idempotency_claim = None
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request: HttpRequest, response: Response, *args: Any, **kwargs: Any) -> Response:
+        response = super().finalize_response(request, response, *args, **kwargs)
+        claim = getattr(self, '_idempotency_claim', None)
+        if claim is not None and response.status_code < 400:
+            idempotency.complete(claim, response)
+        elif claim is not None and not transaction.get_connection().in_atomic_block:
+            claim.delete()  # nothing to roll back the claim with: release the key for the retry
+        return response
+
+
+class CoalescingMixin:
+    """
+    Identical concurrent requests to `coalesced_actions` (same user, action, URL kwargs and query
+    parameters) share one execution (see `chat.coalescing`): e.g. every tab of a user polling
+    `unread` at the same moment runs the query once. Authentication, permissions and throttling
+    still run per request; only the handler is shared. Off with `CHAT_COALESCING['ENABLED']`.
+    """
+    coalesced_actions: frozenset[str] = frozenset()
+
+    def initial(self, request: HttpRequest, *args: Any, **kwargs: Any) -> None:
+        super().initial(request, *args, **kwargs)
+        enabled = getattr(settings, 'CHAT_COALESCING', {}).get('ENABLED', True)
+        if not enabled or self.action not in self.coalesced_actions:
+            return
+
+        group = f"{self.basename}.{self.action}"
+        key = (
+            group,
+            request.user.pk,
+            tuple(sorted(kwargs.items())),
+            tuple(sorted((name, tuple(values)) for name, values in request.query_params.lists())),
+        )
+        handler = getattr(self, request.method.lower())
+
+        def run() -> tuple[Any, int]:
+            response = handler(request, *args, **kwargs)
+            return response.data, response.status_code
+
+        def coalesced(*args: Any, **kwargs: Any) -> Response:
+            data, status_code = single_flight.do(group, key, run)
+            return Response(data, status=status_code)
+
+        # the handler is looked up after `initial`: run it through the single-flight group instead
+        setattr(self, request.method.lower(), coalesced)
@@ -1,12 +1,35 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
+
+from .fields import CompressedTextField
 
 __all__ = (
     "Thread",
     "Message",
+    "OutboxEvent",
+    "IdSequence",
+    "Broadcast",
+    "IdempotencyKey",
 )
 
 
+class ThreadQuerySet(models.QuerySet):
+    def alive(self) -> "ThreadQuerySet":
+        return self.filter(deleted_at__isnull=True)
+
+    def deleted(self) -> "ThreadQuerySet":
+        return self.filter(deleted_at__isnull=False)
+
+
+class ThreadManager(models.Manager.from_queryset(ThreadQuerySet)):
+    """
+    Default manager: hides soft-deleted threads (also used by `user.threads`).
+    """
+    def get_queryset(self) -> ThreadQuerySet:
+        return super().get_queryset().alive()
+
+
 class Thread(models.Model):
     participants = models.ManyToManyField(
         settings.AUTH_USER_MODEL,
@@ -14,27 +37,220 @@ class Thread(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # set by `soft_delete`; the messages are purged later by `manage.py purge_deleted_threads`
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # `created` of the newest message ever sent (never lowered by deletes), None while there is none;
+    # lets the timeline skip threads that cannot contribute to a page (see `chat.timeline`)
+    last_message_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = ThreadManager()
+    all_objects = ThreadQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # the timeline walks a user's threads newest first, by keyset (see `chat.timeline`)
+            models.Index(fields=['last_message_at', 'id'], name='chat_thread_last_message_idx'),
+        ]
 
     def __str__(self):
+        """
+        Never queries: participants are named only when they were prefetched.
+        """
         if self.id is None:
             return "Thread not saved yet"
 
-        participants = self.participants.all()
-        if participants.exists():
+        participants = getattr(self, '_prefetched_objects_cache', {}).get('participants')
+        if participants is None:
+            return f"Thread #{self.id}"
+        if participants:
             return f"Thread between {', '.join([user.email for user in participants])}"
         return "Thread with no participants"
 
+    @classmethod
+    def record_message(cls, thread_id: int, created_at) -> None:
+        """
+        Move `last_message_at` forward (one guarded `UPDATE`, no signals, no cache invalidation).
+        """
+        cls.all_objects.filter(
+            models.Q(last_message_at__isnull=True) | models.Q(last_message_at__lt=created_at), pk=thread_id
+        ).update(last_message_at=created_at)
+
+    def soft_delete(self) -> None:
+        """
+        Hide the thread instantly, without touching its messages.
+        """
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+
+
+class MessageQuerySet(models.QuerySet):
+    """
+    Without an explicit `.using()`, `create` / `bulk_create` write every message to the shard
+    of its thread (see `chat.sharding`), instead of the `default` database.
+    `bulk_create` also moves `Thread.last_message_at` (and the cached contacts) forward, as saving a message does.
+    """
+    def create(self, **kwargs) -> "Message":
+        if self._db is not None:
+            return super().create(**kwargs)
+
+        message = self.model(**kwargs)
+        message.save(force_insert=True)  # routed by `MessageShardRouter`
+        return message
+
+    def bulk_create(self, objs, *args, **kwargs) -> list["Message"]:
+        from .contacts import record_messages
+        from .sharding import group_by_shard, is_sharded, next_message_ids
+
+        objs = list(objs)
+        if is_sharded():
+            without_id = [message for message in objs if message.pk is None]
+            for message, pk in zip(without_id, next_message_ids(len(without_id))):
+                message.pk = message.id = pk
+        if self._db is None:
+            by_thread = {}
+            for message in objs:
+                by_thread.setdefault(message.thread_id, []).append(message)
+            for alias, thread_ids in group_by_shard(by_thread).items():
+                self.using(alias).bulk_create(
+                    [message for thread_id in thread_ids for message in by_thread[thread_id]], *args, **kwargs
+                )
+            return objs
+
+        created = super().bulk_create(objs, *args, **kwargs)
+        newest = {}
+        for message in created:
+            newest[message.thread_id] = max(message.created, newest.get(message.thread_id, message.created))
+        for thread_id, created_at in newest.items():
+            Thread.record_message(thread_id, created_at)
+        transaction.on_commit(lambda: record_messages(newest), using=self.db)
+        return created
+
 
 class Message(models.Model):
-    thread = models.ForeignKey(Thread, related_name='messages', on_delete=models.CASCADE)
+    # no database-level constraints: with sharding, messages live apart from threads and users
+    thread = models.ForeignKey(Thread, related_name='messages', on_delete=models.CASCADE, db_constraint=False)
     sender = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         related_name='sent_messages',
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        db_constraint=False,
     )
-    text = models.TextField()
+    text = CompressedTextField()  # large bodies are stored compressed
     created = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    objects = MessageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # age-based retention walks expired messages oldest first (see `chat.retention`)
+            models.Index(fields=['created', 'id'], name='chat_message_created_idx'),
+            # per-thread newest-first ranges for the timeline merge
+            models.Index(fields=['thread', 'created', 'id'], name='chat_message_thread_time_idx'),
+        ]
+
+    def __str__(self):
+        """
+        Never queries: the sender's email is used only when the sender was already loaded.
+        """
+        sender = self.sender.email if Message.sender.is_cached(self) else f"user {self.sender_id}"
+        return f"Message from {sender} in thread {self.thread_id}"
+
+
+class OutboxEvent(models.Model):
+    """
+    A new-message notification for one recipient, written in the same transaction as the message
+    and delivered asynchronously by `manage.py dispatch_outbox`.
+    """
+    message = models.ForeignKey(Message, related_name='outbox_events', on_delete=models.CASCADE)
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        related_name='+',
+        on_delete=models.CASCADE,
+        db_constraint=False,  # events live on the message's shard
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    # events are picked up once `available_at` has passed; claiming and retrying push it forward
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='chat_outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Outbox event for message {self.message_id} to user {self.recipient_id}"
+
+
+class IdSequence(models.Model):
+    """
+    Hi/lo counter for ids that must be unique across databases (message ids once sharded).
+    Always stored on `default`, see `chat.sharding`.
+    """
+    name = models.CharField(max_length=64, primary_key=True)
+    next_value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+
+class Broadcast(models.Model):
+    """
+    One message from `sender` to every user in `recipient_ids`, each in its own two-participant thread.
+
+    Small audiences are sent within the request; large ones are sent in chunks by `manage.py send_broadcasts`,
+    which records its progress in `processed` so an interrupted broadcast resumes where it stopped.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+    )
+
+    sender = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='broadcasts', on_delete=models.CASCADE)
+    text = models.TextField()
+    recipient_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=PENDING)
+    # recipients handled so far (a prefix of `recipient_ids`), and what that produced
+    processed = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    threads_created = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    # a worker holds the broadcast until then; a crashed worker's broadcast is picked up again afterwards
+    locked_until = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='chat_broadcast_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"Broadcast #{self.pk} from user {self.sender_id}: {self.processed}/{len(self.recipient_ids)}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The outcome of a create request sent with an `Idempotency-Key` header, replayed to retries
+    (see `chat.idempotency`). `status_code` is None while the first request is still running.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # method, path and body of the first request
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='chat_idempotency_user_key_uniq'),
+        ]
+
     def __str__(self):
-        return f"Message from {self.sender.email} in thread {self.thread.id}"
+        return f"Idempotency key {self.key!r} of user {self.user_id}"
@@ -0,0 +1,174 @@
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Callable, Iterable
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Thread, Message, OutboxEvent
+
+__all__ = (
+    "enqueue",
+    "dispatch_batch",
+    "DispatchResult",
+    "log_delivery",
+)
+
+logger = logging.getLogger(__name__)
+
+OutboxHandler = Callable[[int, list[Message]], None]
+
+
+def enqueue(messages: Iterable[Message]) -> list[OutboxEvent]:
+    """
+    Write one outbox event per recipient (every participant except the sender) of each message.
+
+    Must be called inside the transaction that inserted the messages, so an event exists if and only
+    if its message was committed.
+    """
+    messages = list(messages)
+    if not messages:
+        return []
+
+    participants = defaultdict(list)
+    rows = Thread.participants.through.objects.filter(
+        thread_id__in={message.thread_id for message in messages}
+    ).values_list('thread_id', 'user_id')
+    for thread_id, user_id in rows:
+        participants[thread_id].append(user_id)
+
+    # events live next to their message, on the thread's shard
+    events = defaultdict(list)
+    for message in messages:
+        events[message._state.db].extend(
+            OutboxEvent(message=message, recipient_id=user_id)
+            for user_id in participants[message.thread_id]
+            if user_id != message.sender_id
+        )
+    return [
+        event
+        for alias, shard_events in events.items()
+        for event in OutboxEvent.objects.using(alias).bulk_create(shard_events)
+    ]
+
+
+@dataclass
+class DispatchResult:
+    claimed: int = 0
+    delivered: int = 0
+    retried: int = 0
+    dropped: int = 0
+
+
+def get_handlers() -> list[OutboxHandler]:
+    return [import_string(path) for path in getattr(settings, 'CHAT_OUTBOX_HANDLERS', [])]
+
+
+def claim_batch(batch_size: int, lease: timedelta, using: str = 'default') -> list[OutboxEvent]:
+    """
+    Claim up to `batch_size` due events by leasing them: `available_at` is pushed past the lease,
+    so no other dispatcher picks them up, and a crashed dispatcher's events become due again.
+
+    Uses `SELECT ... FOR UPDATE SKIP LOCKED` where the backend supports it. Elsewhere (SQLite) the
+    candidates are read without a transaction and leased with one conditional `UPDATE` that only
+    matches events still due: a concurrent dispatcher's single statement waits for the write lock
+    instead of failing, and finds the events it lost already leased. The winner's events are then
+    read back by their lease.
+    """
+    now = timezone.now()
+    leased_until = now + lease
+    due = OutboxEvent.objects.using(using).filter(available_at__lte=now).order_by('available_at', 'id')
+
+    if connections[using].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=using):
+            events = list(due.select_for_update(skip_locked=True)[:batch_size])
+            if events:
+                OutboxEvent.objects.using(using).filter(id__in=[event.id for event in events]).update(
+                    available_at=leased_until,
+                    attempts=F('attempts') + 1,
+                )
+        for event in events:
+            event.attempts += 1
+            event.available_at = leased_until
+        return events
+
+    candidates = list(due.values_list('id', flat=True)[:batch_size])
+    if not candidates:
+        return []
+    claimed = OutboxEvent.objects.using(using).filter(id__in=candidates, available_at__lte=now).update(
+        available_at=leased_until,
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return []
+    return list(
+        OutboxEvent.objects.using(using)
+        .filter(id__in=candidates, available_at=leased_until)
+        .order_by('id')
+    )
+
+
+def dispatch_batch(
+    batch_size: int = 500,
+    lease: timedelta = timedelta(minutes=5),
+    using: str = 'default',
+) -> DispatchResult:
+    """
+    Claim a batch of events from one message shard, coalesce them per recipient
+    and call every handler once per recipient.
+
+    Delivered events are deleted. Failed ones are retried with exponential backoff
+    (`CHAT_OUTBOX_RETRY_BACKOFF` seconds, doubled per attempt) until `CHAT_OUTBOX_MAX_ATTEMPTS`,
+    after which they are dropped and logged.
+    """
+    result = DispatchResult()
+    events = claim_batch(batch_size, lease, using=using)
+    result.claimed = len(events)
+    if not events:
+        return result
+
+    messages = Message.objects.using(using).in_bulk({event.message_id for event in events})
+    by_recipient = defaultdict(list)
+    for event in events:
+        by_recipient[event.recipient_id].append(event)
+
+    handlers = get_handlers()
+    delivered, failed = [], []
+    for recipient_id, recipient_events in by_recipient.items():
+        try:
+            recipient_messages = [messages[event.message_id] for event in recipient_events if event.message_id in messages]
+            for handler in handlers:
+                handler(recipient_id, recipient_messages)
+        except Exception:
+            logger.exception("Outbox delivery to user %s failed", recipient_id)
+            failed.extend(recipient_events)
+        else:
+            delivered.extend(recipient_events)
+
+    max_attempts = getattr(settings, 'CHAT_OUTBOX_MAX_ATTEMPTS', 8)
+    backoff = getattr(settings, 'CHAT_OUTBOX_RETRY_BACKOFF', 2)
+    now = timezone.now()
+    dropped = [event for event in failed if event.attempts >= max_attempts]
+    retried = [event for event in failed if event.attempts < max_attempts]
+    for event in retried:
+        event.available_at = now + timedelta(seconds=backoff * 2 ** (event.attempts - 1))
+    for event in dropped:
+        logger.error("Dropping outbox event %s after %s attempts", event.id, event.attempts)
+
+    OutboxEvent.objects.using(using).filter(id__in=[event.id for event in delivered + dropped]).delete()
+    OutboxEvent.objects.using(using).bulk_update(retried, ['available_at'])
+
+    result.delivered, result.retried, result.dropped = len(delivered), len(retried), len(dropped)
+    return result
+
+
+def log_delivery(recipient_id: int, messages: list[Message]) -> None:
+    """
+    Default handler: log the coalesced notification.
+    """
+    logger.info("User %s has %s new message(s)", recipient_id, len(messages))
@@ -0,0 +1,68 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+
+from .stores import get_store
+
+__all__ = (
+    "touch",
+    "set_typing",
+    "get_thread_state",
+)
+
+STORE_NAME = 'presence'
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_PRESENCE', {})
+
+
+def _presence_key(user_id: int) -> str:
+    return f'presence:{user_id}'
+
+
+def _typing_key(thread_id: int, user_id: int) -> str:
+    return f'typing:{thread_id}:{user_id}'
+
+
+def touch(user_id: int) -> None:
+    """
+    Mark a user as online for `ONLINE_TTL` seconds.
+    """
+    get_store(STORE_NAME).set(_presence_key(user_id), time.time(), ttl=_config().get('ONLINE_TTL', 60))
+
+
+def set_typing(thread_id: int, user_id: int, typing: bool = True) -> None:
+    """
+    Mark a user as typing in a thread for `TYPING_TTL` seconds (or clear the mark).
+    """
+    store = get_store(STORE_NAME)
+    if typing:
+        store.set(_typing_key(thread_id, user_id), time.time(), ttl=_config().get('TYPING_TTL', 6))
+    else:
+        store.delete(_typing_key(thread_id, user_id))
+
+
+def _as_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return None if timestamp is None else datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+
+def get_thread_state(thread_id: int, user_ids: Iterable[int]) -> list[dict[str, Any]]:
+    """
+    Presence and typing state of the given participants, read with a single `get_many`.
+    """
+    user_ids = list(user_ids)
+    keys = [_presence_key(user_id) for user_id in user_ids] + [_typing_key(thread_id, user_id) for user_id in user_ids]
+    state = get_store(STORE_NAME).get_many(keys)
+
+    return [
+        {
+            "id": user_id,
+            "online": _presence_key(user_id) in state,
+            "last_seen": _as_datetime(state.get(_presence_key(user_id))),
+            "typing": _typing_key(thread_id, user_id) in state,
+        }
+        for user_id in user_ids
+    ]
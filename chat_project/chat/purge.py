@@ -0,0 +1,64 @@
+from typing import Iterator, Sequence
+
+from django.db import connections, transaction
+
+from .models import Thread, Message, OutboxEvent
+
+__all__ = (
+    "delete_messages",
+    "purge_thread_messages",
+    "purge_thread",
+)
+
+
+def delete_messages(ids: Sequence[int], using: str = 'default') -> int:
+    """
+    Delete messages by primary key with set-based `DELETE`s (pending outbox events first).
+
+    Bypasses Django's collector on purpose: nothing is loaded into memory and no signals are sent,
+    so callers are responsible for anything that depends on the deleted rows.
+    """
+    if not ids:
+        return 0
+
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote_name(OutboxEvent._meta.db_table)} WHERE message_id IN ({placeholders})',
+            list(ids),
+        )
+        cursor.execute(f'DELETE FROM {quote_name(Message._meta.db_table)} WHERE id IN ({placeholders})', list(ids))
+        return cursor.rowcount
+
+
+def purge_thread_messages(thread_id: int, chunk_size: int = 1000, using: str = 'default') -> Iterator[int]:
+    """
+    Delete the messages of a thread in bounded chunks, oldest first.
+
+    Every chunk is committed on its own, so locks are held only for one chunk and an interrupted
+    purge simply continues where it stopped on the next run. Yields the number of rows per chunk.
+    """
+    while True:
+        with transaction.atomic(using=using):
+            ids = list(
+                Message.objects.using(using)
+                .filter(thread_id=thread_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            deleted = delete_messages(ids, using=using)
+
+        if not ids:
+            return
+        yield deleted
+
+
+def purge_thread(thread: Thread) -> None:
+    """
+    Remove a soft-deleted thread once its messages are gone.
+    """
+    with transaction.atomic():
+        thread.participants.clear()
+        thread.delete()
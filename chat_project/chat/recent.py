@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+__all__ = (
+    "RecentMessages",
+    "recent_messages",
+)
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_RECENT_MESSAGES', {})
+
+
+@dataclass
+class RecentEntry:
+    generation: int
+    count: int  # messages in the thread, for the paginated `count`
+    messages: deque = field(default_factory=deque)  # newest serialized messages, oldest first
+    filled_at: float = field(default_factory=time.monotonic)
+
+    def window(self, offset: int, limit: int) -> Optional[list[dict[str, Any]]]:
+        """
+        Messages `offset` .. `offset + limit` of the thread (oldest first), or None when the window
+        starts before the buffered tail.
+        """
+        first = self.count - len(self.messages)
+        if offset < first:
+            return None
+        return list(self.messages)[offset - first:offset - first + limit]
+
+
+class RecentMessages:
+    """
+    Per-worker LRU of hot threads, each with a ring buffer of its newest `SIZE` serialized messages,
+    so the newest page of an active thread is served without touching the database.
+
+    Every change to a thread's messages bumps a per-thread generation counter in the Django cache
+    (`CHAT_RECENT_MESSAGES['CACHE']`); a buffer is only used while its generation is current, so a
+    write made by another worker (with a shared cache) or outside the ORM's signals (after calling
+    `invalidate`) makes the next read go to the database and refill the buffer. Writes seen by this
+    worker patch the buffer in place instead: new messages are appended, updated ones replaced.
+
+    The generation counters only reach other workers through a shared cache, so the buffer stays off
+    with a process-local one (`LocMemCache`) unless `SINGLE_PROCESS` says there is only one worker.
+    Buffers are also refilled at least every `MAX_AGE` seconds, whatever their generation says.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[int, RecentEntry] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        config = _config()
+        if not config.get('CACHE'):
+            return False
+        return config.get('SINGLE_PROCESS', False) or not isinstance(self._cache(), (LocMemCache, DummyCache))
+
+    @property
+    def size(self) -> int:
+        return _config().get('SIZE', 50)
+
+    def _cache(self):
+        return caches[_config().get('CACHE', 'default')]
+
+    def _key(self, thread_id: int) -> str:
+        return f'chat:recent:generation:{thread_id}'
+
+    def generation(self, thread_id: int) -> int:
+        """
+        Current generation of a thread. Counters start at a random value, so a counter evicted from
+        the cache and created again never matches a buffer filled before the eviction.
+        """
+        key = self._key(thread_id)
+        value = self._cache().get(key)
+        if value is None:
+            self._cache().add(key, random.getrandbits(62), timeout=None)
+            value = self._cache().get(key)
+        return value
+
+    def _bump(self, thread_id: int) -> int:
+        try:
+            return self._cache().incr(self._key(thread_id))
+        except ValueError:  # missing or evicted
+            return self.generation(thread_id)
+
+    def get(self, thread_id: int) -> Optional[RecentEntry]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(thread_id)
+        if entry is None:
+            return None
+        expired = time.monotonic() - entry.filled_at > _config().get('MAX_AGE', 60)
+        if expired or entry.generation != self.generation(thread_id):
+            self.discard(thread_id)
+            return None
+        with self._lock:
+            if thread_id in self._entries:
+                self._entries.move_to_end(thread_id)
+        return entry
+
+    def fill(
+        self, thread_id: int, generation: int, count: int, messages: Iterable[dict[str, Any]], using: str = 'default'
+    ) -> None:
+        """
+        Store the newest messages of a thread; `generation` must have been read before they were queried.
+
+        Read inside a transaction on `using`, they may include rows a rollback undoes: they are only
+        stored once it commits (right away in autocommit). Writes made by the same transaction bump
+        the generation on commit first, so such a buffer is then already stale and never served.
+        """
+        if not self.enabled:
+            return
+        entry = RecentEntry(generation=generation, count=count, messages=deque(messages, maxlen=self.size))
+
+        def store() -> None:
+            entry.filled_at = time.monotonic()
+            with self._lock:
+                self._entries[thread_id] = entry
+                self._entries.move_to_end(thread_id)
+                while len(self._entries) > _config().get('MAX_THREADS', 10_000):
+                    self._entries.popitem(last=False)
+
+        transaction.on_commit(store, using=using)
+
+    def _patch(self, thread_id: int, apply) -> None:
+        if not self.enabled:
+            return
+        generation = self._bump(thread_id)
+        with self._lock:
+            entry = self._entries.get(thread_id)
+            if entry is None:
+                return
+            # any other write since the buffer was current means it may have missed something
+            if generation != entry.generation + 1:
+                del self._entries[thread_id]
+                return
+            apply(entry)
+            entry.generation = generation
+
+    def append(self, thread_id: int, message: dict[str, Any]) -> None:
+        def apply(entry: RecentEntry) -> None:
+            entry.messages.append(message)
+            entry.count += 1
+        self._patch(thread_id, apply)
+
+    def replace(self, thread_id: int, message: dict[str, Any]) -> None:
+        def apply(entry: RecentEntry) -> None:
+            for position, buffered in enumerate(entry.messages):
+                if buffered['id'] == message['id']:
+                    entry.messages[position] = message
+        self._patch(thread_id, apply)
+
+    def invalidate(self, thread_ids: Iterable[int]) -> None:
+        if not self.enabled:
+            return
+        for thread_id in set(thread_ids):
+            self._bump(thread_id)
+            self.discard(thread_id)
+
+    def discard(self, thread_id: int) -> None:
+        with self._lock:
+            self._entries.pop(thread_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+recent_messages = RecentMessages()
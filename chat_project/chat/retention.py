@@ -0,0 +1,151 @@
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Thread, Message
+from .purge import delete_messages
+from .signals import messages_purged
+
+__all__ = (
+    "RetentionRule",
+    "MaxAgeRule",
+    "MaxMessagesPerThreadRule",
+    "get_rules",
+    "purge_expired",
+)
+
+# (message id, thread id) pairs of one batch, in index order
+Batch = list[tuple[int, int]]
+
+
+class RetentionRule(ABC):
+    """
+    A retention rule selects expired messages of one shard, oldest first, in index-ordered batches.
+
+    `batches` is consumed while the caller deletes every batch it yields, so each batch is simply the
+    next one still present; `count` answers dry runs without deleting anything.
+    """
+    @abstractmethod
+    def batches(self, using: str, chunk_size: int) -> Iterator[Batch]:
+        ...
+
+    @abstractmethod
+    def count(self, using: str) -> int:
+        ...
+
+    def __str__(self):
+        return type(self).__name__
+
+
+class MaxAgeRule(RetentionRule):
+    """
+    Delete messages older than `days`. Served by the `created` index.
+    """
+    def __init__(self, days: float):
+        self.days = days
+
+    def expired(self, using: str):
+        cutoff = timezone.now() - timedelta(days=self.days)
+        return Message.objects.using(using).filter(created__lt=cutoff)
+
+    def batches(self, using: str, chunk_size: int) -> Iterator[Batch]:
+        while True:
+            batch = list(self.expired(using).order_by('created', 'id').values_list('id', 'thread_id')[:chunk_size])
+            if not batch:
+                return
+            yield batch
+
+    def count(self, using: str) -> int:
+        return self.expired(using).count()
+
+    def __str__(self):
+        return f"MaxAgeRule(days={self.days})"
+
+
+class MaxMessagesPerThreadRule(RetentionRule):
+    """
+    Keep only the newest `limit` messages of every thread, newest by `(created, id)`: once messages are
+    sharded, ids come from per-worker blocks and don't follow send order.
+
+    Threads are walked by primary key and each one costs a single probe of the `(thread, created, id)`
+    index, so threads under the limit are cheap and no table-wide `GROUP BY` is needed.
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+
+    def thread_ids(self, chunk_size: int) -> Iterator[int]:
+        last_id = 0
+        while True:
+            ids = list(Thread.all_objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                return
+            yield from ids
+            last_id = ids[-1]
+
+    def newest_expired(self, thread_id: int, using: str) -> Optional[tuple[datetime, int]]:
+        """
+        `(created, id)` of the newest message over the limit, None when the thread is within it.
+        """
+        messages = Message.objects.using(using).filter(thread_id=thread_id).order_by('-created', '-id')
+        return messages.values_list('created', 'id')[self.limit:self.limit + 1].first()
+
+    def expired(self, thread_id: int, cutoff: tuple[datetime, int], using: str):
+        created, pk = cutoff
+        return Message.objects.using(using).filter(
+            Q(created__lt=created) | Q(created=created, id__lte=pk), thread_id=thread_id
+        )
+
+    def batches(self, using: str, chunk_size: int) -> Iterator[Batch]:
+        for thread_id in self.thread_ids(chunk_size):
+            cutoff = self.newest_expired(thread_id, using)
+            if cutoff is None:
+                continue
+            while True:
+                expired = self.expired(thread_id, cutoff, using).order_by('created', 'id')
+                batch = list(expired.values_list('id', 'thread_id')[:chunk_size])
+                if not batch:
+                    break
+                yield batch
+
+    def count(self, using: str) -> int:
+        total = 0
+        for thread_id in self.thread_ids(1000):
+            cutoff = self.newest_expired(thread_id, using)
+            if cutoff is not None:
+                total += self.expired(thread_id, cutoff, using).count()
+        return total
+
+    def __str__(self):
+        return f"MaxMessagesPerThreadRule(limit={self.limit})"
+
+
+def get_rules() -> list[RetentionRule]:
+    """
+    Instantiate `CHAT_RETENTION_RULES` (`[{'RULE': '<dotted path>', 'OPTIONS': {...}}, ...]`).
+    """
+    return [
+        import_string(config['RULE'])(**config.get('OPTIONS', {}))
+        for config in getattr(settings, 'CHAT_RETENTION_RULES', [])
+    ]
+
+
+def purge_expired(rule: RetentionRule, using: str, chunk_size: int = 1000) -> Iterator[int]:
+    """
+    Delete what `rule` selects on shard `using`, one short transaction per batch, and yield the
+    number of messages deleted per batch.
+
+    Deletes are set-based (see `purge.delete_messages`), so no post_delete signals fire;
+    `messages_purged` is sent after every batch with the affected thread ids instead, for
+    whatever keeps derived per-thread state.
+    """
+    for batch in rule.batches(using, chunk_size):
+        with transaction.atomic(using=using):
+            deleted = delete_messages([message_id for message_id, _ in batch], using=using)
+        messages_purged.send(sender=Message, thread_ids={thread_id for _, thread_id in batch}, using=using)
+        yield deleted
@@ -0,0 +1,53 @@
+from typing import Any, Optional
+
+from .sharding import message_shards, shard_for_thread
+
+__all__ = (
+    "MessageShardRouter",
+)
+
+SHARDED_MODELS = frozenset({'message', 'outboxevent'})
+
+
+class MessageShardRouter:
+    """
+    Places messages (and their outbox events) on `CHAT_MESSAGE_SHARDS` by a stable hash of the thread id;
+    everything else stays on `default`.
+
+    Routing needs a hint: `thread.messages`, `message.save()` and `Message.objects.create()` carry one,
+    plain `Message.objects.filter(...)` does not and must say `.using(shard_for_thread(...))`.
+    """
+    def _db_for_model(self, model, **hints: Any) -> Optional[str]:
+        if model._meta.app_label != 'chat' or model._meta.model_name not in SHARDED_MODELS:
+            return None
+
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        hint_model = instance._meta.model_name
+        if hint_model == 'thread':
+            # `thread.messages`, and `Message(thread=thread)` which asks with the thread as hint
+            return shard_for_thread(instance.pk)
+        if hint_model == 'message' and instance.thread_id is not None:
+            # not `_state.db`: assigning `sender` first would already have pinned it to `default`
+            return shard_for_thread(instance.thread_id)
+        if hint_model in SHARDED_MODELS:
+            return instance._state.db
+        return None
+
+    db_for_read = _db_for_model
+    db_for_write = _db_for_model
+
+    def allow_relation(self, obj1, obj2, **hints: Any) -> Optional[bool]:
+        # threads, users and messages may sit on different databases
+        if {obj1._meta.app_label, obj2._meta.app_label} <= {'chat', 'user'}:
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints: Any) -> Optional[bool]:
+        shards = message_shards()
+        if app_label == 'chat' and model_name in SHARDED_MODELS:
+            return db in shards
+        if db != 'default' and db in shards:
+            return False  # shards only hold messages
+        return None
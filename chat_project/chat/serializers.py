@@ -1,17 +1,54 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Message, Thread
+from django.db import models
+from django.db.models import prefetch_related_objects
+from . import cache
+from .models import Broadcast, Message, Thread
 
 __all__ = (
     "ThreadSerializer",
     "MessageSerializer",
+    "BatchRequestSerializer",
+    "BroadcastSerializer",
+    "ContactSerializer",
 )
 
 
+class CachedThreadListSerializer(serializers.ListSerializer):
+    """
+    Serializes a page of threads with one cache round-trip; only the misses are serialized.
+    """
+    def to_representation(self, data):
+        instances = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        return self.child.to_representation_many(instances)
+
+
 class ThreadSerializer(serializers.ModelSerializer):
+    """
+    Output is cached per thread (see `chat.cache`) and invalidated by `chat.signals`
+    whenever a thread is saved, deleted or its participants change.
+    """
     class Meta:
         model = Thread
-        fields = '__all__'
+        exclude = ('deleted_at', 'last_message_at')
+        list_serializer_class = CachedThreadListSerializer
+
+    def to_representation(self, instance: Thread) -> dict:
+        if instance.pk is None:
+            return super().to_representation(instance)
+        return self.to_representation_many([instance])[0]
+
+    def to_representation_many(self, instances: list[Thread]) -> list[dict]:
+        versions: dict[int, int] = {}
+        representations = cache.get_threads((instance.pk for instance in instances), versions)
+        missing = [instance for instance in instances if instance.pk not in representations]
+        if missing:
+            prefetch_related_objects(missing, 'participants')
+            fresh = {instance.pk: super(ThreadSerializer, self).to_representation(instance) for instance in missing}
+            cache.set_threads(fresh, versions)
+            representations.update(fresh)
+        return [representations[instance.pk] for instance in instances]
 
     def validate(self, attrs):
         participants = attrs.get('participants', [])
@@ -55,3 +92,67 @@ class MessageSerializer(serializers.ModelSerializer):
 
         return value
 
+
+class BatchItemSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(choices=['GET', 'POST', 'PUT', 'PATCH', 'DELETE'])
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False, default=dict)
+    idempotency_key = serializers.CharField(required=False, max_length=255)  # sent as the `Idempotency-Key` header
+
+    def validate_method(self, value):
+        return value.upper()
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """
+    `{"atomic": false, "requests": [{"method": "GET", "path": "/api/chat/messages/unread/"}, ...]}`
+
+    Headers of the batch request that belong to a single request (`Idempotency-Key`, preconditions) are not
+    passed on; give each item its own `idempotency_key` instead.
+    """
+    atomic = serializers.BooleanField(default=False)
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        max_requests = getattr(settings, 'CHAT_BATCH_MAX_REQUESTS', 20)
+        if len(value) > max_requests:
+            raise serializers.ValidationError(f"At most {max_requests} requests per batch.")
+        return value
+
+
+class BroadcastSerializer(serializers.ModelSerializer):
+    """
+    `{"text": "...", "recipients": [1, 2, ...]}`; the response reports progress, not the recipient list.
+    """
+    recipients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), source='recipient_ids', write_only=True, allow_empty=False
+    )
+    total = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Broadcast
+        fields = (
+            'id', 'sender', 'text', 'recipients', 'status', 'total', 'processed', 'sent', 'threads_created',
+            'created', 'finished_at',
+        )
+        read_only_fields = ('sender', 'status', 'processed', 'sent', 'threads_created', 'finished_at')
+
+    def get_total(self, obj: Broadcast) -> int:
+        return len(obj.recipient_ids)
+
+    def validate_recipients(self, value):
+        value = list(dict.fromkeys(value))  # duplicates would get the message twice
+        max_recipients = getattr(settings, 'CHAT_BROADCAST', {}).get('MAX_RECIPIENTS', 100_000)
+        if len(value) > max_recipients:
+            raise serializers.ValidationError(f"At most {max_recipients} recipients per broadcast.")
+        return value
+
+
+class ContactSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    email = serializers.EmailField()
+    username = serializers.CharField()
+    first_name = serializers.CharField(allow_null=True)
+    last_name = serializers.CharField(allow_null=True)
+    avatar = serializers.URLField(allow_null=True)
+    last_interaction = serializers.DateTimeField()
@@ -0,0 +1,142 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional, TypeVar
+
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F, Max
+
+__all__ = (
+    "message_shards",
+    "is_sharded",
+    "shard_for_thread",
+    "fan_out",
+    "next_message_ids",
+    "locate_message",
+)
+
+T = TypeVar('T')
+
+
+def message_shards() -> list[str]:
+    """
+    Database aliases holding messages (`CHAT_MESSAGE_SHARDS`); order matters for placement.
+    """
+    return list(getattr(settings, 'CHAT_MESSAGE_SHARDS', ['default']))
+
+
+def is_sharded() -> bool:
+    return len(message_shards()) > 1
+
+
+def stable_hash(value: Any) -> int:
+    """
+    Hash that is identical across processes and Python versions (unlike `hash()`).
+    """
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+
+def shard_for_thread(thread_id: int, shards: Optional[list[str]] = None) -> str:
+    shards = shards or message_shards()
+    if len(shards) == 1:
+        return shards[0]
+    return shards[stable_hash(thread_id) % len(shards)]
+
+
+def group_by_shard(thread_ids: Iterable[int]) -> dict[str, list[int]]:
+    grouped: dict[str, list[int]] = {}
+    for thread_id in thread_ids:
+        grouped.setdefault(shard_for_thread(thread_id), []).append(thread_id)
+    return grouped
+
+
+def _run_on_shard(func: Callable[[str], T], alias: str) -> T:
+    try:
+        return func(alias)
+    finally:
+        connections.close_all()  # connections are per thread; don't leak the pool thread's ones
+
+
+def fan_out(func: Callable[[str], T], shards: Optional[Iterable[str]] = None) -> dict[str, T]:
+    """
+    Call `func(alias)` for every shard and collect the results, in parallel when there are several.
+
+    Shards with an open transaction in the calling thread are queried from the calling thread:
+    another connection would not see this transaction's uncommitted rows.
+    """
+    shards = list(message_shards() if shards is None else shards)
+    local = [alias for alias in shards if len(shards) == 1 or connections[alias].in_atomic_block]
+    remote = [alias for alias in shards if alias not in local]
+
+    results = {alias: func(alias) for alias in local}
+    if remote:
+        with ThreadPoolExecutor(max_workers=len(remote), thread_name_prefix='chat-shard') as executor:
+            futures = {alias: executor.submit(_run_on_shard, func, alias) for alias in remote}
+            results.update({alias: future.result() for alias, future in futures.items()})
+    return results
+
+
+class _IdAllocator:
+    """
+    Hi/lo allocator for message ids that are unique across shards.
+
+    Each process reserves blocks of `CHAT_MESSAGE_ID_BLOCK` ids from the `IdSequence` row on `default`
+    (one small write per block) and hands them out from memory.
+    """
+    sequence_name = 'chat.message'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+
+    def _reserve_block(self, size: int) -> range:
+        from .models import IdSequence, Message
+
+        with transaction.atomic(using='default'):
+            if not IdSequence.objects.filter(name=self.sequence_name).exists():
+                # first allocation: start above every id that already exists on any shard
+                highest = fan_out(lambda alias: Message.objects.using(alias).aggregate(top=Max('id'))['top'] or 0)
+                try:
+                    with transaction.atomic(using='default'):
+                        IdSequence.objects.create(name=self.sequence_name, next_value=max(highest.values()) + 1)
+                except IntegrityError:
+                    pass  # created concurrently by another process
+            IdSequence.objects.filter(name=self.sequence_name).update(next_value=F('next_value') + size)
+            end = IdSequence.objects.get(name=self.sequence_name).next_value
+        return range(end - size, end)
+
+    def allocate(self, count: int) -> list[int]:
+        size = getattr(settings, 'CHAT_MESSAGE_ID_BLOCK', 1000)
+        ids: list[int] = []
+        with self._lock:
+            while len(ids) < count:
+                if self._next >= self._end:
+                    block = self._reserve_block(max(size, count - len(ids)))
+                    self._next, self._end = block.start, block.stop
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return ids
+
+    def reset(self) -> None:
+        with self._lock:
+            self._next = self._end = 0
+
+
+_allocator = _IdAllocator()
+
+
+def next_message_ids(count: int) -> list[int]:
+    return _allocator.allocate(count)
+
+
+def locate_message(pk: Any):
+    """
+    Find a message by primary key on whichever shard holds it (one point lookup per shard).
+    """
+    from .models import Message
+
+    found = fan_out(lambda alias: Message.objects.using(alias).filter(pk=pk).first())
+    return next((message for message in found.values() if message is not None), None)
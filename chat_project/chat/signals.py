@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from . import cache, contacts, sharding
+from .models import Thread, Message
+from .recent import recent_messages
+from .serializers import MessageSerializer
+
+# Sent after messages were deleted or moved in bulk without per-row signals (retention, admin actions,
+# rebalancing), with `thread_ids` (the threads that lost messages) and `using` (the shard).
+messages_purged = Signal()
+
+
+@receiver(pre_save, sender=Message, dispatch_uid='chat.assign_message_id')
+def assign_message_id(sender, instance: Message, raw: bool, **kwargs) -> None:
+    """
+    Once messages are sharded, ids come from the cross-shard allocator instead of each shard's sequence.
+    """
+    if instance.pk is None and not raw and sharding.is_sharded():
+        instance.pk = sharding.next_message_ids(1)[0]
+
+
+@receiver(post_save, sender=Message, dispatch_uid='chat.message_created')
+def record_last_message(sender, instance: Message, created: bool, raw: bool, **kwargs) -> None:
+    if created and not raw:
+        Thread.record_message(instance.thread_id, instance.created)
+        newest = {instance.thread_id: instance.created}
+        transaction.on_commit(lambda: contacts.record_messages(newest), using=instance._state.db)
+
+
+@receiver(post_save, sender=Message, dispatch_uid='chat.message_saved')
+def update_recent_messages(sender, instance: Message, created: bool, raw: bool, **kwargs) -> None:
+    """
+    Append new messages to (and patch updated ones in) the thread's recent-message buffer, once committed.
+    """
+    if raw or not recent_messages.enabled:
+        return
+    data = dict(MessageSerializer(instance).data)
+    if created:
+        transaction.on_commit(lambda: recent_messages.append(instance.thread_id, data), using=instance._state.db)
+    else:
+        transaction.on_commit(lambda: recent_messages.replace(instance.thread_id, data), using=instance._state.db)
+
+
+@receiver(post_delete, sender=Message, dispatch_uid='chat.message_deleted')
+def invalidate_recent_messages(sender, instance: Message, **kwargs) -> None:
+    transaction.on_commit(lambda: recent_messages.invalidate([instance.thread_id]), using=instance._state.db)
+
+
+@receiver(messages_purged, dispatch_uid='chat.messages_purged')
+def invalidate_purged_threads(sender, thread_ids, **kwargs) -> None:
+    recent_messages.invalidate(thread_ids)
+
+
+@receiver(post_save, sender=Thread, dispatch_uid='chat.thread_saved')
+@receiver(post_delete, sender=Thread, dispatch_uid='chat.thread_deleted')
+def invalidate_thread(sender, instance: Thread, using: str, **kwargs) -> None:
+    cache.invalidate_threads([instance.pk], using=using)
+    recent_messages.invalidate([instance.pk])
+
+
+@receiver(m2m_changed, sender=Thread.participants.through, dispatch_uid='chat.thread_participants_changed')
+def invalidate_thread_participants(
+    sender, instance, action: str, reverse: bool, pk_set, using: str, **kwargs
+) -> None:
+    """
+    `thread.participants.*` changes one thread; `user.threads.*` changes the threads in `pk_set`
+    (for `user.threads.clear()` they are collected before the rows go away). Entries are dropped
+    again on commit, as readers may re-cache the old participants until then.
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            cache.invalidate_threads([instance.pk], using=using)
+        return
+
+    if action == 'pre_clear':
+        instance._cleared_thread_ids = list(instance.threads.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        cache.invalidate_threads(getattr(instance, '_cleared_thread_ids', []), using=using)
+    elif action in ('post_add', 'post_remove'):
+        cache.invalidate_threads(pk_set or [], using=using)
+
+
+@receiver(post_save, sender=Thread, dispatch_uid='chat.contacts_thread_saved')
+def forget_contacts_of_deleted_thread(sender, instance: Thread, raw: bool, **kwargs) -> None:
+    if instance.deleted_at is not None and not raw:
+        transaction.on_commit(lambda: contacts.invalidate_threads([instance.pk]))
+
+
+@receiver(pre_delete, sender=Thread, dispatch_uid='chat.contacts_thread_deleted')
+def forget_contacts_before_thread_delete(sender, instance: Thread, **kwargs) -> None:
+    """
+    Soft-deleted threads were already forgotten; for the others the participants are gone after the delete.
+    """
+    if instance.deleted_at is None:
+        user_ids = list(instance.participants.values_list('pk', flat=True))
+        transaction.on_commit(lambda: contacts.invalidate_users(user_ids))
+
+
+@receiver(m2m_changed, sender=Thread.participants.through, dispatch_uid='chat.contacts_participants_changed')
+def update_contacts(sender, instance, action: str, reverse: bool, pk_set, **kwargs) -> None:
+    """
+    Added participants are linked in place (see `chat.contacts`); before participants are removed,
+    everyone in the affected threads is collected, and their adjacency lists are dropped on commit.
+    """
+    if action == 'post_add':
+        thread_ids = list(pk_set or []) if reverse else [instance.pk]
+        transaction.on_commit(lambda: contacts.record_threads(thread_ids))
+    elif action in ('pre_remove', 'pre_clear'):
+        if not reverse:
+            thread_ids = [instance.pk]
+        elif action == 'pre_remove':
+            thread_ids = list(pk_set or [])
+        else:
+            thread_ids = list(instance.threads.values_list('pk', flat=True))
+        user_ids = list(sender.objects.filter(thread_id__in=thread_ids).values_list('user_id', flat=True))
+        transaction.on_commit(lambda: contacts.invalidate_users(user_ids))
@@ -0,0 +1,158 @@
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+__all__ = (
+    "MemoryStore",
+    "CacheStore",
+    "get_store",
+    "reset_stores",
+)
+
+_MISSING = object()
+
+
+class MemoryStore:
+    """
+    Process-local key/value store with per-key TTL.
+
+    Every operation is O(1) under one lock. Expired keys are dropped lazily on access and by a sweep
+    once the store grows past `max_entries` (the oldest keys go first if that is not enough).
+    """
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._data: dict[str, tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: str, now: float) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return _MISSING
+        value, expires = item
+        if expires <= now:
+            del self._data[key]
+            return _MISSING
+        return value
+
+    def _set(self, key: str, value: Any, ttl: float, now: float) -> None:
+        self._data.pop(key, None)
+        self._data[key] = (value, now + ttl)
+        if len(self._data) > self.max_entries:
+            self._sweep(now)
+
+    def _sweep(self, now: float) -> None:
+        for key in [key for key, (_, expires) in self._data.items() if expires <= now]:
+            del self._data[key]
+        while len(self._data) > self.max_entries:
+            del self._data[next(iter(self._data))]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._get(key, time.monotonic())
+        return default if value is _MISSING else value
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            values = {key: self._get(key, now) for key in keys}
+        return {key: value for key, value in values.items() if value is not _MISSING}
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._set(key, value, ttl, time.monotonic())
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def update(self, key: str, func: Callable[[Any], Any], ttl: float) -> Any:
+        """
+        Atomically replace the value of `key` with `func(current)` (`current` is None when missing).
+        """
+        now = time.monotonic()
+        with self._lock:
+            current = self._get(key, now)
+            value = func(None if current is _MISSING else current)
+            self._set(key, value, ttl, now)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class CacheStore:
+    """
+    Store backed by a Django cache alias, shared between workers when the cache is.
+
+    `update` is a plain read-modify-write: concurrent updates from different workers may race,
+    which is acceptable for the approximate, short-lived state kept here.
+    """
+    def __init__(self, alias: str = 'default', prefix: str = 'chat:ephemeral'):
+        self.alias = alias
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _key(self, key: str) -> str:
+        return f'{self.prefix}:{key}'
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.cache.get(self._key(key), default)
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, Any]:
+        keys = list(keys)
+        values = self.cache.get_many([self._key(key) for key in keys])
+        return {key: values[self._key(key)] for key in keys if self._key(key) in values}
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self.cache.set(self._key(key), value, ttl)
+
+    def delete(self, key: str) -> None:
+        self.cache.delete(self._key(key))
+
+    def update(self, key: str, func: Callable[[Any], Any], ttl: float) -> Any:
+        value = func(self.cache.get(self._key(key)))
+        self.cache.set(self._key(key), value, ttl)
+        return value
+
+    def clear(self) -> None:
+        """
+        No-op: a shared cache is never flushed from a single worker.
+        """
+
+
+_stores: dict[str, Any] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(name: str = 'default'):
+    """
+    Return the store configured under `CHAT_EPHEMERAL_STORES[name]` (falls back to `default`).
+    """
+    store = _stores.get(name)
+    if store is not None:
+        return store
+
+    with _stores_lock:
+        if name not in _stores:
+            config = getattr(settings, 'CHAT_EPHEMERAL_STORES', {})
+            options = config.get(name) or config.get('default') or {'BACKEND': 'chat.stores.MemoryStore'}
+            _stores[name] = import_string(options['BACKEND'])(**options.get('OPTIONS', {}))
+        return _stores[name]
+
+
+def reset_stores() -> None:
+    """
+    Forget all process-local state (used by tests).
+    """
+    with _stores_lock:
+        for store in _stores.values():
+            store.clear()
+        _stores.clear()
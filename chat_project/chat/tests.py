@@ -1,8 +1,33 @@
+import subprocess
+import sys
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
 import pytest
 from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
-
-from chat.models import Thread, Message
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from chat import cache, outbox
+from chat.admin import EstimatedCountPaginator
+from chat.coalescing import SingleFlight
+from chat.fields import COMPRESSED_MARKER
+from chat.recent import recent_messages
+from chat.retention import RetentionRule
+from chat.models import Thread, Message, OutboxEvent, IdempotencyKey
+from chat.signals import messages_purged
+from chat.routers import MessageShardRouter
+from chat.sharding import is_sharded, message_shards, shard_for_thread
+from chat.stores import reset_stores
+from chat.views import TimelinePagination
+from chat.writer import message_writer
 
 User = get_user_model()
 
@@ -187,7 +212,7 @@ def test_get_user_threads():
     assert response.data['results'][0]['id'] == thread.id
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(databases='__all__')
 def test_get_unread_messages_count():
     """
     Message test #2: Retrieving the number of unread messages for a user.
@@ -225,7 +250,7 @@ def test_get_unread_messages_count():
     assert response.data["unread_count"] == 2
 
 
-@pytest.mark.django_db
+@pytest.mark.django_db(databases='__all__')
 # @pytest.mark.skip(reason="Этот тест еще не готов")
 def test_mark_message_as_read():
     """
@@ -297,3 +322,955 @@ def test_delete_thread():
 
     assert response.status_code == 204
     assert not Thread.objects.filter(id=thread.id).exists()
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_read_actions_run_in_autocommit_and_writes_are_atomic():
+    """
+    Transaction policy test: reads do not open a transaction, writes do.
+    Inside the test transaction an atomic block shows up as a SAVEPOINT query.
+    """
+    client = APIClient()
+
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+    message = Message.objects.create(thread=thread, sender=user2, text="Test message", is_read=False)
+
+    client.force_authenticate(user=user1)
+
+    with CaptureQueriesContext(connection) as read_queries:
+        response = client.get("/api/chat/messages/unread/")
+    assert response.status_code == 200
+    assert not any('SAVEPOINT' in query['sql'] for query in read_queries.captured_queries)
+
+    with CaptureQueriesContext(connection) as write_queries:
+        response = client.post(f"/api/chat/messages/{message.id}/mark_as_read/")
+    assert response.status_code == 200
+    assert any('SAVEPOINT' in query['sql'] for query in write_queries.captured_queries)
+
+
+@pytest.mark.django_db
+def test_sqlite_performance_profile_is_applied_on_new_connections():
+    """
+    SQLite profile test: PRAGMAs are applied when a connection is opened with the profile enabled.
+    """
+    with override_settings(SQLITE_PERFORMANCE_PROFILE=True, SQLITE_PRAGMAS={'synchronous': 'NORMAL'}):
+        new_connection = connection.copy()
+        try:
+            with new_connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous')
+                assert cursor.fetchone()[0] == 1  # NORMAL
+        finally:
+            new_connection.close()
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_purge_deleted_threads_removes_messages_in_chunks():
+    """
+    Thread test #6: Deleting a thread hides it instantly; the purge worker removes it with its messages.
+    """
+    client = APIClient()
+
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+    Message.objects.bulk_create(
+        Message(thread=thread, sender=user2, text=f"Message {i}") for i in range(5)
+    )
+
+    client.force_authenticate(user=user1)
+    response = client.delete(f"/api/chat/threads/{thread.id}/")
+
+    assert response.status_code == 204
+    assert Thread.all_objects.filter(id=thread.id).exists()
+    assert client.get("/api/chat/messages/unread/").data["unread_count"] == 0
+
+    out = StringIO()
+    call_command('purge_deleted_threads', chunk_size=2, stdout=out)
+
+    assert "5 message(s) purged" in out.getvalue()
+    assert not Thread.all_objects.filter(id=thread.id).exists()
+    assert not Message.objects.filter(thread_id=thread.id).exists()
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_send_message_writes_outbox_event_for_dispatcher():
+    """
+    Message test #4: Sending a message queues an outbox event for the other participant, claims
+    lease events to one dispatcher, and the dispatcher delivers them once per recipient.
+    """
+    client = APIClient()
+
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+
+    client.force_authenticate(user=user1)
+    for text in ("Hello", "Are you there?"):
+        response = client.post("/api/chat/messages/", {"thread": thread.id, "sender": user1.id, "text": text})
+        assert response.status_code == 201
+
+    shard = shard_for_thread(thread.id)
+    assert list(OutboxEvent.objects.using(shard).values_list('recipient_id', flat=True)) == [user2.id, user2.id]
+
+    # a claim leases the events: a second dispatcher finds nothing due until the lease runs out
+    claimed = outbox.claim_batch(10, timedelta(minutes=5), using=shard)
+    assert [event.attempts for event in claimed] == [1, 1]
+    assert outbox.claim_batch(10, timedelta(minutes=5), using=shard) == []
+    OutboxEvent.objects.using(shard).update(available_at=timezone.now(), attempts=0)
+
+    deliveries = []
+    with override_settings(CHAT_OUTBOX_HANDLERS=['chat.tests.record_delivery']):
+        record_delivery.deliveries = deliveries
+        call_command('dispatch_outbox', stdout=StringIO())
+
+    assert deliveries == [(user2.id, ["Hello", "Are you there?"])]
+    assert not OutboxEvent.objects.using(shard).exists()
+
+
+def record_delivery(recipient_id, messages):
+    record_delivery.deliveries.append((recipient_id, [message.text for message in messages]))
+
+
+@pytest.mark.django_db
+@override_settings(CHAT_THROTTLE_RATES={'message.unread': '2/min'})
+def test_unread_polling_is_throttled_per_user():
+    """
+    Throttling test: polling `unread` faster than the bucket allows returns 429 with Retry-After.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+
+    client.force_authenticate(user=user1)
+    assert client.get("/api/chat/messages/unread/").status_code == 200
+    assert client.get("/api/chat/messages/unread/").status_code == 200
+
+    response = client.get("/api/chat/messages/unread/")
+    assert response.status_code == 429
+    assert int(response['Retry-After']) > 0
+
+    # buckets are per user
+    client.force_authenticate(user=user2)
+    assert client.get("/api/chat/messages/unread/").status_code == 200
+
+
+@pytest.mark.django_db
+def test_load_shedding_rejects_requests_when_overloaded():
+    """
+    Backpressure test: requests are shed with 503 while the in-flight limit is exceeded.
+    """
+    client = APIClient()
+    user = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    client.force_authenticate(user=user)
+
+    with override_settings(CHAT_LOAD_SHEDDING={'MAX_IN_FLIGHT': 0}):
+        response = client.get("/api/chat/messages/unread/")
+
+    assert response.status_code == 503
+    assert response['Retry-After'] == '1'
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_admin_changelists_and_bulk_actions_stay_query_bounded(client, monkeypatch):
+    """
+    Admin test: changelists don't N+1 over rows, large unfiltered ones use the row estimate,
+    bulk actions work in chunks, and deleting a thread neither collects nor deletes its messages.
+    """
+    admin_user = User.objects.create_superuser(email="admin@example.com", password="password123", username="admin")
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    for _ in range(3):
+        thread = Thread.objects.create()
+        thread.participants.set([user1, user2])
+        Message.objects.bulk_create(Message(thread=thread, sender=user1, text="Hello") for _ in range(5))
+    client.force_login(admin_user)
+
+    for url in ("/admin/chat/thread/", "/admin/chat/message/", "/admin/chat/thread/?q=abc"):
+        with CaptureQueriesContext(connection) as queries:
+            assert client.get(url).status_code == 200
+        assert len(queries.captured_queries) < 12
+
+    # the thread changelist hides soft-deleted threads and still counts as unfiltered
+    monkeypatch.setattr(EstimatedCountPaginator, 'estimate', staticmethod(lambda queryset: 500_000))
+    assert client.get("/admin/chat/thread/").context['cl'].paginator.count == 500_000
+    assert client.get(f"/admin/chat/thread/?q={thread.id}").context['cl'].paginator.count == 1
+    assert client.get("/admin/chat/thread/?participants__id__exact=" + str(user1.id)).context['cl'].paginator.count == 3
+
+    message_ids = [pk for alias in message_shards() for pk in Message.objects.using(alias).values_list('id', flat=True)]
+    response = client.post("/admin/chat/message/", {
+        'action': 'mark_as_read',
+        '_selected_action': message_ids,
+    })
+    assert response.status_code == 302
+    assert not any(Message.objects.using(alias).filter(is_read=False).exists() for alias in message_shards())
+
+    message, first_thread = thread.messages.first(), Thread.objects.first()
+    with CaptureQueriesContext(connection) as queries:
+        assert str(message).startswith("Message from user")
+        assert str(first_thread).startswith("Thread #")
+    assert not queries.captured_queries
+
+    # deleting a thread only hides it: the confirmation page doesn't collect its messages
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(f"/admin/chat/thread/{thread.id}/delete/")
+    assert response.status_code == 200
+    assert response.context['deleted_objects'] == ["Thread: Thread between user1@example.com, user2@example.com"]
+    assert not [query for query in queries.captured_queries if 'chat_message' in query['sql']]
+    assert client.post(f"/admin/chat/thread/{thread.id}/delete/", {'post': 'yes'}).status_code == 302
+    assert Thread.all_objects.get(pk=thread.id).deleted_at is not None
+    assert thread.messages.count() == 5
+
+
+@pytest.mark.django_db
+def test_thread_representation_is_cached_and_invalidated_on_participant_change(django_capture_on_commit_callbacks):
+    """
+    Thread cache test: serialized threads are served from the cache until participants change,
+    and what readers cached before the change committed is dropped on commit.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    user3 = User.objects.create_user(email="user3@example.com", password="password123", username="user3")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+    client.force_authenticate(user=user1)
+
+    with CaptureQueriesContext(connection) as cold:
+        assert client.get("/api/chat/threads/user_threads/").data['results'][0]['participants'] == [user1.id, user2.id]
+    with CaptureQueriesContext(connection) as warm:
+        assert client.get("/api/chat/threads/user_threads/").data['results'][0]['participants'] == [user1.id, user2.id]
+    assert len(warm.captured_queries) < len(cold.captured_queries)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        thread.participants.remove(user2)
+        # a reader that doesn't see the change before the commit caches the old participants meanwhile
+        versions = {}
+        cache.get_threads([thread.pk], versions)
+        cache.set_threads({thread.pk: {'id': thread.pk, 'participants': [user1.id, user2.id]}}, versions)
+    assert cache.get_threads([thread.pk]) == {}
+    user3.threads.add(thread)
+
+    response = client.get(f"/api/chat/threads/{thread.id}/")
+    assert response.data['participants'] == [user1.id, user3.id]
+    assert cache.get_threads([thread.pk])[thread.pk]['participants'] == [user1.id, user3.id]
+
+
+@pytest.mark.django_db
+def test_thread_presence_and_typing_state_without_database_writes():
+    """
+    Presence test: requests mark users online, typing is per thread, and neither writes to the database.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    user3 = User.objects.create_user(email="user3@example.com", password="password123", username="user3")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+
+    client.force_authenticate(user=user1)
+    with CaptureQueriesContext(connection) as queries:
+        assert client.post(f"/api/chat/threads/{thread.id}/typing/", {"typing": True}, format='json').status_code == 200
+        response = client.get(f"/api/chat/threads/{thread.id}/presence/")
+    assert not any(
+        query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')) for query in queries.captured_queries
+    )
+
+    state = {participant['id']: participant for participant in response.data['participants']}
+    assert state[user1.id]['online'] is True and state[user1.id]['typing'] is True
+    assert state[user2.id]['online'] is False and state[user2.id]['last_seen'] is None
+
+    client.force_authenticate(user=user3)
+    assert client.get(f"/api/chat/threads/{thread.id}/presence/").status_code == 403
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_large_message_bodies_are_stored_compressed_and_read_back_transparently():
+    """
+    Compression test: large bodies are compressed at rest, the API and the ORM see plain text,
+    and `compress_messages` converts rows written before compression was enabled.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+    body = "\n".join(f"log line {i}: something happened" for i in range(200))
+
+    def stored_text(message_id):
+        with connections[shard_for_thread(thread.id)].cursor() as cursor:
+            cursor.execute("SELECT text FROM chat_message WHERE id = %s", [message_id])
+            return cursor.fetchone()[0]
+
+    client.force_authenticate(user=user1)
+    response = client.post("/api/chat/messages/", {"thread": thread.id, "sender": user1.id, "text": body}, format='json')
+    assert response.status_code == 201
+    assert response.data['text'] == body
+    assert stored_text(response.data['id']).startswith(COMPRESSED_MARKER)
+    assert len(stored_text(response.data['id'])) < len(body)
+    assert client.get(f"/api/chat/threads/{thread.id}/messages/").data['results'][0]['text'] == body
+
+    with override_settings(CHAT_MESSAGE_COMPRESSION={'THRESHOLD': None}):
+        legacy = Message.objects.create(thread=thread, sender=user2, text=body)
+        short = Message.objects.create(thread=thread, sender=user2, text="short")
+    assert stored_text(legacy.id) == body
+
+    call_command('compress_messages', chunk_size=1, stdout=StringIO())
+
+    assert stored_text(legacy.id).startswith(COMPRESSED_MARKER)
+    assert stored_text(short.id) == "short"
+    assert thread.messages.get(id=legacy.id).text == body
+
+
+def test_threads_map_to_shards_stably_and_shards_hold_only_messages():
+    """
+    Sharding test: placement depends only on the thread id and the shard list, and the router keeps
+    everything except messages and outbox events off the extra shards.
+    """
+    shards = ['default', 'shard_1', 'shard_2']
+    placement = {thread_id: shard_for_thread(thread_id, shards) for thread_id in range(1, 301)}
+
+    assert placement == {thread_id: shard_for_thread(thread_id, shards) for thread_id in range(1, 301)}
+    assert set(placement.values()) == set(shards)
+    assert shard_for_thread(42, ['default']) == 'default'
+
+    router = MessageShardRouter()
+    with override_settings(CHAT_MESSAGE_SHARDS=shards):
+        assert router.allow_migrate('shard_1', 'chat', model_name='message')
+        assert router.allow_migrate('shard_1', 'chat', model_name='outboxevent')
+        assert router.allow_migrate('shard_1', 'chat', model_name='thread') is False
+        assert router.allow_migrate('shard_1', 'user', model_name='user') is False
+        assert router.allow_migrate('default', 'chat', model_name='thread') is None
+        assert router.db_for_write(Message, instance=Message(thread_id=7)) == shard_for_thread(7, shards)
+
+
+@pytest.mark.skipif(not is_sharded(), reason="run with CHAT_SHARDS=3 to exercise several message shards")
+@pytest.mark.django_db(databases='__all__')
+def test_messages_are_written_to_and_read_from_their_thread_shard():
+    """
+    Sharding test: messages land on their thread's shard with globally unique ids, the thread,
+    message and unread endpoints read them back from there, and admin bulk actions reach them.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    threads = []
+    for _ in range(6):
+        thread = Thread.objects.create()
+        thread.participants.set([user1, user2])
+        threads.append(thread)
+    assert len({shard_for_thread(thread.id) for thread in threads}) > 1
+
+    client.force_authenticate(user=user1)
+    ids = []
+    for thread in threads:
+        response = client.post("/api/chat/messages/", {"thread": thread.id, "sender": user1.id, "text": "hi"}, format='json')
+        assert response.status_code == 201
+        ids.append(response.data['id'])
+        shard = shard_for_thread(thread.id)
+        assert Message.objects.using(shard).filter(id=response.data['id']).exists()
+        assert OutboxEvent.objects.using(shard).filter(message_id=response.data['id'], recipient=user2).exists()
+    assert len(set(ids)) == len(ids)
+
+    assert client.get(f"/api/chat/threads/{threads[0].id}/messages/").data['results'][0]['id'] == ids[0]
+
+    client.force_authenticate(user=user2)
+    assert client.get("/api/chat/messages/unread/").data['unread_count'] == len(threads)
+    assert client.post(f"/api/chat/messages/{ids[-1]}/mark_as_read/").status_code == 200
+    assert client.get("/api/chat/messages/unread/").data['unread_count'] == len(threads) - 1
+    assert sorted(message['id'] for message in client.get("/api/chat/messages/").data['results']) == sorted(ids)
+    Thread.all_objects.update(last_message_at=None)  # as migration 0008 leaves threads with messages elsewhere
+    call_command('backfill_last_message_at', chunk_size=2, stdout=StringIO())
+    assert sorted(message['id'] for message in client.get("/api/chat/messages/").data['results']) == sorted(ids)
+
+    call_command('dispatch_outbox', stdout=StringIO())
+    assert not any(OutboxEvent.objects.using(alias).exists() for alias in message_shards())
+
+    # admin bulk actions reach every shard
+    admin_client = APIClient()
+    admin_client.force_login(User.objects.create_superuser(email="admin@example.com", password="password123", username="admin"))
+    admin_client.post("/admin/chat/message/", {'action': 'mark_as_read', '_selected_action': ids})
+    assert not any(Message.objects.using(alias).filter(is_read=False).exists() for alias in message_shards())
+    admin_client.post("/admin/chat/message/", {'action': 'delete_messages', '_selected_action': ids[:3]})
+    assert sum(Message.objects.using(alias).filter(id__in=ids).count() for alias in message_shards()) == len(ids) - 3
+
+    # rows left on the wrong shard (e.g. after adding a shard) are moved by `rebalance_message_shards`
+    misplaced = next(thread for thread in threads if shard_for_thread(thread.id) != 'default')
+    stray = Message.objects.using('default').bulk_create([Message(thread=misplaced, sender=user1, text="stray")])[0]
+    call_command('rebalance_message_shards', chunk_size=1, stdout=StringIO())
+    assert not Message.objects.using('default').filter(id=stray.id).exists()
+    assert Message.objects.using(shard_for_thread(misplaced.id)).get(id=stray.id).text == "stray"
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_batch_runs_chat_calls_in_one_round_trip_with_one_authentication():
+    """
+    Batch test: sub-requests go through the regular views, the caller is authenticated once,
+    an atomic batch is rolled back as a whole when a sub-request fails, and idempotency keys are per item.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+    message = Message.objects.create(thread=thread, sender=user2, text="Hello", is_read=False)
+
+    access_token = client.post("/api/auth/token/", {"email": "user1@example.com", "password": "password123"}).data['access']
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {access_token}')
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post("/api/chat/batch/", {"requests": [
+            {"method": "GET", "path": "/api/chat/threads/user_threads/"},
+            {"method": "GET", "path": "/api/chat/messages/unread/"},
+            {"method": "GET", "path": f"/api/chat/threads/{thread.id}/messages/?limit=5"},
+            {"method": "POST", "path": f"/api/chat/messages/{message.id}/mark_as_read/"},
+            {"method": "GET", "path": "/api/chat/messages/unread/"},
+            {"method": "GET", "path": "/api/auth/token/"},
+        ]}, format='json')
+
+    assert response.status_code == 200
+    results = response.data['responses']
+    assert [result['status'] for result in results] == [200, 200, 200, 200, 200, 400]
+    assert results[0]['body']['results'][0]['id'] == thread.id
+    assert results[1]['body'] == {"unread_count": 1}
+    assert results[2]['body']['results'][0]['text'] == "Hello"
+    assert results[4]['body'] == {"unread_count": 0}
+    user_lookups = [query for query in queries.captured_queries if 'FROM "user_user" WHERE "user_user"."id" =' in query['sql']]
+    assert len(user_lookups) == 1
+
+    response = client.post("/api/chat/batch/", {"atomic": True, "requests": [
+        {"method": "POST", "path": "/api/chat/messages/", "body": {"thread": thread.id, "sender": user1.id, "text": "Rolled back"}},
+        {"method": "POST", "path": "/api/chat/threads/", "body": {"participants": [user1.id]}},
+        {"method": "GET", "path": "/api/chat/messages/unread/"},
+    ]}, format='json')
+
+    if is_sharded():
+        # one transaction can't span the message shards
+        assert response.status_code == 400
+    else:
+        assert [result and result['status'] for result in response.data['responses']] == [201, 400, None]
+    assert not thread.messages.filter(text="Rolled back").exists()
+    assert not any(OutboxEvent.objects.using(alias).exists() for alias in message_shards())
+
+    # the batch's Idempotency-Key is not applied to every sub-request; items carry their own
+    create = {"method": "POST", "path": "/api/chat/messages/"}
+    items = [
+        {**create, "body": {"thread": thread.id, "sender": user1.id, "text": "First"}},
+        {**create, "body": {"thread": thread.id, "sender": user1.id, "text": "Second"}},
+        {**create, "body": {"thread": thread.id, "sender": user1.id, "text": "Once"}, "idempotency_key": "k2"},
+        {**create, "body": {"thread": thread.id, "sender": user1.id, "text": "Once"}, "idempotency_key": "k2"},
+    ]
+    response = client.post("/api/chat/batch/", {"requests": items}, format='json', HTTP_IDEMPOTENCY_KEY="k1")
+    results = response.data['responses']
+    assert [result['status'] for result in results] == [201, 201, 201, 201]
+    assert results[2]['body'] == results[3]['body']
+    assert thread.messages.filter(text__in=["First", "Second", "Once"]).count() == 3
+
+    with override_settings(CHAT_GROUP_COMMIT={'ENABLED': True}):
+        response = client.post("/api/chat/batch/", {"atomic": True, "requests": items[:1]}, format='json')
+    assert response.status_code == 400
+
+
+def test_startup_report_times_every_app_and_warm_up_step():
+    """
+    Startup test: the pre-fork warm-up reports import/models/ready time per installed app
+    and runs its warm-up steps in a fresh interpreter.
+    """
+    output = subprocess.run(
+        [sys.executable, '-m', 'chat_project.warmup', '--skip-db'],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    apps = {line.split()[0] for line in output.splitlines()[1:] if not line.startswith('warm-up')}
+    assert {'chat', 'user', 'authentication', 'rest_framework'} <= apps
+    for step in ('urls', 'serializers', 'authentication'):
+        assert f"warm-up: {step}" in output
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_retention_rules_purge_expired_messages_in_batches():
+    """
+    Retention test: a dry run only counts, then the age and per-thread rules delete expired messages
+    (and their outbox events) in batches and report the affected threads.
+    """
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    quiet, busy = Thread.objects.create(), Thread.objects.create()
+    old = [Message.objects.create(thread=quiet, sender=user1, text=f"old {i}") for i in range(3)]
+    quiet.messages.filter(id__in=[message.id for message in old]).update(created=timezone.now() - timedelta(days=40))
+    recent = Message.objects.create(thread=quiet, sender=user1, text="recent")
+    chatter = [Message.objects.create(thread=busy, sender=user2, text=f"chatter {i}") for i in range(7)]
+    # with sharding, ids don't follow send order: the lowest id can be the newest message
+    busy.messages.filter(id=chatter[0].id).update(created=timezone.now() + timedelta(minutes=1))
+    OutboxEvent.objects.using(shard_for_thread(quiet.id)).create(message=old[0], recipient=user2)
+
+    purged_threads = []
+    messages_purged.connect(lambda sender, thread_ids, **kwargs: purged_threads.extend(thread_ids), weak=False,
+                            dispatch_uid='test_retention')
+    rules = [
+        {'RULE': 'chat.retention.MaxAgeRule', 'OPTIONS': {'days': 30}},
+        {'RULE': 'chat.retention.MaxMessagesPerThreadRule', 'OPTIONS': {'limit': 4}},
+    ]
+    try:
+        with override_settings(CHAT_RETENTION_RULES=rules):
+            out = StringIO()
+            call_command('apply_retention', dry_run=True, stdout=out)
+            assert "Would delete 6 message(s)" in out.getvalue()
+            assert sum(Message.objects.using(alias).count() for alias in message_shards()) == 11
+
+            out = StringIO()
+            call_command('apply_retention', chunk_size=2, stdout=out)
+    finally:
+        messages_purged.disconnect(dispatch_uid='test_retention')
+
+    assert "Deleted 6 message(s)" in out.getvalue()
+    assert "batch 2" in out.getvalue()
+    kept = {recent.id, chatter[0].id, *[message.id for message in chatter[4:]]}
+    assert {pk for alias in message_shards() for pk in Message.objects.using(alias).values_list('id', flat=True)} == kept
+    assert not any(OutboxEvent.objects.using(alias).exists() for alias in message_shards())
+    assert set(purged_threads) == {quiet.id, busy.id}
+
+    class IncompleteRule(RetentionRule):
+        def batches(self, using, chunk_size):
+            return iter(())
+
+    with pytest.raises(TypeError):  # `count` is missing: rejected before anything is purged
+        IncompleteRule()
+
+
+@pytest.mark.django_db(databases='__all__')
+@override_settings(CHAT_RECENT_MESSAGES={'SIZE': 8, 'MAX_THREADS': 10, 'CACHE': 'default', 'SINGLE_PROCESS': True})
+def test_newest_messages_page_is_served_from_the_recent_buffer(django_capture_on_commit_callbacks, client):
+    """
+    Message test: after one database read, the newest page of a thread is served without queries,
+    kept current by sends and read-state changes; older pages, invalidated, expired and deleted threads
+    use the database, pages read in a rolled back transaction are not buffered, and without a shared
+    cache the buffer is off.
+    """
+    admin_client, client = client, APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+    for i in range(12):
+        Message.objects.create(thread=thread, sender=user2, text=f"Message {i}")
+    client.force_authenticate(user=user1)
+    shard = shard_for_thread(thread.id)
+    newest_page = f"/api/chat/threads/{thread.id}/messages/?limit=5&offset=7"
+
+    with django_capture_on_commit_callbacks(using=shard, execute=True):  # buffers are filled on commit
+        from_db = client.get(newest_page).data
+    client.get(newest_page)  # buffer hits check the thread is live, from the thread cache once warm
+    with CaptureQueriesContext(connections[shard]) as queries:
+        from_buffer = client.get(newest_page).data
+    assert len(queries) == 0
+    assert from_buffer == from_db
+    assert [message['text'] for message in from_buffer['results']] == [f"Message {i}" for i in range(7, 12)]
+
+    with django_capture_on_commit_callbacks(using=shard, execute=True):
+        sent = client.post("/api/chat/messages/", {"thread": thread.id, "sender": user1.id, "text": "New"}, format='json')
+    with django_capture_on_commit_callbacks(using=shard, execute=True):
+        client.post(f"/api/chat/messages/{from_db['results'][-1]['id']}/mark_as_read/")
+    with CaptureQueriesContext(connections[shard]) as queries:
+        page = client.get(f"/api/chat/threads/{thread.id}/messages/?limit=5&offset=8").data
+    assert len(queries) == 0
+    assert page['count'] == 13
+    assert page['results'][-1]['id'] == sent.data['id']
+    assert page['results'][-2]['is_read'] is True
+
+    with CaptureQueriesContext(connections[shard]) as queries:
+        oldest = client.get(f"/api/chat/threads/{thread.id}/messages/?limit=5&offset=0").data
+    assert len(queries) > 0
+    assert oldest['results'][0]['text'] == "Message 0"
+
+    messages_purged.send(sender=Message, thread_ids={thread.id}, using=shard)
+    with CaptureQueriesContext(connections[shard]) as queries:
+        assert client.get(newest_page).data['count'] == 13
+    assert len(queries) > 0
+
+    with override_settings(CHAT_RECENT_MESSAGES={'SIZE': 8, 'CACHE': 'default', 'MAX_AGE': 0, 'SINGLE_PROCESS': True}):
+        with CaptureQueriesContext(connections[shard]) as queries:
+            client.get(newest_page)
+        assert len(queries) > 0
+    with override_settings(CHAT_RECENT_MESSAGES={'SIZE': 8, 'CACHE': 'default'}):  # LocMemCache: not shared
+        with CaptureQueriesContext(connections[shard]) as queries:
+            client.get(newest_page)
+        assert len(queries) > 0
+
+    # a page read inside a transaction that is rolled back is not buffered (atomic batches need one database)
+    if not is_sharded():
+        recent_messages.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            response = client.post("/api/chat/batch/", {"atomic": True, "requests": [
+                {"method": "POST", "path": "/api/chat/messages/", "body": {"thread": thread.id, "sender": user1.id, "text": "Rolled back"}},
+                {"method": "GET", "path": newest_page},
+                {"method": "POST", "path": "/api/chat/messages/0/mark_as_read/"},
+            ]}, format='json')
+        assert [result and result['status'] for result in response.data['responses']] == [201, 200, 404]
+        page = client.get(newest_page).data
+        assert page['count'] == 13
+        assert "Rolled back" not in [message['text'] for message in page['results']]
+
+    with django_capture_on_commit_callbacks(using=shard, execute=True):
+        client.get(newest_page)
+    admin = User.objects.create_superuser(email="admin@example.com", password="password123", username="admin")
+    admin_client.force_login(admin)
+    admin_client.post("/admin/chat/thread/", {'action': 'soft_delete_threads', '_selected_action': [thread.pk]})
+    assert client.get(newest_page).status_code == 404
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_message_list_is_the_callers_timeline_with_cursor_pagination(monkeypatch):
+    """
+    Message test: `GET /api/chat/messages/` returns only the caller's live threads, newest first,
+    page by page through `next` (threads walked by keyset, page size capped), and a page costs the
+    same however many quiet threads the caller has;
+    threads missing `last_message_at` are backfilled from their messages.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    user3 = User.objects.create_user(email="user3@example.com", password="password123", username="user3")
+
+    def make_thread(*users):
+        thread = Thread.objects.create()
+        thread.participants.set(users)
+        return thread
+
+    quiet = [make_thread(user1, user2) for _ in range(20)]
+    for thread in quiet:
+        Message.objects.create(thread=thread, sender=user2, text="old")
+    first, second, others, deleted = make_thread(user1, user2), make_thread(user1, user3), make_thread(user2, user3), make_thread(user1, user3)
+    for i in range(4):
+        Message.objects.create(thread=first, sender=user2, text=f"first {i}")
+        Message.objects.create(thread=second, sender=user3, text=f"second {i}")
+        Message.objects.create(thread=others, sender=user3, text=f"others {i}")
+    Message.objects.create(thread=deleted, sender=user3, text="deleted")
+    deleted.soft_delete()
+
+    expected = [pk for created, pk in sorted((
+        row for alias in message_shards()
+        for row in Message.objects.using(alias).filter(thread__in=[*quiet, first, second]).values_list('created', 'id')
+    ), reverse=True)]
+    client.force_authenticate(user=user1)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/chat/messages/?limit=3")
+    assert len(queries) < 10
+    assert [message['text'] for message in response.data['results']] == ["second 3", "first 3", "second 2"]
+
+    seen, url = [], "/api/chat/messages/?limit=3"
+    with CaptureQueriesContext(connection) as queries:
+        while url:
+            response = client.get(url)
+            seen.extend(message['id'] for message in response.data['results'])
+            url = response.data['next']
+    assert seen == expected
+    assert not [query for query in queries.captured_queries if 'OFFSET' in query['sql']]  # threads by keyset
+
+    monkeypatch.setattr(TimelinePagination, 'max_limit', 4)
+    assert len(client.get("/api/chat/messages/?limit=100000").data['results']) == 4
+    assert client.get("/api/chat/messages/?cursor=garbage").status_code == 404
+
+    # threads left without last_message_at (e.g. messages on another shard at migration time) are backfilled
+    Thread.all_objects.filter(pk__in=[first.pk, deleted.pk]).update(last_message_at=None)
+    assert "of 2 thread(s)" in call_command('backfill_last_message_at', stdout=StringIO())
+    first.refresh_from_db()
+    assert first.last_message_at == first.messages.latest('created').created
+    assert client.get("/api/chat/messages/?limit=3").data['results'][1]['text'] == "first 3"
+
+
+@pytest.mark.django_db(databases='__all__')
+@override_settings(CHAT_BROADCAST={'SYNC_LIMIT': 3, 'CHUNK_SIZE': 2})
+def test_broadcast_reuses_or_creates_threads_in_bulk_and_large_ones_run_in_the_background():
+    """
+    Message test: a staff broadcast reaches every recipient in their one thread with the sender, with a
+    query count independent of the audience; audiences over SYNC_LIMIT are sent by `send_broadcasts`.
+    """
+    client = APIClient()
+    staff = User.objects.create_user(email="staff@example.com", password="password123", username="staff", is_staff=True)
+    users = [
+        User.objects.create_user(email=f"user{i}@example.com", password="password123", username=f"user{i}")
+        for i in range(1, 8)
+    ]
+    existing = Thread.objects.create()
+    existing.participants.set([staff, users[0]])
+    group = Thread.objects.create()
+    group.participants.set([staff, users[1], users[2]])  # not a two-participant thread: not reused
+
+    client.force_authenticate(user=users[0])
+    assert client.post("/api/chat/broadcasts/", {"text": "hi", "recipients": [users[1].pk]}, format='json').status_code == 403
+
+    client.force_authenticate(user=staff)
+    recipients = [user.pk for user in users[:3]] + [users[0].pk]
+    with CaptureQueriesContext(connection) as queries:
+        response = client.post("/api/chat/broadcasts/", {"text": "Maintenance tonight", "recipients": recipients}, format='json')
+    assert response.status_code == 201
+    assert response.data['status'] == 'done'
+    assert (response.data['total'], response.data['sent'], response.data['threads_created']) == (3, 3, 2)
+    assert len(queries) < 40
+    assert existing.messages.filter(text="Maintenance tonight").count() == 1
+    assert not group.messages.exists()
+    for user in users[1:3]:
+        thread = Thread.objects.filter(participants=user).exclude(pk=group.pk).get()
+        assert set(thread.participants.values_list('pk', flat=True)) == {staff.pk, user.pk}
+        assert thread.last_message_at is not None
+    assert sum(OutboxEvent.objects.using(alias).filter(message__text="Maintenance tonight").count() for alias in message_shards()) == 3
+
+    response = client.post("/api/chat/broadcasts/", {"text": "Big news", "recipients": [user.pk for user in users]}, format='json')
+    assert response.status_code == 202
+    assert response.data['status'] == 'pending'
+    out = StringIO()
+    call_command('send_broadcasts', stdout=out)
+    assert "broadcast" in out.getvalue() and "done" in out.getvalue()
+    progress = client.get(f"/api/chat/broadcasts/{response.data['id']}/").data
+    assert (progress['status'], progress['processed'], progress['sent'], progress['threads_created']) == ('done', 7, 7, 4)
+    assert sum(Message.objects.using(alias).filter(text="Big news").count() for alias in message_shards()) == 7
+    assert Thread.objects.filter(participants=staff).count() == 2 + 2 + 4
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_retried_creates_with_an_idempotency_key_replay_the_original_response():
+    """
+    Message test: a retried `POST` with the same `Idempotency-Key` gets the first response back without
+    running again, a reused key with another body is rejected, and expired keys are purged.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    client.force_authenticate(user=user1)
+
+    thread = client.post("/api/chat/threads/", {"participants": [user1.pk, user2.pk]}, format='json', HTTP_IDEMPOTENCY_KEY="t-1")
+    assert thread.status_code == 201
+    retry = client.post("/api/chat/threads/", {"participants": [user1.pk, user2.pk]}, format='json', HTTP_IDEMPOTENCY_KEY="t-1")
+    assert (retry.status_code, retry.data, retry['Idempotent-Replayed']) == (201, thread.data, 'true')
+
+    payload = {"thread": thread.data['id'], "sender": user1.pk, "text": "Hello"}
+    messages = Message.objects.using(shard_for_thread(thread.data['id']))
+    first = client.post("/api/chat/messages/", payload, format='json', HTTP_IDEMPOTENCY_KEY="m-1")
+    assert first.status_code == 201
+    with CaptureQueriesContext(connection) as queries:
+        retry = client.post("/api/chat/messages/", payload, format='json', HTTP_IDEMPOTENCY_KEY="m-1")
+    assert (retry.status_code, retry.data) == (201, first.data)
+    assert not any('INSERT' in query['sql'] for query in queries)
+    assert messages.filter(text="Hello").count() == 1
+
+    # the key table alone (another worker, front cache cold) replays as well
+    reset_stores()
+    assert client.post("/api/chat/messages/", payload, format='json', HTTP_IDEMPOTENCY_KEY="m-1").data == first.data
+    assert messages.filter(text="Hello").count() == 1
+
+    other = client.post("/api/chat/messages/", {**payload, "text": "Bye"}, format='json', HTTP_IDEMPOTENCY_KEY="m-1")
+    assert other.status_code == 422
+
+    # failed requests are not recorded
+    bad = {"thread": thread.data['id'], "sender": 999, "text": "Hello"}
+    assert client.post("/api/chat/messages/", bad, format='json', HTTP_IDEMPOTENCY_KEY="m-2").status_code == 400
+    assert client.post("/api/chat/messages/", payload, format='json', HTTP_IDEMPOTENCY_KEY="m-2").status_code == 201
+    assert messages.filter(text="Hello").count() == 2
+
+    IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+    out = StringIO()
+    call_command('purge_idempotency_keys', stdout=out)
+    assert "Deleted 3 expired" in out.getvalue()
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+@override_settings(CHAT_GROUP_COMMIT={'ENABLED': True, 'MAX_BATCH': 8, 'MAX_WAIT_MS': 200})
+def test_group_commit_writes_concurrent_sends_in_few_transactions():
+    """
+    Message test: with group commit on, concurrent sends are committed together by the writer thread,
+    each sender gets its saved message back, and a failing send does not fail the rest of its group.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+
+    client.force_authenticate(user=user1)
+    response = client.post("/api/chat/messages/", {"thread": thread.pk, "sender": user1.pk, "text": "Hi"}, format='json')
+    assert response.status_code == 201
+    assert thread.messages.get(pk=response.data['id']).text == "Hi"
+    assert OutboxEvent.objects.using(shard_for_thread(thread.pk)).filter(message_id=response.data['id'], recipient=user2).exists()
+    thread.refresh_from_db()
+    assert thread.last_message_at is not None
+
+    groups = message_writer.groups
+    results, errors = [], []
+
+    def send(i):
+        try:
+            text = None if i == 3 else f"burst {i}"  # NOT NULL violation
+            results.append(message_writer.submit(Message(thread=thread, sender=user1, text=text)))
+        except Exception as error:
+            errors.append(error)
+
+    senders = [threading.Thread(target=send, args=(i,)) for i in range(8)]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+
+    assert len(results) == 7 and len(errors) == 1
+    assert all(message.pk is not None for message in results)
+    assert thread.messages.filter(text__startswith="burst").count() == 7
+    # a first group failed on the bad send, then every send was retried alone; groups are committed per shard,
+    # and every send here goes to one thread, so the bounds hold whatever CHAT_SHARDS is
+    assert message_writer.groups - groups <= 8 + 1
+    message_writer.stop()
+
+    groups = message_writer.groups
+    senders = [
+        threading.Thread(target=message_writer.submit, args=(Message(thread=thread, sender=user1, text=f"ok {i}"),))
+        for i in range(8)
+    ]
+    for sender in senders:
+        sender.start()
+    for sender in senders:
+        sender.join()
+    assert thread.messages.filter(text__startswith="ok").count() == 8
+    assert message_writer.groups - groups <= 2
+
+
+@pytest.mark.django_db(transaction=True, databases='__all__')
+@override_settings(CHAT_GROUP_COMMIT={'ENABLED': True, 'MAX_WAIT_MS': 300, 'TIMEOUT': 0.05})
+def test_group_commit_send_that_times_out_is_withdrawn_or_reported_as_unknown(monkeypatch):
+    """
+    Message test: a send the writer hasn't picked up by the timeout is never written, and one it is
+    already writing answers 503; its idempotency key answers 409 until the write commits, then replays the 201.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    thread = Thread.objects.create()
+    thread.participants.set([user1, user2])
+    client.force_authenticate(user=user1)
+
+    # still being collected into a group when the sender gives up
+    response = client.post("/api/chat/messages/", {"thread": thread.pk, "sender": user1.pk, "text": "Late"}, format='json')
+    assert response.status_code == 503 and response.data['detail'].code == 'send_timed_out'
+    message_writer.stop()
+    assert not thread.messages.filter(text="Late").exists()
+
+    # already being written when the sender gives up
+    write = message_writer._write
+    monkeypatch.setattr(message_writer, '_write', lambda alias, messages: (time.sleep(0.3), write(alias, messages)))
+    body = {"thread": thread.pk, "sender": user1.pk, "text": "Slow"}
+    with override_settings(CHAT_GROUP_COMMIT={'ENABLED': True, 'MAX_WAIT_MS': 0, 'TIMEOUT': 0.05}):
+        response = client.post("/api/chat/messages/", body, format='json', HTTP_IDEMPOTENCY_KEY="slow")
+        assert response.status_code == 503 and response.data['detail'].code == 'send_outcome_unknown'
+        assert client.post("/api/chat/messages/", body, format='json', HTTP_IDEMPOTENCY_KEY="slow").status_code == 409
+        message_writer.stop()
+        retried = client.post("/api/chat/messages/", body, format='json', HTTP_IDEMPOTENCY_KEY="slow")
+    assert retried.status_code == 201 and retried['Idempotent-Replayed'] == 'true'
+    assert retried.data['id'] == thread.messages.get(text="Slow").pk
+
+
+@pytest.mark.django_db
+def test_identical_concurrent_polls_share_one_execution():
+    """
+    Infrastructure test: concurrent calls with the same key run once and all get the result (or the error);
+    polls still answer per request, and the collapse ratio is reported to staff.
+    """
+    flight = SingleFlight()
+    started, release, calls = threading.Event(), threading.Event(), []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return len(calls)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('test', 'key', compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('test', 'key', compute))) for _ in range(4)]
+    for follower in followers:
+        follower.start()
+    while flight.stats()['test']['requests'] < 5:
+        time.sleep(0.01)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join()
+    assert results == [1] * 5 and len(calls) == 1
+    assert flight.stats()['test'] == {'requests': 5, 'executions': 1, 'collapsed': 4, 'collapse_ratio': 0.8}
+    assert flight.do('test', 'key', lambda: "fresh") == "fresh"  # nothing is kept after the call
+
+    with pytest.raises(ZeroDivisionError):
+        flight.do('test', 'error', lambda: 1 / 0)
+
+    client = APIClient()
+    staff = User.objects.create_user(email="staff@example.com", password="password123", username="staff", is_staff=True)
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    client.force_authenticate(user=user1)
+    assert client.get("/api/chat/messages/unread/").data == {"unread_count": 0}
+    assert client.get("/api/chat/threads/user_threads/?limit=5").status_code == 200
+    assert client.get("/api/chat/metrics/").status_code == 403
+
+    client.force_authenticate(user=staff)
+    metrics = client.get("/api/chat/metrics/").data
+    assert metrics['coalescing']['message.unread']['requests'] == 1
+    assert metrics['coalescing']['thread.user_threads']['executions'] == 1
+    assert 'group_commit' in metrics
+
+
+@pytest.mark.django_db(databases='__all__')
+def test_contacts_come_from_the_cached_adjacency_list_and_follow_thread_changes(django_capture_on_commit_callbacks):
+    """
+    Message test: `GET /api/chat/contacts/` lists conversation partners by last interaction with a fixed
+    number of queries, leaves out deactivated users before paginating, and follows new threads and messages
+    in place and deleted threads on the next read.
+    """
+    client = APIClient()
+    user1 = User.objects.create_user(email="user1@example.com", password="password123", username="user1")
+    user2 = User.objects.create_user(email="user2@example.com", password="password123", username="user2")
+    user3 = User.objects.create_user(email="user3@example.com", password="password123", username="user3")
+    user4 = User.objects.create_user(email="user4@example.com", password="password123", username="user4")
+
+    def make_thread(*users):
+        thread = Thread.objects.create()
+        thread.participants.set(users)
+        return thread
+
+    for _ in range(10):
+        make_thread(user1, user2)
+    with_user3 = make_thread(user1, user3)
+    Message.objects.create(thread=with_user3, sender=user3, text="hi")
+    make_thread(user2, user3)
+
+    client.force_authenticate(user=user1)
+    response = client.get("/api/chat/contacts/")
+    assert [contact['username'] for contact in response.data['results']] == ["user3", "user2"]
+    assert response.data['count'] == 2
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/chat/contacts/?limit=1")
+    assert len(queries) == 2  # deactivated contacts and the profiles of the page; the adjacency list is cached
+    assert [contact['username'] for contact in response.data['results']] == ["user3"]
+
+    # deactivated users are dropped before paginating: full pages and an exact count
+    User.objects.filter(pk=user3.pk).update(is_active=False)
+    response = client.get("/api/chat/contacts/?limit=1")
+    assert [contact['username'] for contact in response.data['results']] == ["user2"]
+    assert response.data['count'] == 1
+    User.objects.filter(pk=user3.pk).update(is_active=True)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with_user4 = make_thread(user1, user4)
+        Message.objects.create(thread=make_thread(user1, user2), sender=user2, text="back")
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/chat/contacts/")
+    assert len(queries) == 2
+    assert [contact['username'] for contact in response.data['results']] == ["user2", "user4", "user3"]
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with_user4.soft_delete()
+        with_user3.participants.remove(user3)
+    assert [contact['username'] for contact in client.get("/api/chat/contacts/").data['results']] == ["user2"]
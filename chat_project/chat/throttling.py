@@ -0,0 +1,73 @@
+import time
+from typing import Optional
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .stores import get_store
+
+__all__ = (
+    "TokenBucketThrottle",
+    "parse_rate",
+)
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """
+    Parse `"<requests>/<period>"` (e.g. `"30/min"`) into `(capacity, tokens per second)`.
+    """
+    requests, period = rate.split('/')
+    capacity = int(requests)
+    return capacity, capacity / PERIODS[period]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-user, per-action token bucket.
+
+    The scope is `<basename>.<action>` (e.g. `message.create`) and its rate comes from
+    `CHAT_THROTTLE_RATES`, falling back to the `default` entry. A bucket holds up to `<requests>` tokens
+    and refills continuously, so short bursts are allowed while the sustained rate is capped.
+
+    Each check is a single O(1) update in the `throttle` ephemeral store (see `chat.stores`);
+    the database is never touched. Rejected requests get a `Retry-After` header from DRF.
+    """
+    store_name = 'throttle'
+
+    def __init__(self):
+        self.retry_after: Optional[float] = None
+
+    def get_scope(self, view) -> str:
+        return f"{getattr(view, 'basename', view.__class__.__name__)}.{getattr(view, 'action', None)}"
+
+    def get_rate(self, scope: str) -> Optional[str]:
+        rates = getattr(settings, 'CHAT_THROTTLE_RATES', {})
+        return rates.get(scope, rates.get('default'))
+
+    def allow_request(self, request, view) -> bool:
+        scope = self.get_scope(view)
+        rate = self.get_rate(scope)
+        if rate is None:
+            return True
+
+        capacity, refill = parse_rate(rate)
+        ident = request.user.pk if request.user and request.user.is_authenticated else self.get_ident(request)
+        now = time.time()  # wall clock: buckets may live in a cache shared between workers
+
+        def take(bucket: Optional[tuple[float, float, bool]]) -> tuple[float, float, bool]:
+            tokens, updated = (capacity, now) if bucket is None else bucket[:2]
+            tokens = min(capacity, tokens + max(0.0, now - updated) * refill)
+            if tokens >= 1:
+                return tokens - 1, now, True
+            return tokens, now, False
+
+        tokens, _, allowed = get_store(self.store_name).update(
+            f'throttle:{scope}:{ident}', take, ttl=capacity / refill
+        )
+        self.retry_after = None if allowed else (1 - tokens) / refill
+        return allowed
+
+    def wait(self) -> Optional[float]:
+        return self.retry_after
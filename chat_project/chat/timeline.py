@@ -0,0 +1,105 @@
+import base64
+import heapq
+from datetime import datetime
+from typing import Optional
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from . import sharding
+from .models import Thread, Message
+
+__all__ = (
+    "Cursor",
+    "encode_cursor",
+    "decode_cursor",
+    "user_timeline",
+)
+
+# position in the timeline: (created, id) of the last message of the previous page
+Cursor = tuple[datetime, int]
+
+
+def encode_cursor(message: Message) -> str:
+    return base64.urlsafe_b64encode(f"{message.created.isoformat()}|{message.pk}".encode()).decode()
+
+
+def decode_cursor(value: str) -> Optional[Cursor]:
+    try:
+        created, pk = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        created_at = parse_datetime(created)
+        return (created_at, int(pk)) if created_at is not None else None
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _key(message: Message) -> Cursor:
+    return message.created, message.pk
+
+
+def _thread_page(thread_id: int, limit: int, before: Optional[Cursor]) -> list[Message]:
+    """
+    Newest `limit` messages of one thread before the cursor: one range scan of the (thread, created, id) index.
+    """
+    messages = Message.objects.using(sharding.shard_for_thread(thread_id)).filter(thread_id=thread_id)
+    if before is not None:
+        created, pk = before
+        messages = messages.filter(Q(created__lt=created) | Q(created=created, id__lt=pk))
+    return list(messages.order_by('-created', '-id')[:limit])
+
+
+def _fetch(thread_ids: list[int], limit: int, before: Optional[Cursor]) -> list[list[Message]]:
+    by_shard = sharding.group_by_shard(thread_ids)
+    pages = sharding.fan_out(
+        lambda alias: [_thread_page(thread_id, limit, before) for thread_id in by_shard[alias]],
+        shards=by_shard,
+    )
+    return [page for shard_pages in pages.values() for page in shard_pages]
+
+
+def user_timeline(user, limit: int, before: Optional[Cursor] = None) -> list[Message]:
+    """
+    Newest `limit` messages across all live threads of `user`, newest first, before the cursor.
+
+    A k-way merge of per-thread index ranges. Threads are visited in order of their newest possible
+    message (`Thread.last_message_at`, capped by the cursor), in waves of `limit` threads fetched by
+    keyset on `(last_message_at, id)`, and the walk stops as soon as no remaining thread can beat the
+    page's oldest message. Each wave and each visited thread costs one bounded index range scan, so
+    the work follows the page size (capped by the view), not the table or thread count.
+
+    Threads without `last_message_at` have no messages (see `backfill_last_message_at` for threads
+    migrated with their messages on other shards) and are skipped.
+    """
+    # min(last_message_at, cursor) bounds a thread's newest message before the cursor, and it is
+    # monotonic in last_message_at: ordering by last_message_at is ordering by that bound
+    threads = (
+        Thread.objects.filter(participants=user, last_message_at__isnull=False)
+        .order_by('-last_message_at', '-id')
+        .values_list('id', 'last_message_at')
+    )
+
+    def bound(last_message_at: datetime) -> datetime:
+        return min(last_message_at, before[0]) if before is not None else last_message_at
+
+    page: list[tuple[Cursor, Message]] = []  # min-heap of the best `limit` messages so far
+    after: Optional[tuple[int, datetime]] = None  # the last thread of the previous wave
+    while True:
+        wave_threads = threads
+        if after is not None:
+            thread_id, last = after
+            wave_threads = threads.filter(Q(last_message_at__lt=last) | Q(last_message_at=last, id__lt=thread_id))
+        wave = list(wave_threads[:limit])
+        if not wave or len(page) == limit and bound(wave[0][1]) < page[0][0][0]:
+            break
+        after = wave[-1]
+        if len(page) == limit:
+            wave = [(thread_id, last) for thread_id, last in wave if bound(last) >= page[0][0][0]]
+        for messages in _fetch([thread_id for thread_id, _ in wave], limit, before):
+            for message in messages:
+                if len(page) < limit:
+                    heapq.heappush(page, (_key(message), message))
+                elif _key(message) > page[0][0]:
+                    heapq.heapreplace(page, (_key(message), message))
+                else:
+                    break  # the rest of this thread's range is older still
+    return [message for _, message in sorted(page, key=lambda item: item[0], reverse=True)]
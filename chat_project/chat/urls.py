@@ -1,11 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ThreadViewSet, MessageViewSet
+from .views import BatchView, BroadcastViewSet, ContactsView, MetricsView, ThreadViewSet, MessageViewSet
 
 router = DefaultRouter()
 router.register(r'threads', ThreadViewSet)
 router.register(r'messages', MessageViewSet)
+router.register(r'broadcasts', BroadcastViewSet, basename='broadcast')
 
 urlpatterns = [
+    path('batch/', BatchView.as_view()),
+    path('metrics/', MetricsView.as_view()),
+    path('contacts/', ContactsView.as_view()),
     path('', include(router.urls)),
 ]
@@ -1,28 +1,57 @@
-from rest_framework import viewsets, status
+from datetime import timedelta
+
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.views import APIView
 from typing import Any, Optional
-from django.http import HttpRequest
-from .models import Thread, Message
-from .serializers import ThreadSerializer, MessageSerializer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from django.http import Http404, HttpRequest
+from . import batch, broadcast, cache, contacts, idempotency, outbox, presence, sharding, timeline
+from .mixins import CoalescingMixin, IdempotencyMixin, PresenceMixin, TransactionPolicyMixin
+from .recent import recent_messages
+from .coalescing import single_flight
+from .writer import SendOutcomeUnknown, message_writer
+from .models import Thread, Message, Broadcast
+from .serializers import (
+    BatchRequestSerializer, BroadcastSerializer, ContactSerializer, ThreadSerializer, MessageSerializer,
+)
+from .throttling import TokenBucketThrottle
 from django.db.models import Count, Q, QuerySet
 
 
 __all__ = (
     "ThreadViewSet",
     "MessageViewSet",
+    "BatchView",
+    "BroadcastViewSet",
+    "MetricsView",
+    "ContactsView",
 )
 
 
-class ThreadViewSet(viewsets.ModelViewSet):
+class ThreadViewSet(PresenceMixin, TransactionPolicyMixin, IdempotencyMixin, CoalescingMixin, viewsets.ModelViewSet):
     """
     ThreadViewSet handles CRUD operations for the Thread model, including:
 
     - `create`: Checks if a thread with the same participants exists. If found, returns the existing thread, otherwise creates a new one.
-    - `destroy`: Deletes a specific thread.
+    - `destroy`: Soft-deletes a specific thread; its messages are purged later by `manage.py purge_deleted_threads`.
     - `user_threads`: Returns a list of threads for the current authenticated user.
-    - `messages`: Retrieves all messages from a specific thread.
+    - `messages`: Retrieves all messages from a specific thread, oldest first; the newest pages of hot threads
+      are served from memory (see `chat.recent`).
+    - `typing` / `presence`: Ephemeral typing and online state of the thread's participants (see `chat.presence`).
+
+    Reads run in autocommit, writes run in a transaction (see `TransactionPolicyMixin`).
+    Every action is rate limited per user (see `TokenBucketThrottle`) and counts as a presence heartbeat.
+    `create` honours an `Idempotency-Key` header (see `IdempotencyMixin`); concurrent identical
+    `user_threads` polls share one execution (see `CoalescingMixin`).
 
     Key methods:
     - `_get_existing_thread`: Finds a thread with exactly two matching participants.
@@ -34,6 +63,9 @@ class ThreadViewSet(viewsets.ModelViewSet):
     serializer_class = ThreadSerializer
     queryset = Thread.objects.all()
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    non_atomic_actions = frozenset({'typing'})
+    coalesced_actions = frozenset({'user_threads'})
 
     def _get_existing_thread(self, participants: list[int]) -> QuerySet:
         """
@@ -94,7 +126,7 @@ class ThreadViewSet(viewsets.ModelViewSet):
 
     def destroy(self, request, *args, **kwargs):
         thread = self.get_object()
-        thread.delete()
+        thread.soft_delete()
         return Response({'status': 'Thread deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'], url_path='user_threads')
@@ -118,26 +150,152 @@ class ThreadViewSet(viewsets.ModelViewSet):
         """
         Custom action to retrieve a paginated list of messages for a specific thread.
         """
+        thread_id = int(pk) if str(pk).isdigit() else None
+        limit = self.paginator.get_limit(request) if self.paginator is not None else None
+        buffered = thread_id is not None and limit is not None and recent_messages.enabled
+        if buffered:
+            # the newest messages of hot threads are buffered in memory (see `chat.recent`)
+            offset = self.paginator.get_offset(request)
+            entry = recent_messages.get(thread_id)
+            window = entry.window(offset, limit) if entry is not None else None
+            if window is not None:
+                self._get_participant_ids(pk)  # 404 for deleted threads; from the thread cache when warm
+                self.paginator.request, self.paginator.limit, self.paginator.offset = request, limit, offset
+                self.paginator.count = entry.count
+                return self.paginator.get_paginated_response(window)
+            generation = recent_messages.generation(thread_id)
+
         thread = self.get_object()
-        messages = thread.messages.select_related('sender').all()
+        # routed to the thread's shard; MessageSerializer only needs `sender_id`, so no join
+        # send order: with sharding, ids come from per-worker blocks and don't follow it
+        messages = thread.messages.order_by('created', 'id')
         page = self.paginate_queryset(messages)
         if page is not None:
             serializer = MessageSerializer(page, many=True)
+            if buffered and self.paginator.offset + limit > self.paginator.count - recent_messages.size:
+                newest = list(messages.order_by('-created', '-id')[:recent_messages.size])[::-1]
+                recent_messages.fill(
+                    thread_id, generation, self.paginator.count, MessageSerializer(newest, many=True).data, using=messages.db
+                )
             return self.get_paginated_response(serializer.data)
         serializer = MessageSerializer(messages, many=True)
         return Response(serializer.data)
 
+    def _get_participant_ids(self, pk: Optional[int]) -> list[int]:
+        """
+        Participants from the thread cache; the database is read only on a cache miss.
+        """
+        cached = cache.get_threads([int(pk)]).get(int(pk)) if str(pk).isdigit() else None
+        if cached is None:
+            cached = self.get_serializer(self.get_object()).data
+        return cached['participants']
+
+    @action(detail=True, methods=['post'])
+    def typing(self, request: HttpRequest, pk: Optional[int] = None) -> Response:
+        """
+        Mark the current user as typing in the thread (`{"typing": false}` clears it).
+        """
+        if request.user.pk not in self._get_participant_ids(pk):
+            return Response({"error": "You are not a participant of this thread."}, status=status.HTTP_403_FORBIDDEN)
+
+        typing = request.data.get('typing', True) not in (False, 'false', '0', 0)
+        presence.set_typing(int(pk), request.user.pk, typing)
+        return Response({'typing': typing})
+
+    @action(detail=True, methods=['get'])
+    def presence(self, request: HttpRequest, pk: Optional[int] = None) -> Response:
+        """
+        Online / last-seen / typing state of every participant of the thread, in one call.
+        """
+        participant_ids = self._get_participant_ids(pk)
+        if request.user.pk not in participant_ids:
+            return Response({"error": "You are not a participant of this thread."}, status=status.HTTP_403_FORBIDDEN)
+        return Response({'participants': presence.get_thread_state(int(pk), participant_ids)})
+
 
-class MessageViewSet(viewsets.ModelViewSet):
+class TimelinePagination(LimitOffsetPagination):
+    # every message of a timeline page may come from a different thread: one range scan each
+    max_limit = 100
+
+
+class MessageViewSet(PresenceMixin, TransactionPolicyMixin, IdempotencyMixin, CoalescingMixin, viewsets.ModelViewSet):
     """
     MessageViewSet handles CRUD operations for the Message model, including:
 
+    - `list`: The caller's timeline across all of their threads, newest first (see `chat.timeline`).
+    - `create`: Sends a message and, in the same transaction, queues its outbox events (see `chat.outbox`);
+      with `CHAT_GROUP_COMMIT['ENABLED']` sends are committed in groups by one writer thread (see `chat.writer`).
     - `unread`: Returns the count of unread messages for the current authenticated user.
     - `mark_as_read`: Marks a specific message as read.
-        """
+
+    Messages live on the shard of their thread (see `chat.sharding`); `unread` fans out over all shards.
+    Reads run in autocommit, writes run in a transaction (see `TransactionPolicyMixin`).
+    Every action is rate limited per user (see `TokenBucketThrottle`) and counts as a presence heartbeat.
+    `create` honours an `Idempotency-Key` header (see `IdempotencyMixin`); concurrent identical
+    `unread` polls share one execution (see `CoalescingMixin`).
+    """
     serializer_class = MessageSerializer
-    queryset = Message.objects.all()
+    queryset = Message.objects.filter(thread__deleted_at__isnull=True)
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TokenBucketThrottle]
+    pagination_class = TimelinePagination
+    coalesced_actions = frozenset({'unread'})
+
+    def list(self, request: HttpRequest, *args: Any, **kwargs: Any) -> Response:
+        """
+        The caller's timeline: newest messages across their threads, newest first, with cursor pagination
+        (`?limit=` and the `next` link). Cost follows the page size (see `chat.timeline`).
+        """
+        before = None
+        if request.query_params.get('cursor'):
+            before = timeline.decode_cursor(request.query_params['cursor'])
+            if before is None:
+                raise NotFound("Invalid cursor.")
+
+        limit = self.paginator.get_limit(request)
+        messages = timeline.user_timeline(request.user, limit, before)
+        next_url = None
+        if len(messages) == limit:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', timeline.encode_cursor(messages[-1]))
+        return Response({'next': next_url, 'results': MessageSerializer(messages, many=True).data})
+
+    def get_object(self) -> Message:
+        if not sharding.is_sharded():
+            return super().get_object()
+
+        try:
+            message = sharding.locate_message(int(self.kwargs[self.lookup_url_kwarg or self.lookup_field]))
+        except ValueError:
+            raise Http404
+        if message is None or not Thread.objects.filter(pk=message.thread_id).exists():
+            raise Http404
+        self.check_object_permissions(self.request, message)
+        return message
+
+    def is_atomic_request(self, request: HttpRequest) -> bool:
+        # a group-committed send must not hold a write transaction of its own while it waits for the writer
+        if message_writer.enabled and (getattr(self, 'action_map', None) or {}).get(request.method.lower()) == 'create':
+            return False
+        return super().is_atomic_request(request)
+
+    def perform_create(self, serializer: MessageSerializer) -> None:
+        if message_writer.enabled:
+            try:
+                serializer.instance = message_writer.submit(Message(**serializer.validated_data))
+            except SendOutcomeUnknown as error:
+                claim = getattr(self, '_idempotency_claim', None)
+                if claim is not None:
+                    # replay the send's 201 once the writer commits it (or free the key if it fails)
+                    idempotency.complete_later(claim, error.future, lambda message: Response(
+                        MessageSerializer(message).data, status=status.HTTP_201_CREATED
+                    ))
+                raise
+            return
+
+        thread = serializer.validated_data['thread']
+        with transaction.atomic(using=sharding.shard_for_thread(thread.pk)):
+            message = serializer.save()
+            outbox.enqueue([message])
 
     @action(detail=False, methods=['get'])
     def unread(self, request: HttpRequest) -> Response:
@@ -145,8 +303,21 @@ class MessageViewSet(viewsets.ModelViewSet):
         Custom action to return the count of unread messages for the current user.
         """
         user = request.user
-        unread_messages = Message.objects.filter(is_read=False, thread__participants__in=[user])
-        return Response({"unread_count": unread_messages.count()})
+        if not sharding.is_sharded():
+            unread_messages = Message.objects.filter(
+                is_read=False,
+                thread__participants__in=[user],
+                thread__deleted_at__isnull=True,
+            )
+            return Response({"unread_count": unread_messages.count()})
+
+        # threads live on `default`, messages on the shards: count per shard in parallel
+        thread_ids = sharding.group_by_shard(Thread.objects.filter(participants=user).values_list('id', flat=True))
+        counts = sharding.fan_out(
+            lambda alias: Message.objects.using(alias).filter(thread_id__in=thread_ids[alias], is_read=False).count(),
+            shards=thread_ids,
+        )
+        return Response({"unread_count": sum(counts.values())})
 
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request: HttpRequest, pk: Optional[int] = None) -> Response:
@@ -157,3 +328,102 @@ class MessageViewSet(viewsets.ModelViewSet):
         message.is_read = True
         message.save()
         return Response({'status': 'message marked as read'})
+
+
+class BatchView(APIView):
+    """
+    Runs several chat API calls in one HTTP round-trip (see `chat.batch.run_batch`).
+
+    The caller is authenticated once; every sub-request still goes through its own view's permissions,
+    throttling and validation. Returns `{"responses": [{"status": ..., "body": ...}, ...]}` in request order.
+    `"atomic": true` is rejected with sharded messages or group commit, whose writes a rollback can't undo.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request: HttpRequest) -> Response:
+        serializer = BatchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['atomic'] and not batch.atomic_supported():
+            return Response(
+                {"error": "Atomic batches are not available with sharded messages or group commit."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        responses = batch.run_batch(request, serializer.validated_data['requests'], serializer.validated_data['atomic'])
+        return Response({'responses': responses})
+
+
+class BroadcastViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin,
+                       viewsets.GenericViewSet):
+    """
+    Staff-only: send one message from the caller to many users, each in their own thread (see `chat.broadcast`).
+
+    - `create`: Up to `CHAT_BROADCAST['SYNC_LIMIT']` recipients are sent within the request (`201`);
+      larger audiences are queued for `manage.py send_broadcasts` (`202`).
+    - `retrieve` / `list`: Progress of the caller's broadcasts.
+    """
+    serializer_class = BroadcastSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self) -> QuerySet:
+        return Broadcast.objects.filter(sender=self.request.user).order_by('-id')
+
+    def create(self, request: HttpRequest, *args: Any, **kwargs: Any) -> Response:
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        if len(serializer.validated_data['recipient_ids']) > getattr(settings, 'CHAT_BROADCAST', {}).get('SYNC_LIMIT', 100):
+            serializer.save(sender=request.user)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+        # held by this request, so a worker only picks it up if the request dies half-way
+        lease = timedelta(minutes=5)
+        instance = serializer.save(sender=request.user, status=Broadcast.RUNNING, locked_until=timezone.now() + lease)
+        for _ in broadcast.run_broadcast(instance, lease=lease):
+            pass
+        return Response(self.get_serializer(instance).data, status=status.HTTP_201_CREATED)
+
+
+class MetricsView(APIView):
+    """
+    Staff-only per-worker counters: request coalescing per action (see `chat.coalescing`)
+    and the group-commit writer (see `chat.writer`).
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request: HttpRequest) -> Response:
+        return Response({
+            'coalescing': single_flight.stats(),
+            'group_commit': {'groups': message_writer.groups, 'written': message_writer.written},
+        })
+
+
+class ContactsView(APIView):
+    """
+    The people the caller has live threads with, most recent interaction first (`?limit=` / `?offset=`).
+
+    Served from the caller's cached adjacency list (see `chat.contacts`), so the cost doesn't grow with
+    the number of threads: one cache lookup, one indexed query for the deactivated contacts (left out
+    before paginating, so pages and `count` stay exact) and one for the profiles on the requested page.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = LimitOffsetPagination
+
+    def get(self, request: HttpRequest) -> Response:
+        User = get_user_model()
+        adjacency = contacts.get_contacts(request.user.pk)
+        inactive = set(User.objects.filter(pk__in=adjacency, is_active=False).values_list('pk', flat=True))
+        ordered = sorted(
+            ((user_id, at) for user_id, at in adjacency.items() if user_id not in inactive),
+            key=lambda item: (item[1], item[0]),
+            reverse=True,
+        )
+
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(ordered, request, view=self)
+        users = {
+            user['id']: user
+            for user in User.objects.filter(pk__in=[user_id for user_id, _ in page])
+            .values('id', 'email', 'username', 'first_name', 'last_name', 'avatar')
+        }
+        results = [{**users[user_id], 'last_interaction': at} for user_id, at in page if user_id in users]
+        return paginator.get_paginated_response(ContactSerializer(results, many=True).data)
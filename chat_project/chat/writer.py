@@ -0,0 +1,165 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import outbox
+from .models import Message
+from .recent import recent_messages
+from .serializers import MessageSerializer
+from .sharding import shard_for_thread
+
+__all__ = (
+    "GroupCommitWriter",
+    "SendTimedOut",
+    "SendOutcomeUnknown",
+    "message_writer",
+)
+
+
+def _config() -> dict:
+    return getattr(settings, 'CHAT_GROUP_COMMIT', {})
+
+
+class SendTimedOut(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The message could not be sent in time. It was not saved; retry the request."
+    default_code = 'send_timed_out'
+
+
+class SendOutcomeUnknown(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The message is still being saved and may appear shortly. Check the thread before resending it."
+    default_code = 'send_outcome_unknown'
+    outcome_unknown = True  # see `IdempotencyMixin`
+
+    def __init__(self, future: Future):
+        super().__init__()
+        self.future = future  # settles with the saved message, or the insert's error
+
+
+class GroupCommitWriter:
+    """
+    Per-worker single writer for message sends (opt-in, `CHAT_GROUP_COMMIT['ENABLED']`).
+
+    Callers hand a message to `submit` and block until it is committed. The writer thread collects
+    sends for up to `MAX_WAIT_MS` or `MAX_BATCH` messages and writes each shard's share of the group
+    in one transaction (`bulk_create` plus the outbox events), so a burst of sends costs one commit
+    (and fsync) per group instead of one per message, and concurrent senders no longer fight over
+    SQLite's write lock. If a group fails, its messages are retried one by one, so only the bad ones fail.
+
+    Bulk inserts send no `post_save`: the writer does what the message signals would (thread's
+    `last_message_at`, recent-message buffers) itself.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue: queue.Queue[Optional[tuple[Message, Future]]] = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self.groups = 0  # commits made, for monitoring
+        self.written = 0
+
+    @property
+    def enabled(self) -> bool:
+        return _config().get('ENABLED', False)
+
+    def submit(self, message: Message) -> Message:
+        """
+        Queue an unsaved message and wait until it is committed; raises what the insert raised.
+
+        After `TIMEOUT` seconds a message the writer hasn't picked up yet is withdrawn (`SendTimedOut`);
+        one it is already writing may still commit, so the caller can only be told so (`SendOutcomeUnknown`).
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._queue = queue.Queue()  # a stopped writer may still be draining the previous one
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name='chat-group-commit', daemon=True
+                )
+                self._thread.start()
+            self._queue.put((message, future))
+        try:
+            return future.result(timeout=_config().get('TIMEOUT', 30))
+        except FutureTimeoutError:
+            if future.cancel():
+                raise SendTimedOut()
+            if not future.done():
+                raise SendOutcomeUnknown(future)
+            return future.result()  # finished just now
+
+    def _collect(self, pending: queue.Queue, first: tuple[Message, Future]) -> list[tuple[Message, Future]]:
+        group = [first]
+        deadline = time.monotonic() + _config().get('MAX_WAIT_MS', 5) / 1000
+        while len(group) < _config().get('MAX_BATCH', 64):
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = pending.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:  # stop: commit what was collected first
+                pending.put(None)
+                break
+            group.append(item)
+        return group
+
+    def _run(self, pending: queue.Queue) -> None:
+        try:
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                by_shard: dict[str, list[tuple[Message, Future]]] = {}
+                for message, future in self._collect(pending, item):
+                    if not future.set_running_or_notify_cancel():
+                        continue  # withdrawn by a sender that timed out
+                    by_shard.setdefault(shard_for_thread(message.thread_id), []).append((message, future))
+                for alias, items in by_shard.items():
+                    self._commit(alias, items)
+        finally:
+            connections.close_all()  # the writer thread's own connections
+
+    def _commit(self, alias: str, items: list[tuple[Message, Future]]) -> None:
+        try:
+            self._write(alias, [message for message, _ in items])
+        except Exception:
+            for message, future in items:
+                try:
+                    self._write(alias, [message])
+                except Exception as error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(message)
+        else:
+            for message, future in items:
+                future.set_result(message)
+
+    def _write(self, alias: str, messages: list[Message]) -> None:
+        with transaction.atomic(using=alias):
+            Message.objects.using(alias).bulk_create(messages)
+            outbox.enqueue(messages)
+        self.groups += 1
+        self.written += len(messages)
+        for message in messages:
+            recent_messages.append(message.thread_id, dict(MessageSerializer(message).data))
+
+    def stop(self) -> None:
+        """
+        Commit what is queued and stop the writer thread (it starts again on the next `submit`).
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+
+message_writer = GroupCommitWriter()
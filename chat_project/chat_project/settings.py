@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -33,6 +34,10 @@ AUTH_USER_MODEL = 'user.User'
 
 # Application definition
 
+# `rest_framework.authtoken` and `djoser` are not on the API's request path (auth is JWT, djoser's views
+# are not routed) but cost every worker their imports; DJANGO_LEAN_APPS=1 leaves them out.
+LEAN_APPS = os.getenv('DJANGO_LEAN_APPS', '0') == '1'
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -43,8 +48,7 @@ INSTALLED_APPS = [
 
     # 3th party app
     'rest_framework',
-    'rest_framework.authtoken',
-    'djoser',
+    *([] if LEAN_APPS else ['rest_framework.authtoken', 'djoser']),
 
     # app
     'authentication',
@@ -54,6 +58,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'chat.middleware.LoadSheddingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -86,14 +91,66 @@ WSGI_APPLICATION = 'chat_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Opt-in SQLite tuning for production-like deployments (SQLITE_PERFORMANCE_PROFILE=1).
+# The PRAGMAs are applied on every new connection by `chat.db.apply_sqlite_profile`,
+# and write transactions are started as `BEGIN IMMEDIATE` to avoid lock-upgrade deadlocks.
+SQLITE_PERFORMANCE_PROFILE = os.getenv('SQLITE_PERFORMANCE_PROFILE', '0') == '1'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,  # ms
+}
+
+# Transactions are opened per view action (see `chat.mixins.TransactionPolicyMixin`):
+# reads run in autocommit, writes are atomic.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-        "ATOMIC_REQUESTS": True,
+        "ATOMIC_REQUESTS": False,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'} if SQLITE_PERFORMANCE_PROFILE else {},
+    }
+}
+
+# Messages are spread over these aliases by a stable hash of the thread id (see chat/routers.py).
+# CHAT_SHARDS=N adds N-1 local SQLite shard files next to db.sqlite3 for testing; set up every
+# shard with `python manage.py migrate --database <alias>`.
+CHAT_MESSAGE_SHARDS = ['default']
+for _shard in range(1, int(os.getenv('CHAT_SHARDS', '1'))):
+    DATABASES[f'shard_{_shard}'] = {**DATABASES['default'], 'NAME': BASE_DIR / f'db_shard_{_shard}.sqlite3'}
+    CHAT_MESSAGE_SHARDS.append(f'shard_{_shard}')
+CHAT_MESSAGE_ID_BLOCK = 1000  # ids reserved per round-trip once messages are sharded
+
+DATABASE_ROUTERS = ['chat.routers.MessageShardRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory per worker; use 'django.core.cache.backends.filebased.FileBasedCache'
+# (LOCATION = a directory) to share entries between workers on one host.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'chat',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
     }
 }
 
+# Serialized ThreadSerializer output per thread (see chat/cache.py).
+CHAT_THREAD_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 3600,  # seconds
+}
+
+# Per-user conversation partners for `GET /api/chat/contacts/` (see chat/contacts.py), kept in a Django cache
+# (evicted by its MAX_ENTRIES) and patched in place as threads and messages are created.
+CHAT_CONTACTS = {
+    'CACHE': 'default',
+    'TIMEOUT': 3600,  # seconds
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -138,7 +195,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.backends.RevocationAwareJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -147,6 +204,140 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+# Message bodies of THRESHOLD bytes or more are stored compressed (see chat/fields.py);
+# existing rows are converted by `python manage.py compress_messages`. THRESHOLD = None disables it.
+# 'zstd' needs the optional `zstandard` package and falls back to zlib without it.
+CHAT_MESSAGE_COMPRESSION = {
+    'THRESHOLD': 2048,  # bytes
+    'ALGORITHM': 'zlib',
+    'LEVEL': 6,
+}
+
+# Transactional outbox for new messages, drained by `python manage.py dispatch_outbox`.
+# Each handler is called as `handler(recipient_id, messages)` once per recipient and batch.
+CHAT_OUTBOX_HANDLERS = [
+    'chat.outbox.log_delivery',
+]
+CHAT_OUTBOX_MAX_ATTEMPTS = 8
+CHAT_OUTBOX_RETRY_BACKOFF = 2  # seconds, doubled on every failed attempt
+
+# Message retention, applied by `python manage.py apply_retention` (see chat/retention.py), e.g.
+# {'RULE': 'chat.retention.MaxAgeRule', 'OPTIONS': {'days': 365}} or
+# {'RULE': 'chat.retention.MaxMessagesPerThreadRule', 'OPTIONS': {'limit': 10_000}}.
+CHAT_RETENTION_RULES = []
+
+# User lookup (`/api/users/lookup/`, see user/directory.py). TRIGRAM (PostgreSQL only, applied by the
+# `user` migrations) switches database lookups to infix matching backed by pg_trgm indexes.
+USER_DIRECTORY = {
+    'WARM_INDEX': True,
+    'MAX_INDEXED_USERS': 200_000,
+    'REFRESH_SECONDS': 300,
+    'MAX_RESULTS': 20,
+    'TRIGRAM': False,
+}
+
+# Process-local / shared ephemeral state (throttle buckets, ...), see chat/stores.py.
+# Use {'BACKEND': 'chat.stores.CacheStore', 'OPTIONS': {'alias': 'default'}} to share it between workers.
+CHAT_EPHEMERAL_STORES = {
+    'default': {'BACKEND': 'chat.stores.MemoryStore'},
+}
+
+# Online / typing state (see chat/presence.py), kept in the 'presence' ephemeral store (falls back to 'default').
+CHAT_PRESENCE = {
+    'ONLINE_TTL': 60,  # seconds since the last request
+    'TYPING_TTL': 6,  # seconds
+}
+
+# Token-bucket rates per `<basename>.<action>` for the chat viewsets (see chat/throttling.py).
+CHAT_THROTTLE_RATES = {
+    'default': '120/min',
+    'message.create': '30/min',
+    'message.unread': '60/min',
+    'thread.user_threads': '60/min',
+}
+
+# Per-worker ring buffers of the newest SIZE serialized messages of up to MAX_THREADS hot threads
+# (see chat/recent.py); their per-thread generation counters live in the CACHE alias, which must be
+# shared between workers for writes made by one worker to reach the others.
+CHAT_RECENT_MESSAGES = {
+    'SIZE': 50,
+    'MAX_THREADS': 10_000,
+    'MAX_AGE': 60,  # seconds before a buffer is refilled regardless
+    # must be shared by all workers: with a process-local cache (LocMemCache) the buffer stays off
+    # unless SINGLE_PROCESS is set
+    'CACHE': 'default',
+    'SINGLE_PROCESS': os.getenv('CHAT_SINGLE_PROCESS', '0') == '1',
+}
+
+# Upper bound on the sub-requests of one `POST /api/chat/batch/` call (see chat/batch.py).
+CHAT_BATCH_MAX_REQUESTS = 20
+
+# Identical concurrent polls (`unread`, `user_threads`) share one execution per worker (see chat/coalescing.py);
+# a waiter runs the action itself after TIMEOUT seconds. Collapse ratios: `GET /api/chat/metrics/` (staff).
+CHAT_COALESCING = {
+    'ENABLED': True,
+    'TIMEOUT': 10,
+}
+
+# Opt-in group commit for message sends (see chat/writer.py): one writer thread per worker commits the sends
+# that arrive within MAX_WAIT_MS (up to MAX_BATCH) together; senders wait up to TIMEOUT seconds.
+CHAT_GROUP_COMMIT = {
+    'ENABLED': os.getenv('CHAT_GROUP_COMMIT', '0') == '1',
+    'MAX_BATCH': 64,
+    'MAX_WAIT_MS': 5,
+    'TIMEOUT': 30,
+}
+
+# `Idempotency-Key` support on thread / message create (see chat/idempotency.py): responses are kept for TTL
+# seconds in the key table, and for FRONT_CACHE_TTL seconds in the 'idempotency' ephemeral store.
+CHAT_IDEMPOTENCY = {
+    'TTL': 24 * 3600,
+    'FRONT_CACHE_TTL': 600,
+}
+
+# Staff broadcasts (`POST /api/chat/broadcasts/`, see chat/broadcast.py): audiences up to SYNC_LIMIT are sent
+# within the request, larger ones by `manage.py send_broadcasts`, CHUNK_SIZE recipients per transaction.
+CHAT_BROADCAST = {
+    'SYNC_LIMIT': 100,
+    'CHUNK_SIZE': 500,
+    'MAX_RECIPIENTS': 100_000,
+}
+
+# Global backpressure for /api/ requests (see chat/middleware.py); `None` disables a limit.
+# MAX_IN_FLIGHT counts concurrent requests per process: it needs threaded or async workers, sync
+# workers never exceed 1 (bound their queue with the server's backlog instead).
+CHAT_LOAD_SHEDDING = {
+    'MAX_IN_FLIGHT': 64,
+    'MAX_DB_LATENCY_MS': 500,
+    'DB_LATENCY_HALF_LIFE': 5.0,  # seconds
+    'RETRY_AFTER': 1,  # seconds
+}
+
+# JWT revocation by `jti` (`POST /api/auth/token/revoke/`, see authentication/revocation.py). Each worker
+# keeps a bloom filter of revoked jtis, refreshed incrementally; revocations made by other workers apply
+# within REFRESH_SECONDS. Rows of expired tokens are deleted in the background, PRUNE_CHUNK_SIZE at a time,
+# on every scheduled rebuild (also on demand: `python manage.py prune_revoked_tokens`).
+TOKEN_REVOCATION = {
+    'REFRESH_SECONDS': 5,
+    'REBUILD_SECONDS': 3600,
+    'CAPACITY': 100_000,  # filter size; it is rebuilt larger when outgrown
+    'ERROR_RATE': 0.001,  # share of unrevoked tokens that need a DB lookup
+    'PRUNE_CHUNK_SIZE': 1000,
+}
+
+# Operational messages of the project itself (e.g. the pre-fork warm-up report, see chat_project/wsgi.py)
+# go to stderr; Django's own loggers keep their defaults.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'stderr': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'chat_project': {'handlers': ['stderr'], 'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO')},
+    },
+}
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -180,8 +371,8 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
-    "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
+    "TOKEN_REFRESH_SERIALIZER": "authentication.serializers.RevocationAwareTokenRefreshSerializer",
+    "TOKEN_VERIFY_SERIALIZER": "authentication.serializers.RevocationAwareTokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
@@ -22,4 +22,5 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('authentication.urls')),
     path('api/chat/', include('chat.urls')),
+    path('api/users/', include('user.urls')),
 ]
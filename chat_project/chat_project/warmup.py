@@ -0,0 +1,211 @@
+"""
+Startup profiling and pre-fork warm-up.
+
+`setup_with_timings()` replaces `django.setup()` and records, per installed app, how long its module
+import, its models import and its `ready()` took. `warm_up()` then does the work the first requests of
+every worker would otherwise pay for: URL resolver, serializer and JWT machinery, database driver and
+per-worker in-memory indexes. Run in the parent before forking, the result is shared by every worker.
+
+python -m chat_project.warmup              # report only
+python -m chat_project.warmup --skip-db    # without touching the database
+
+With `DJANGO_PREFORK_WARMUP=1`, `chat_project.wsgi` does both when it is loaded, so a pre-forking
+server that loads the app in its master (`gunicorn --preload chat_project.wsgi`) forks warm workers.
+"""
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from importlib import import_module
+from typing import Callable
+
+__all__ = (
+    "AppTiming",
+    "setup_with_timings",
+    "warm_up",
+    "format_report",
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AppTiming:
+    label: str
+    import_ms: float = 0.0
+    models_ms: float = 0.0
+    ready_ms: float = 0.0
+
+    @property
+    def total_ms(self) -> float:
+        return self.import_ms + self.models_ms + self.ready_ms
+
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def setup_with_timings() -> list[AppTiming]:
+    """
+    `django.setup()`, timed per app. Dependencies shared by several apps are counted for the first
+    app that imports them. Returns an empty list when Django is already set up.
+    """
+    import django
+    from django.apps import AppConfig, apps
+    from django.conf import settings
+
+    if apps.ready:
+        return []
+
+    import_ms = {}
+    for entry in settings.INSTALLED_APPS:
+        start = time.perf_counter()
+        import_module(entry)
+        import_ms[entry] = _elapsed_ms(start)
+
+    timings: dict[str, AppTiming] = defaultdict(lambda: AppTiming(label=''))
+
+    def timed(app_config: AppConfig, phase: str, func: Callable[[], None]) -> Callable[[], None]:
+        def wrapper() -> None:
+            start = time.perf_counter()
+            try:
+                func()
+            finally:
+                timing = timings[app_config.name]
+                setattr(timing, phase, getattr(timing, phase) + _elapsed_ms(start))
+        return wrapper
+
+    # `populate` imports every app's models before calling any `ready()`, so `ready` can be wrapped here
+    import_models = AppConfig.import_models
+
+    def timed_import_models(app_config: AppConfig) -> None:
+        timed(app_config, 'models_ms', lambda: import_models(app_config))()
+        app_config.ready = timed(app_config, 'ready_ms', app_config.ready)
+
+    AppConfig.import_models = timed_import_models
+    try:
+        django.setup()
+    finally:
+        AppConfig.import_models = import_models
+        for app_config in apps.get_app_configs():
+            app_config.__dict__.pop('ready', None)
+
+    result = []
+    for app_config in apps.get_app_configs():
+        # INSTALLED_APPS names either the app module or its AppConfig class
+        config_path = f'{type(app_config).__module__}.{type(app_config).__qualname__}'
+        timing = timings[app_config.name]
+        timing.label = app_config.name
+        timing.import_ms = import_ms.get(app_config.name, import_ms.get(config_path, 0.0))
+        result.append(timing)
+    return result
+
+
+def _warm_urls() -> None:
+    from django.urls import get_resolver, resolve
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # noqa: B018  (populates the reverse lookup tables)
+    resolve('/api/chat/threads/')
+
+
+def _warm_serializers() -> None:
+    from rest_framework import serializers
+
+    from authentication import serializers as authentication_serializers
+    from chat import serializers as chat_serializers
+    from user import serializers as user_serializers
+
+    for module in (chat_serializers, user_serializers, authentication_serializers):
+        for value in vars(module).values():
+            if isinstance(value, type) and issubclass(value, serializers.Serializer) and value.__module__ == module.__name__:
+                value().fields  # noqa: B018  (fills the model metadata caches the field mapping uses)
+
+
+def _warm_authentication() -> None:
+    from rest_framework.settings import api_settings as drf_settings
+    from rest_framework_simplejwt.settings import api_settings as jwt_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    for name in ('DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_PAGINATION_CLASS',
+                 'DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES'):
+        getattr(drf_settings, name)
+    for name in ('AUTH_TOKEN_CLASSES', 'TOKEN_USER_CLASS', 'USER_AUTHENTICATION_RULE'):
+        getattr(jwt_settings, name)
+    # the first sign/verify imports the crypto backends
+    token = AccessToken()
+    AccessToken(str(token))
+
+
+def _warm_database() -> None:
+    from django.conf import settings
+    from django.db import connections
+
+    for alias in connections:
+        connection = connections[alias]
+        connection.ensure_connection()
+        connection.features.can_return_rows_from_bulk_insert  # noqa: B018
+        connection.get_database_version()
+
+    from authentication.revocation import revocation_list
+    from user.directory import directory_index
+
+    revocation_list.ensure_current()
+    if getattr(settings, 'USER_DIRECTORY', {}).get('WARM_INDEX', True):
+        directory_index.ensure_built()
+
+
+def warm_up(database: bool = True) -> dict[str, float]:
+    """
+    Run every warm-up step and return how long each took (ms).
+
+    Database connections are opened to load the driver and backend metadata, then closed again:
+    a connection must never be shared by forked processes, so workers open their own on first use.
+    """
+    from django.db import connections
+
+    steps = {
+        'urls': _warm_urls,
+        'serializers': _warm_serializers,
+        'authentication': _warm_authentication,
+    }
+    if database:
+        steps['database'] = _warm_database
+
+    durations = {}
+    try:
+        for name, step in steps.items():
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception:
+                logger.exception("Warm-up step %r failed", name)  # a cold worker is still a working worker
+            durations[name] = _elapsed_ms(start)
+    finally:
+        connections.close_all()
+    return durations
+
+
+def format_report(timings: list[AppTiming], durations: dict[str, float]) -> str:
+    lines = [f"{'app':<40}{'import':>10}{'models':>10}{'ready':>10}{'total':>10}  (ms)"]
+    for timing in sorted(timings, key=lambda timing: timing.total_ms, reverse=True):
+        lines.append(
+            f"{timing.label:<40}{timing.import_ms:>10.1f}{timing.models_ms:>10.1f}"
+            f"{timing.ready_ms:>10.1f}{timing.total_ms:>10.1f}"
+        )
+    for name, duration in durations.items():
+        lines.append(f"{'warm-up: ' + name:<70}{duration:>10.1f}")
+    return '\n'.join(lines)
+
+
+def main(argv: list[str]) -> None:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chat_project.settings')
+    timings = setup_with_timings()
+    durations = warm_up(database='--skip-db' not in argv)
+    print(format_report(timings, durations))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -7,10 +7,18 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 """
 
+import logging
 import os
 
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'chat_project.settings')
 
+if os.getenv('DJANGO_PREFORK_WARMUP', '0') == '1':
+    # load with the server's preload option so this runs once in the master, before workers are forked
+    from chat_project.warmup import format_report, setup_with_timings, warm_up
+
+    timings = setup_with_timings()
+    logging.getLogger(__name__).info("Pre-fork warm-up:\n%s", format_report(timings, warm_up()))
+
 application = get_wsgi_application()
@@ -0,0 +1,23 @@
+import pytest
+from django.core.cache import caches
+
+from authentication.revocation import revocation_list
+from chat.coalescing import single_flight
+from chat.recent import recent_messages
+from chat.stores import reset_stores
+from chat.writer import message_writer
+
+
+@pytest.fixture(autouse=True)
+def reset_ephemeral_state():
+    """
+    Process-local state (throttle buckets, caches, ...) outlives the test database, so drop it after every test.
+    """
+    yield
+    message_writer.stop()
+    reset_stores()
+    revocation_list.clear()
+    recent_messages.clear()
+    single_flight.clear()
+    for cache in caches.all():
+        cache.clear()
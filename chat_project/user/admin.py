@@ -7,4 +7,6 @@ User = get_user_model()
 class UserAdmin(admin.ModelAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_active', 'is_staff')
     list_filter = ('is_active', 'is_staff')
+    # prefix search (index-friendly), also used by the thread participants autocomplete
+    search_fields = ('^email', '^username')
 
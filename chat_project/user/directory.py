@@ -0,0 +1,167 @@
+import bisect
+import threading
+import time
+from typing import Any, Optional
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+__all__ = (
+    "LOOKUP_FIELDS",
+    "search_users",
+    "directory_index",
+)
+
+LOOKUP_FIELDS = ('email', 'username', 'first_name', 'last_name')
+RESULT_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name', 'avatar')
+
+
+def _config() -> dict:
+    return getattr(settings, 'USER_DIRECTORY', {})
+
+
+def _prefix_condition(lookup: str, prefix: str, vendor: str) -> Q:
+    """
+    Match `LOWER(<field>)` by prefix in a way the lookup indexes can serve:
+    a range scan on SQLite (its LIKE optimization doesn't apply to expression indexes),
+    `LIKE 'prefix%'` elsewhere (PostgreSQL uses the `varchar_pattern_ops` indexes).
+    """
+    if vendor == 'sqlite':
+        return Q(**{f'{lookup}__gte': prefix, f'{lookup}__lt': prefix + '\U0010ffff'})
+    return Q(**{f'{lookup}__startswith': prefix})
+
+
+def search_users_db(query: str, limit: int, using: str = 'default') -> list[dict[str, Any]]:
+    """
+    Indexed lookup of active users whose email, username, first or last name starts with `query`.
+    With `USER_DIRECTORY['TRIGRAM']` on PostgreSQL, infix matches are served by the trigram indexes.
+
+    One `UNION` branch per field lets every branch use its own partial index; an `OR` of the four
+    conditions makes SQLite fall back to a full table scan.
+    """
+    User = get_user_model()
+    vendor = connections[using].vendor
+    trigram = vendor == 'postgresql' and _config().get('TRIGRAM', False)
+
+    active_users = User.objects.using(using).filter(is_active=True)
+    branches = []
+    for field in LOOKUP_FIELDS:
+        condition = Q(lookup_key__contains=query) if trigram else _prefix_condition('lookup_key', query, vendor)
+        branches.append(active_users.annotate(lookup_key=Lower(field)).filter(condition).values(*RESULT_FIELDS))
+
+    users = list(branches[0].union(*branches[1:])[:limit])
+    return sorted(users, key=lambda user: user['email'].lower())
+
+
+class PrefixIndex:
+    """
+    Warm in-memory prefix index over the active users of this worker.
+
+    Keys are the lowercased lookup fields kept in one sorted list, so a prefix query is a bisect plus
+    a short forward scan. The index is kept current by `user.signals` for writes made by this worker
+    and rebuilt after `REFRESH_SECONDS` to pick up writes made elsewhere. It is not built at all
+    when there are more than `MAX_INDEXED_USERS` active users; lookups then go to the database.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys: list[tuple[str, int]] = []
+        self._users: dict[int, dict[str, Any]] = {}
+        self._built_at: Optional[float] = None
+        self._disabled_until = 0.0
+
+    def _user_keys(self, user: dict[str, Any]) -> set[tuple[str, int]]:
+        return {(user[field].lower(), user['id']) for field in LOOKUP_FIELDS if user.get(field)}
+
+    def is_fresh(self) -> bool:
+        return self._built_at is not None and time.monotonic() - self._built_at < _config().get('REFRESH_SECONDS', 300)
+
+    def build(self) -> bool:
+        """
+        (Re)build the index; returns False when the active-user set is too large to keep in memory.
+        """
+        User = get_user_model()
+        max_users = _config().get('MAX_INDEXED_USERS', 200_000)
+        users = list(User.objects.filter(is_active=True).values(*RESULT_FIELDS)[:max_users + 1])
+        if len(users) > max_users:
+            with self._lock:
+                self.clear()
+                self._disabled_until = time.monotonic() + _config().get('REFRESH_SECONDS', 300)
+            return False
+
+        keys = sorted(key for user in users for key in self._user_keys(user))
+        with self._lock:
+            self._keys = keys
+            self._users = {user['id']: user for user in users}
+            self._built_at = time.monotonic()
+        return True
+
+    def ensure_built(self) -> bool:
+        if self.is_fresh():
+            return True
+        if time.monotonic() < self._disabled_until:
+            return False
+        # only one thread rebuilds; the others keep serving the previous index if there is one
+        if not self._lock.acquire(blocking=self._built_at is None):
+            return True
+        try:
+            return self.is_fresh() or self.build()
+        finally:
+            self._lock.release()
+
+    def search(self, query: str, limit: int) -> list[dict[str, Any]]:
+        with self._lock:
+            results: dict[int, dict[str, Any]] = {}
+            position = bisect.bisect_left(self._keys, (query,))
+            while position < len(self._keys) and len(results) < limit:
+                key, user_id = self._keys[position]
+                if not key.startswith(query):
+                    break
+                results.setdefault(user_id, self._users[user_id])
+                position += 1
+            return list(results.values())
+
+    def update(self, user) -> None:
+        with self._lock:
+            if self._built_at is None:
+                return
+            self.remove(user.pk)
+            if user.is_active:
+                row = {field: getattr(user, field) for field in RESULT_FIELDS}
+                self._users[user.pk] = row
+                for key in self._user_keys(row):
+                    bisect.insort(self._keys, key)
+
+    def remove(self, user_id: int) -> None:
+        with self._lock:
+            row = self._users.pop(user_id, None)
+            if row is None:
+                return
+            for key in self._user_keys(row):
+                position = bisect.bisect_left(self._keys, key)
+                if position < len(self._keys) and self._keys[position] == key:
+                    del self._keys[position]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._keys, self._users, self._built_at = [], {}, None
+
+
+directory_index = PrefixIndex()
+
+
+def search_users(query: str, limit: Optional[int] = None) -> list[dict[str, Any]]:
+    """
+    Look up active users by prefix, from the warm index when available, else from the database.
+    """
+    query = query.strip().lower()
+    max_results = _config().get('MAX_RESULTS', 20)
+    limit = max(1, min(limit or max_results, max_results))
+    if not query:
+        return []
+
+    if _config().get('WARM_INDEX', True) and directory_index.ensure_built():
+        return directory_index.search(query, limit)
+    return search_users_db(query, limit)
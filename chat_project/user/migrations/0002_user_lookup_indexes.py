@@ -0,0 +1,67 @@
+# Generated by Django 5.1.1 on 2026-10-19 02:35
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+LOOKUP_COLUMNS = ('email', 'username', 'first_name', 'last_name')
+
+
+def create_postgresql_indexes(apps, schema_editor):
+    """
+    On PostgreSQL, `LOWER(col) LIKE 'prefix%'` needs `varchar_pattern_ops` unless the database uses
+    the C collation; the trigram indexes back infix search when `USER_DIRECTORY['TRIGRAM']` is on.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    trigram = getattr(settings, 'USER_DIRECTORY', {}).get('TRIGRAM', False)
+    if trigram:
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in LOOKUP_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS user_active_{column}_pattern_idx ON user_user '
+            f'(LOWER({column}) varchar_pattern_ops) WHERE is_active'
+        )
+        if trigram:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS user_active_{column}_trgm_idx ON user_user '
+                f'USING gin (LOWER({column}) gin_trgm_ops) WHERE is_active'
+            )
+
+
+def drop_postgresql_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    for column in LOOKUP_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS user_active_{column}_pattern_idx')
+        schema_editor.execute(f'DROP INDEX IF EXISTS user_active_{column}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), condition=models.Q(('is_active', True)), name='user_active_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('username'), condition=models.Q(('is_active', True)), name='user_active_username_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), condition=models.Q(('is_active', True)), name='user_active_first_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), condition=models.Q(('is_active', True)), name='user_active_last_lower_idx'),
+        ),
+        migrations.RunPython(create_postgresql_indexes, drop_postgresql_indexes),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, UserManager
 from django.utils.translation import gettext_lazy as _
 
@@ -32,6 +34,13 @@ class User(AbstractBaseUser, PermissionsMixin):
     class Meta:
         verbose_name = _("User")
         verbose_name_plural = _("Users")
+        # prefix lookup (see user/directory.py): partial indexes only cover active users
+        indexes = [
+            models.Index(Lower('email'), condition=Q(is_active=True), name='user_active_email_lower_idx'),
+            models.Index(Lower('username'), condition=Q(is_active=True), name='user_active_username_lower_idx'),
+            models.Index(Lower('first_name'), condition=Q(is_active=True), name='user_active_first_lower_idx'),
+            models.Index(Lower('last_name'), condition=Q(is_active=True), name='user_active_last_lower_idx'),
+        ]
 
     objects = UserManager()
     EMAIL_FIELD = "email"
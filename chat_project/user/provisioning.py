@@ -0,0 +1,163 @@
+import csv
+import json
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Iterable, Iterator, Optional, TextIO
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+
+__all__ = (
+    "IMPORT_FIELDS",
+    "read_rows",
+    "import_users",
+    "ImportProgress",
+)
+
+IMPORT_FIELDS = ('email', 'username', 'password', 'first_name', 'last_name', 'avatar')
+
+# (line or record number, row)
+Row = tuple[int, dict[str, Any]]
+
+
+def read_rows(stream: TextIO, format: str) -> Iterator[Row]:
+    """
+    Stream rows from CSV (with a header line) or JSONL (one object per line) without loading the file.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif format == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                yield number, json.loads(line)
+    else:
+        raise ValueError(f"Unknown format {format!r}, expected 'csv' or 'jsonl'")
+
+
+@dataclass
+class ImportProgress:
+    read: int = 0
+    created: int = 0
+    skipped: int = 0  # email or username already taken (in the database or earlier in the file)
+    invalid: int = 0
+
+
+def setup_worker() -> None:
+    """
+    Pool initializer: spawned (not forked) hashing processes need Django's settings for the hashers.
+    """
+    django.setup()
+
+
+def _hash_passwords(passwords: list[Optional[str]], executor: Optional[Executor]) -> list[str]:
+    """
+    Hash with the configured hasher, across `executor`'s processes when given. Rows without a
+    password get an unusable one, as `create_user(password=None)` does.
+    """
+    if executor is None:
+        return [make_password(password or None) for password in passwords]
+    hashed = iter(executor.map(make_password, [password for password in passwords if password], chunksize=16))
+    return [next(hashed) if password else make_password(None) for password in passwords]
+
+
+def _text(value: Any) -> str:
+    """
+    A field's value as text: JSONL numbers are taken as written, objects, lists and booleans are rejected.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f"Expected a string, got {type(value).__name__}")
+    return str(value)
+
+
+def _clean(row: dict[str, Any]) -> Optional[dict[str, Any]]:
+    User = get_user_model()
+    try:
+        raw = {field: _text(row.get(field)) for field in IMPORT_FIELDS}
+    except ValueError:
+        return None
+    data = {field: value.strip() or None for field, value in raw.items()}
+    if data['password'] is not None:
+        data['password'] = raw['password']  # passwords are taken verbatim
+    if not data['email'] or not data['username']:
+        return None
+    try:
+        validate_email(data['email'])
+    except ValidationError:
+        return None
+    data['email'] = User.objects.normalize_email(data['email'])
+    data['username'] = User.normalize_username(data['username'])
+    return data
+
+
+def import_users(
+    rows: Iterable[Row],
+    batch_size: int = 1000,
+    executor: Optional[Executor] = None,
+    on_invalid=None,
+) -> Iterator[ImportProgress]:
+    """
+    Create users from `rows` batch by batch and yield the running totals after every batch.
+
+    Per batch: one query finds the emails and usernames that are already taken, the passwords of
+    the remaining rows are hashed (in parallel with a process pool `executor`), and the new users are
+    inserted with one `bulk_create` that skips rows taken in the meantime (e.g. by a concurrent import);
+    those count as skipped. Bulk inserts send no `post_save`, so callers refresh whatever follows user
+    saves (e.g. the directory index) afterwards. `on_invalid(number, row)` is called for rows without
+    a valid email or a username, or with values that aren't text.
+    """
+    User = get_user_model()
+    progress = ImportProgress()
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        progress.read += len(batch)
+        cleaned = []
+        for number, row in batch:
+            data = _clean(row)
+            if data is None:
+                progress.invalid += 1
+                if on_invalid is not None:
+                    on_invalid(number, row)
+            else:
+                cleaned.append(data)
+
+        taken = User.objects.filter(
+            Q(email__in={data['email'] for data in cleaned}) | Q(username__in={data['username'] for data in cleaned})
+        ).values_list('email', 'username')
+        emails, usernames = set(), set()
+        for email, username in taken:
+            emails.add(email)
+            usernames.add(username)
+
+        new = []
+        for data in cleaned:
+            if data['email'] in emails or data['username'] in usernames:
+                progress.skipped += 1
+                continue
+            emails.add(data['email'])
+            usernames.add(data['username'])
+            new.append(data)
+
+        passwords = _hash_passwords([data.pop('password') for data in new], executor)
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(password=password, **data) for data, password in zip(new, passwords)], ignore_conflicts=True
+            )
+            # ignored rows return no error; salted hashes tell which rows are ours
+            ours = {(data['email'], password) for data, password in zip(new, passwords)}
+            inserted = sum(
+                row in ours
+                for row in User.objects.filter(email__in=[data['email'] for data in new]).values_list('email', 'password')
+            )
+        progress.created += inserted
+        progress.skipped += len(new) - inserted
+        yield progress
@@ -0,0 +1,14 @@
+from rest_framework import serializers
+
+__all__ = (
+    "UserLookupSerializer",
+)
+
+
+class UserLookupSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    email = serializers.EmailField()
+    username = serializers.CharField()
+    first_name = serializers.CharField(allow_null=True)
+    last_name = serializers.CharField(allow_null=True)
+    avatar = serializers.URLField(allow_null=True)
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .directory import directory_index
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User, dispatch_uid='user.directory_user_saved')
+def update_directory_index(sender, instance, **kwargs) -> None:
+    directory_index.update(instance)
+
+
+@receiver(post_delete, sender=User, dispatch_uid='user.directory_user_deleted')
+def remove_from_directory_index(sender, instance, **kwargs) -> None:
+    directory_index.remove(instance.pk)
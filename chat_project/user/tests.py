@@ -1,3 +1,136 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+import pytest
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from user import provisioning
+from user.directory import directory_index, search_users, search_users_db
+from user.provisioning import import_users
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def reset_directory_index():
+    directory_index.clear()
+    yield
+    directory_index.clear()
+
+
+def create_users():
+    User.objects.create_user(email="john@example.com", password="password123", username="johnny", first_name="John")
+    User.objects.create_user(email="jane@example.com", password="password123", username="jane", last_name="Johnson")
+    User.objects.create_user(email="bob@example.com", password="password123", username="bob")
+    User.objects.create_user(email="joker@example.com", password="password123", username="joker", is_active=False)
+
+
+@pytest.mark.django_db
+def test_lookup_matches_prefix_of_any_field_and_skips_inactive_users():
+    """
+    Lookup test #1: prefix matching on email, username and name; inactive users are excluded.
+    """
+    create_users()
+    client = APIClient()
+    client.force_authenticate(user=User.objects.get(email="bob@example.com"))
+
+    response = client.get("/api/users/lookup/", {"q": "Jo"})
+
+    assert response.status_code == 200
+    assert sorted(user['email'] for user in response.data) == ["jane@example.com", "john@example.com"]
+    assert sorted(user['email'] for user in search_users_db("jo", limit=10)) == ["jane@example.com", "john@example.com"]
+
+
+@pytest.mark.django_db
+def test_lookup_is_served_from_warm_index_and_tracks_user_changes():
+    """
+    Lookup test #2: once warm, lookups don't query the database and see new or deactivated users.
+    """
+    create_users()
+    client = APIClient()
+    client.force_authenticate(user=User.objects.get(email="bob@example.com"))
+    client.get("/api/users/lookup/", {"q": "j"})
+
+    User.objects.create_user(email="joan@example.com", password="password123", username="joan")
+    jane = User.objects.get(email="jane@example.com")
+    jane.is_active = False
+    jane.save()
+
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get("/api/users/lookup/", {"q": "jo", "limit": 50})
+
+    assert [query['sql'] for query in queries.captured_queries if 'user_user' in query['sql']] == []
+    assert sorted(user['email'] for user in response.data) == ["joan@example.com", "john@example.com"]
+
+
+@pytest.mark.django_db
+@override_settings(USER_DIRECTORY={'WARM_INDEX': False, 'MAX_RESULTS': 1})
+def test_lookup_result_size_is_bounded():
+    """
+    Lookup test #3: results are capped by MAX_RESULTS; an empty query is rejected.
+    """
+    create_users()
+    client = APIClient()
+    client.force_authenticate(user=User.objects.get(email="bob@example.com"))
+
+    assert len(client.get("/api/users/lookup/", {"q": "j", "limit": 50}).data) == 1
+    assert client.get("/api/users/lookup/", {"q": " "}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_import_users_skips_taken_accounts_and_hashes_passwords(tmp_path, monkeypatch):
+    """
+    Import test: `import_users` loads CSV and JSONL files in batches with hashed passwords, skips taken
+    emails and usernames (in the database, earlier in the file or taken concurrently) and reports invalid rows,
+    and the lookup sees the new users.
+    """
+    User.objects.create_user(email="taken@example.com", password="password123", username="taken")
+    assert directory_index.ensure_built()
+    path = tmp_path / "users.csv"
+    path.write_text(
+        "email,username,password,first_name\n"
+        "alice@example.com,alice,secret-1,Alice\n"
+        "taken@example.com,someone,secret-2,\n"
+        "carol@example.com,taken,secret-3,\n"
+        "not-an-email,dave,secret-4,\n"
+        "erin@example.com,erin,,\n"
+        "Alice2@EXAMPLE.com,alice,secret-5,\n"
+        "frank@example.com,frank,secret-6,\n"
+    )
+    out, err = StringIO(), StringIO()
+    call_command('import_users', str(path), batch_size=2, workers=2, stdout=out, stderr=err)
+
+    assert "Created 3 user(s), skipped 3, 1 invalid" in out.getvalue()
+    assert "rows/s" in out.getvalue() and "line 5" in err.getvalue()
+    alice = User.objects.get(email="alice@example.com")
+    assert alice.first_name == "Alice" and alice.check_password("secret-1")
+    assert not User.objects.get(username="erin").has_usable_password()
+    assert User.objects.count() == 4
+
+    jsonl = tmp_path / "more.jsonl"
+    jsonl.write_text(
+        '{"email": "gina@example.com", "username": "gina", "password": 1234567}\n'
+        '{"email": "hank@example.com", "username": ["hank"]}\n'
+    )
+    out = StringIO()
+    call_command('import_users', str(jsonl), workers=0, stdout=out, stderr=StringIO())
+    assert "Created 1 user(s), skipped 0, 1 invalid" in out.getvalue()
+    assert User.objects.get(username="gina").check_password("1234567")
+    assert [user['username'] for user in search_users("gi")] == ["gina"]
+
+    # a row taken between the lookup and the insert is skipped without losing the rest of the batch
+    hash_passwords = provisioning._hash_passwords
+
+    def racing_hash(passwords, executor):
+        User.objects.create_user(email="ivan@example.com", password="password123", username="ivan")
+        return hash_passwords(passwords, executor)
+
+    monkeypatch.setattr(provisioning, '_hash_passwords', racing_hash)
+    rows = [(1, {"email": "ivan@example.com", "username": "ivan2"}), (2, {"email": "jill@example.com", "username": "jill"})]
+    progress = list(import_users(rows))[-1]
+    assert (progress.created, progress.skipped) == (1, 1)
+    assert User.objects.filter(email="jill@example.com").exists()
@@ -1,3 +1,36 @@
-from django.shortcuts import render
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import HttpRequest
 
-# Create your views here.
+from .directory import search_users
+from .serializers import UserLookupSerializer
+
+__all__ = (
+    "UserLookupView",
+)
+
+
+class UserLookupView(APIView):
+    """
+    Find active users to start a conversation with.
+
+    `GET /api/users/lookup/?q=<prefix>&limit=<n>` matches the prefix against email, username,
+    first and last name (case-insensitive) and returns at most `USER_DIRECTORY['MAX_RESULTS']` users.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request: HttpRequest) -> Response:
+        query = request.query_params.get('q', '')
+        if not query.strip():
+            return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            return Response({"error": "Query parameter 'limit' must be an integer."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        users = search_users(query, limit)
+        return Response(UserLookupSerializer(users, many=True).data)